@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import RegistroAsistencia, Anomalia
+from .models import RegistroAsistencia, Anomalia, Marcaje, ReglaAsistencia
 
 @admin.register(RegistroAsistencia)
 class RegistroAsistenciaAdmin(admin.ModelAdmin):
@@ -9,5 +9,16 @@ class RegistroAsistenciaAdmin(admin.ModelAdmin):
 
 @admin.register(Anomalia)
 class AnomaliaAdmin(admin.ModelAdmin):
-    list_display = ('registro', 'tipo', 'observacion')
-    list_filter = ('tipo',)
\ No newline at end of file
+    list_display = ('colaborador', 'fecha', 'tipo', 'observacion', 'minutos_perdidos')
+    list_filter = ('tipo', 'fecha')
+    search_fields = ('colaborador__rut', 'colaborador__nombre_completo')
+
+@admin.register(Marcaje)
+class MarcajeAdmin(admin.ModelAdmin):
+    list_display = ('colaborador', 'fecha', 'hora', 'tipo_movimiento', 'dispositivo')
+    list_filter = ('fecha',)
+    search_fields = ('colaborador__rut', 'colaborador__nombre_completo')
+
+@admin.register(ReglaAsistencia)
+class ReglaAsistenciaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'area', 'palabra_clave_turno', 'entrada_teorica', 'es_turno_noche', 'holgura_minutos', 'tiempo_maximo_colacion')
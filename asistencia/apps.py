@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AsistenciaConfig(AppConfig):
     name = 'asistencia'
+
+    def ready(self):
+        import asistencia.receivers  # noqa — registra los receptores
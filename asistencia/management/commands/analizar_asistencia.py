@@ -0,0 +1,55 @@
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from asistencia.utils import analizar_asistencia_rango, analizar_pendientes
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida '{valor}' (formato YYYY-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las anomalías de asistencia (ausencia, atraso, colación) para un rango de días.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('desde', type=_fecha, nargs='?', help='YYYY-MM-DD')
+        parser.add_argument('hasta', type=_fecha, nargs='?', help='YYYY-MM-DD (por defecto = desde)')
+        parser.add_argument(
+            '--workers', type=int, default=min(4, os.cpu_count() or 1),
+            help='Procesos en paralelo (1 = sin pool). Con SQLite conviene 1.',
+        )
+        parser.add_argument(
+            '--pendientes', action='store_true',
+            help='Solo las personas-día que cambiaron en las últimas cargas (DiaPendiente).',
+        )
+
+    def handle(self, *args, **opts):
+        if opts['pendientes']:
+            resumen = analizar_pendientes()
+            self.stdout.write(self.style.SUCCESS(
+                f"{resumen['pendientes']} pendientes → {resumen['evaluados']} personas-día evaluadas, "
+                f"{resumen['anomalias']} anomalías en {resumen['segundos']:.2f}s"
+            ))
+            return
+
+        desde = opts['desde']
+        if desde is None:
+            raise CommandError('Indica una fecha desde o --pendientes')
+        hasta = opts['hasta'] or desde
+        if hasta < desde:
+            raise CommandError('hasta debe ser posterior a desde')
+
+        resumen = analizar_asistencia_rango(desde, hasta, workers=opts['workers'])
+
+        for fecha, n in sorted(resumen['por_dia'].items()):
+            self.stdout.write(f"  {fecha:%d-%m-%Y}  {n:6} anomalías")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen['dias']} días × {resumen['personas']} personas → "
+            f"{resumen['anomalias']} anomalías en {resumen['segundos']:.2f}s "
+            f"({resumen['personas_dia_por_seg']:.0f} personas-día/s)"
+        ))
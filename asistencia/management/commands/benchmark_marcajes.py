@@ -0,0 +1,132 @@
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dotacion.models import Colaborador
+from asistencia.models import Marcaje
+from asistencia.pendientes import marcar_pendientes
+from asistencia.utils import importar_asistencia_grex
+
+
+def generar_csv_marcajes(n_filas, ruts, seed=0):
+    """
+    Reporte de asistencia GREX sintético en CSV: 9 filas de metadata (rellenas
+    con separadores, como las exporta Excel), encabezado y marcajes con ';'.
+    """
+    rnd    = random.Random(seed)
+    lineas = ['Reporte de Asistencia;;;;;'] * 9
+    lineas.append('RUT;NOMBRE;FECHA;HORA;MOVIMIENTO;CÓDIGO DISPOSITIVO')
+    base = date(2025, 1, 1)
+    for i in range(n_filas):
+        rut   = ruts[i % len(ruts)]
+        fecha = base + timedelta(days=(i // len(ruts)) // 4)
+        lineas.append(
+            f"{rut};NOMBRE;{fecha:%d-%m-%Y};{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d};"
+            f"{rnd.choice(['Entrada', 'Salida'])};RELOJ{rnd.randint(1, 5)}"
+        )
+    return '\n'.join(lineas).encode('latin-1')
+
+
+def _archivo(contenido):
+    archivo = io.BytesIO(contenido)
+    archivo.name = 'marcajes.csv'
+    return archivo
+
+
+def _importar_fila_a_fila(archivo):
+    """Ruta anterior (iterrows + get y get_or_create por marcaje), como referencia."""
+    df_raw = pd.read_csv(archivo, header=None, sep=None, engine='python', encoding='latin-1')
+    header_idx = None
+    for i, row in df_raw.iterrows():
+        s = row.astype(str).str.upper()
+        if s.str.contains('MOVIMIENTO').any() and s.str.contains('RUT').any():
+            header_idx = i
+            break
+
+    df = df_raw.iloc[header_idx + 1:].copy()
+    df.columns = df_raw.iloc[header_idx].astype(str).str.strip().str.upper()
+    df = df.replace({np.nan: None})
+
+    nuevos = 0
+    tocados = set()
+    for _, row in df.iterrows():
+        rut_excel = str(row.get('RUT', '')).strip()
+        fecha_str = str(row.get('FECHA', '')).strip()
+        hora_str = str(row.get('HORA', '')).strip()
+        if not rut_excel or len(rut_excel) < 3:
+            continue
+        try:
+            colaborador = Colaborador.objects.get(rut=rut_excel)
+        except Colaborador.DoesNotExist:
+            continue
+
+        fecha_obj = None
+        for fmt in ('%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d'):
+            try:
+                fecha_obj = datetime.strptime(fecha_str, fmt).date()
+                break
+            except ValueError:
+                continue
+        if not fecha_obj:
+            continue
+
+        try:
+            with transaction.atomic():
+                _, created = Marcaje.objects.get_or_create(
+                    colaborador=colaborador, fecha=fecha_obj, hora=hora_str,
+                    defaults={'tipo_movimiento': row.get('MOVIMIENTO'), 'dispositivo': row.get('CÓDIGO DISPOSITIVO')},
+                )
+        except Exception:
+            continue
+        if created:
+            nuevos += 1
+            tocados.add((colaborador.rut, fecha_obj))
+
+    marcar_pendientes(tocados)
+    return nuevos
+
+
+class Command(BaseCommand):
+    help = 'Mide filas/seg de importar_asistencia_grex (vectorizado vs. iterrows). No deja datos en la BD.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=500_000)
+        parser.add_argument(
+            '--filas-referencia', type=int, default=20_000,
+            help='Filas para la ruta anterior (fila a fila); su tasa se compara con la vectorizada.',
+        )
+        parser.add_argument('--personas', type=int, default=3000)
+
+    def _medir(self, etiqueta, fn, contenido, n):
+        with transaction.atomic():
+            t0 = time.perf_counter()
+            fn(_archivo(contenido))
+            dt = time.perf_counter() - t0
+            transaction.set_rollback(True)
+        self.stdout.write(f"  {etiqueta:<28} {n:>8} filas {dt:8.2f}s  {n / dt:10.0f} filas/s")
+        return n / dt
+
+    def handle(self, *args, **opts):
+        ruts = [f"{20_000_000 + i}-{i % 10}" for i in range(opts['personas'])]
+        with transaction.atomic():
+            Colaborador.objects.bulk_create(
+                [Colaborador(rut=r, nombre_completo=f"PERSONA {r}") for r in ruts],
+                ignore_conflicts=True,
+            )
+
+            self.stdout.write(f"Generando CSV sintético ({opts['filas']} filas)...")
+            grande     = generar_csv_marcajes(opts['filas'], ruts)
+            referencia = generar_csv_marcajes(opts['filas_referencia'], ruts)
+
+            antes = self._medir('iterrows (referencia)', _importar_fila_a_fila, referencia, opts['filas_referencia'])
+            self._medir('vectorizado (referencia)', importar_asistencia_grex, referencia, opts['filas_referencia'])
+            despues = self._medir('vectorizado', importar_asistencia_grex, grande, opts['filas'])
+
+            self.stdout.write(self.style.SUCCESS(f"Speedup (filas/s): x{despues / antes:.1f}"))
+            transaction.set_rollback(True)
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistencia', '0001_initial'),
+        ('dotacion', '0007_dotaciondiaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReglaAsistencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('area', models.CharField(blank=True, help_text='Vacío = cualquier área', max_length=100)),
+                ('palabra_clave_turno', models.CharField(blank=True, help_text='Texto contenido en el turno de GREX', max_length=100)),
+                ('entrada_teorica', models.TimeField()),
+                ('es_turno_noche', models.BooleanField(default=False)),
+                ('holgura_minutos', models.PositiveIntegerField(default=5)),
+                ('tiempo_maximo_colacion', models.PositiveIntegerField(default=60, help_text='Minutos')),
+            ],
+            options={
+                'verbose_name': 'Regla de Asistencia',
+                'verbose_name_plural': 'Reglas de Asistencia',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='anomalia',
+            name='minutos_perdidos',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='anomalia',
+            name='tipo',
+            field=models.CharField(choices=[('AUSENCIA', 'Ausencia Injustificada'), ('ATRASO', 'Atraso en Entrada'), ('SIN_MARCA', 'Falta Marca Salida'), ('TURNO_EXTRA', 'Asistencia fuera de turno'), ('EXCESO_COLACION', 'Exceso de Colación')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='Marcaje',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora', models.TimeField()),
+                ('tipo_movimiento', models.CharField(blank=True, max_length=50, null=True)),
+                ('dispositivo', models.CharField(blank=True, max_length=50, null=True)),
+                ('colaborador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='marcajes', to='dotacion.colaborador')),
+            ],
+            options={
+                'verbose_name': 'Marcaje',
+                'verbose_name_plural': 'Marcajes',
+                'unique_together': {('colaborador', 'fecha', 'hora')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistencia', '0002_marcaje_reglaasistencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reglaasistencia',
+            name='actualizada',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
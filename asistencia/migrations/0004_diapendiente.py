@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistencia', '0003_reglaasistencia_actualizada'),
+        ('dotacion', '0007_dotaciondiaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiaPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('colaborador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dotacion.colaborador')),
+            ],
+            options={
+                'verbose_name': 'Día Pendiente de Análisis',
+                'verbose_name_plural': 'Días Pendientes de Análisis',
+                'unique_together': {('colaborador', 'fecha')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistencia', '0004_diapendiente'),
+        ('dotacion', '0007_dotaciondiaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomalia',
+            name='colaborador',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='anomalias', to='dotacion.colaborador'),
+        ),
+        migrations.AddField(
+            model_name='anomalia',
+            name='fecha',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='anomalia',
+            name='registro',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='anomalias', to='asistencia.registroasistencia'),
+        ),
+    ]
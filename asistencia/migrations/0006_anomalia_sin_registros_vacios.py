@@ -0,0 +1,46 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_persona_dia(apps, schema_editor):
+    """
+    Copia colaborador y fecha desde el registro y borra los RegistroAsistencia
+    vacíos que creaba el motor para colgar sus anomalías (sin horas ni archivo).
+    """
+    Anomalia           = apps.get_model('asistencia', 'Anomalia')
+    RegistroAsistencia = apps.get_model('asistencia', 'RegistroAsistencia')
+
+    registro = RegistroAsistencia.objects.filter(pk=OuterRef('registro_id'))
+    Anomalia.objects.filter(colaborador__isnull=True).update(
+        colaborador_id = Subquery(registro.values('colaborador_id')[:1]),
+        fecha          = Subquery(registro.values('fecha')[:1]),
+    )
+
+    vacios = RegistroAsistencia.objects.filter(
+        hora_entrada__isnull=True, hora_salida__isnull=True, archivo_origen__isnull=True,
+    )
+    Anomalia.objects.filter(registro__in=vacios).update(registro=None)
+    vacios.delete()
+
+
+def colgar_de_registros(apps, schema_editor):
+    """Vuelta atrás: cada anomalía sin registro se cuelga de uno (vacío si no existe)."""
+    Anomalia           = apps.get_model('asistencia', 'Anomalia')
+    RegistroAsistencia = apps.get_model('asistencia', 'RegistroAsistencia')
+
+    for anomalia in Anomalia.objects.filter(registro__isnull=True).iterator():
+        anomalia.registro, _ = RegistroAsistencia.objects.get_or_create(
+            colaborador_id=anomalia.colaborador_id, fecha=anomalia.fecha,
+        )
+        anomalia.save(update_fields=['registro'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistencia', '0005_anomalia_colaborador_fecha'),
+    ]
+
+    operations = [
+        migrations.RunPython(copiar_persona_dia, colgar_de_registros),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistencia', '0006_anomalia_sin_registros_vacios'),
+        ('dotacion', '0007_dotaciondiaria'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='anomalia',
+            name='colaborador',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalias', to='dotacion.colaborador'),
+        ),
+        migrations.AlterField(
+            model_name='anomalia',
+            name='fecha',
+            field=models.DateField(),
+        ),
+        migrations.AddIndex(
+            model_name='anomalia',
+            index=models.Index(fields=['fecha', 'colaborador'], name='asistencia__fecha_6245ea_idx'),
+        ),
+    ]
@@ -24,11 +24,78 @@ class Anomalia(models.Model):
         ('ATRASO', 'Atraso en Entrada'),
         ('SIN_MARCA', 'Falta Marca Salida'),
         ('TURNO_EXTRA', 'Asistencia fuera de turno'),
+        ('EXCESO_COLACION', 'Exceso de Colación'),
     ]
     
-    registro = models.ForeignKey(RegistroAsistencia, on_delete=models.CASCADE, related_name='anomalias')
+    # Persona-día de la anomalía. El registro solo existe si la importación de
+    # Estadía lo creó (SIN_MARCA); las del motor (p.ej. AUSENCIA) no lo tienen.
+    colaborador = models.ForeignKey(Colaborador, on_delete=models.CASCADE, related_name='anomalias')
+    fecha = models.DateField()
+    registro = models.ForeignKey(
+        RegistroAsistencia, on_delete=models.CASCADE, related_name='anomalias', null=True, blank=True
+    )
     tipo = models.CharField(max_length=50, choices=TIPOS)
     observacion = models.TextField(blank=True, null=True)
+    minutos_perdidos = models.IntegerField(null=True, blank=True)
     
     def __str__(self):
-        return f"{self.get_tipo_display()} - {self.registro.colaborador}"
\ No newline at end of file
+        return f"{self.get_tipo_display()} - {self.colaborador}"
+
+    class Meta:
+        indexes = [models.Index(fields=['fecha', 'colaborador'])]
+
+
+class Marcaje(models.Model):
+    """Marcaje individual del reloj control (una fila del reporte de asistencia)."""
+    colaborador = models.ForeignKey(Colaborador, on_delete=models.CASCADE, related_name='marcajes')
+    fecha = models.DateField()
+    hora = models.TimeField()
+    tipo_movimiento = models.CharField(max_length=50, null=True, blank=True)
+    dispositivo = models.CharField(max_length=50, null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.colaborador_id} {self.fecha} {self.hora} {self.tipo_movimiento or ''}"
+
+    class Meta:
+        unique_together = ('colaborador', 'fecha', 'hora')
+        verbose_name = "Marcaje"
+        verbose_name_plural = "Marcajes"
+
+
+class ReglaAsistencia(models.Model):
+    """
+    Horario teórico que se aplica a un colaborador según su área y turno.
+    Precedencia (asistencia.reglas): coincide el área, luego la palabra clave
+    del turno, luego la regla genérica (sin palabra clave), luego la primera.
+    """
+    nombre = models.CharField(max_length=100)
+    area = models.CharField(max_length=100, blank=True, help_text="Vacío = cualquier área")
+    palabra_clave_turno = models.CharField(max_length=100, blank=True, help_text="Texto contenido en el turno de GREX")
+    entrada_teorica = models.TimeField()
+    es_turno_noche = models.BooleanField(default=False)
+    holgura_minutos = models.PositiveIntegerField(default=5)
+    tiempo_maximo_colacion = models.PositiveIntegerField(default=60, help_text="Minutos")
+    actualizada = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.nombre
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Regla de Asistencia"
+        verbose_name_plural = "Reglas de Asistencia"
+
+
+class DiaPendiente(models.Model):
+    """
+    Persona-día cuyos datos cambiaron en una carga y cuyas anomalías del motor
+    hay que recalcular (asistencia.utils.analizar_pendientes lo consume).
+    """
+    colaborador = models.ForeignKey(Colaborador, on_delete=models.CASCADE, related_name='+')
+    fecha = models.DateField()
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('colaborador', 'fecha')
+        verbose_name = "Día Pendiente de Análisis"
+        verbose_name_plural = "Días Pendientes de Análisis"
@@ -0,0 +1,50 @@
+"""
+Conjunto sucio de personas-día para el recálculo incremental de anomalías.
+
+Cada carga registra los (rut, fecha) que realmente cambió; el motor
+(asistencia.utils.analizar_pendientes) reevalúa solo esos pares y los borra.
+"""
+from django.db import connection
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from core.bulk import insertar_filas
+
+from .models import DiaPendiente
+
+
+BATCH_SIZE = 1000
+
+
+def marcar_pendientes(claves):
+    """
+    Registra los (rut, fecha) como pendientes de análisis. Un par que ya
+    estaba pendiente se vuelve a fechar, así un análisis en curso que lo leyó
+    antes no lo descarta.
+    """
+    creado = DiaPendiente._meta.get_field('creado').get_db_prep_value(timezone.now(), connection)
+    filas  = [(rut, str(fecha), creado) for rut, fecha in claves]
+    if connection.features.supports_update_conflicts_with_target:
+        insertar_filas(
+            DiaPendiente, ['colaborador', 'fecha', 'creado'], filas,
+            on_conflict = OnConflict.UPDATE,
+            unicos      = ['colaborador', 'fecha'],
+            actualizar  = ['creado'],
+        )
+    else:
+        insertar_filas(DiaPendiente, ['colaborador', 'fecha', 'creado'], filas, on_conflict=OnConflict.IGNORE)
+
+
+def leer_pendientes():
+    """(momento de la lectura, [(id, rut, fecha)]) de todos los pares pendientes."""
+    momento = timezone.now()
+    return momento, list(
+        DiaPendiente.objects.filter(creado__lte=momento).values_list('id', 'colaborador_id', 'fecha')
+    )
+
+
+def descartar_pendientes(ids, momento):
+    """Borra los pendientes analizados, salvo los re-marcados después de `momento`."""
+    ids = list(ids)
+    for i in range(0, len(ids), BATCH_SIZE):
+        DiaPendiente.objects.filter(id__in=ids[i:i + BATCH_SIZE], creado__lte=momento).delete()
@@ -0,0 +1,13 @@
+"""
+Receptores internos de asistencia.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import ReglaAsistencia
+from .reglas import invalidar_matcher
+
+
+@receiver([post_save, post_delete], sender=ReglaAsistencia)
+def invalidar_indice_reglas(sender, **kwargs):
+    """El índice compilado de reglas se rearma en la próxima consulta."""
+    invalidar_matcher()
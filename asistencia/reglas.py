@@ -0,0 +1,141 @@
+"""
+Índice compilado de ReglaAsistencia.
+
+Resolver la regla de un colaborador era probar cada regla con `in` sobre su
+área y su turno. Acá las áreas y palabras clave de todas las reglas se
+compilan en dos autómatas Aho–Corasick: un solo recorrido del texto entrega
+todos los patrones contenidos, y la precedencia se resuelve con tablas
+precalculadas (primer índice por área / por palabra clave), sin recorrer la
+lista de reglas.
+
+Precedencia (la de siempre): entre las reglas cuya área está contenida en la
+del colaborador (o sin área), gana la primera cuya palabra clave está en el
+turno; si no, la primera genérica (sin palabra clave); si no, la primera.
+
+El índice se guarda por proceso (matcher_reglas) y se descarta al guardar o
+borrar una regla. Además se compara una firma barata de la tabla (cantidad y
+última modificación) para ver cambios hechos desde otro proceso.
+"""
+from collections import deque
+
+from django.db.models import Count, Max
+
+from .models import ReglaAsistencia
+
+
+def normalizar(texto):
+    return str(texto).strip().upper() if texto else ""
+
+
+class AhoCorasick:
+    """Autómata para encontrar, en una pasada, qué patrones aparecen en un texto."""
+
+    def __init__(self, patrones):
+        self._hijos  = [{}]
+        self._fallo  = [0]
+        self._salida = [set()]
+
+        for patron in patrones:
+            nodo = 0
+            for c in patron:
+                if c not in self._hijos[nodo]:
+                    self._hijos.append({})
+                    self._fallo.append(0)
+                    self._salida.append(set())
+                    self._hijos[nodo][c] = len(self._hijos) - 1
+                nodo = self._hijos[nodo][c]
+            self._salida[nodo].add(patron)
+
+        cola = deque(self._hijos[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for c, hijo in self._hijos[nodo].items():
+                cola.append(hijo)
+                fallo = self._fallo[nodo]
+                while fallo and c not in self._hijos[fallo]:
+                    fallo = self._fallo[fallo]
+                destino = self._hijos[fallo].get(c, 0)
+                self._fallo[hijo] = destino if destino != hijo else 0
+                self._salida[hijo] |= self._salida[self._fallo[hijo]]
+
+    def buscar(self, texto):
+        """Set de patrones contenidos en `texto`."""
+        encontrados = set()
+        nodo = 0
+        for c in texto:
+            while nodo and c not in self._hijos[nodo]:
+                nodo = self._fallo[nodo]
+            nodo = self._hijos[nodo].get(c, 0)
+            if self._salida[nodo]:
+                encontrados |= self._salida[nodo]
+        return encontrados
+
+
+class MatcherReglas:
+    """Regla ganadora para (área, turno), memoizada por los textos normalizados."""
+
+    def __init__(self, reglas):
+        self.reglas = list(reglas)
+
+        self._primera          = {}     # área -> índice de la primera regla
+        self._primera_generica = {}     # área -> índice de la primera sin palabra clave
+        self._por_clave        = {}     # palabra clave -> [(índice, área)]
+        for i, r in enumerate(self.reglas):
+            area  = normalizar(r.area)
+            clave = normalizar(r.palabra_clave_turno)
+            self._primera.setdefault(area, i)
+            if not r.palabra_clave_turno:
+                self._primera_generica.setdefault(area, i)
+            if clave:
+                self._por_clave.setdefault(clave, []).append((i, area))
+
+        self._areas  = AhoCorasick(a for a in self._primera if a)
+        self._claves = AhoCorasick(self._por_clave)
+        self._cache  = {}
+
+    def regla_para(self, area, turno):
+        clave = (normalizar(area), normalizar(turno))
+        if clave not in self._cache:
+            self._cache[clave] = self._resolver(*clave)
+        return self._cache[clave]
+
+    def _resolver(self, area, turno):
+        areas = self._areas.buscar(area)
+        areas.add('')
+        primeras = [self._primera[a] for a in areas if a in self._primera]
+        if not primeras:
+            return None
+
+        con_clave = [
+            i
+            for c in self._claves.buscar(turno)
+            for i, a in self._por_clave[c]
+            if a in areas
+        ]
+        if con_clave:
+            return self.reglas[min(con_clave)]
+
+        genericas = [self._primera_generica[a] for a in areas if a in self._primera_generica]
+        return self.reglas[min(genericas or primeras)]
+
+
+_matcher = {'firma': None, 'matcher': None}
+
+
+def _firma():
+    return tuple(ReglaAsistencia.objects.aggregate(n=Count('id'), ultima=Max('actualizada')).values())
+
+
+def matcher_reglas():
+    """MatcherReglas de las reglas actuales (None si no hay reglas), reutilizado entre llamadas."""
+    firma = _firma()
+    if _matcher['matcher'] is None or _matcher['firma'] != firma:
+        reglas = list(ReglaAsistencia.objects.all())
+        _matcher['matcher'] = MatcherReglas(reglas) if reglas else None
+        _matcher['firma']   = firma
+    return _matcher['matcher']
+
+
+def invalidar_matcher(**kwargs):
+    _matcher['matcher'] = None
+    _matcher['firma']   = None
@@ -5,187 +5,593 @@ Estructura del archivo:
 - Filas 0-8: Metadata del reporte (se ignoran)
 - Fila 9  : Headers de columnas
 - Fila 10+: Marcajes individuales (una fila = un marcaje)
+El encabezado se ubica solo (primera fila con RUT, FECHA, HORA y MOVIMIENTO).
 
 Lógica:
   Por cada persona+fecha se toma:
     - hora_entrada = primer marcaje "Entrada"
     - hora_salida  = último marcaje "Salida"
+  Los marcajes se pliegan en streaming (el archivo no se carga completo).
 """
-import openpyxl
-from datetime import datetime, date, time
-from collections import defaultdict
-from django.db import transaction
-
+import heapq
+import tempfile
+from datetime import date, time
+from functools import partial
+from itertools import islice
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.bulk import copiar_a_staging, usa_copy
+from core.cargas import guardar_avance
+from core.lectores import EncabezadoNoEncontrado, abrir_tabla
+from core.parsing import limpiar_rut, parse_fecha, parse_hora
 from dotacion.models import Colaborador
-from .models import RegistroAsistencia, Anomalia
+from .models import RegistroAsistencia, Anomalia, DiaPendiente
+from .pendientes import marcar_pendientes
 
 
 # ─────────────────────────────────────────────
-# Helpers
+# Escritura por lotes
 # ─────────────────────────────────────────────
 
-def _limpiar_rut(rut_raw):
-    if not rut_raw:
-        return None
-    rut = str(rut_raw).replace('.', '').strip().upper()
-    return rut if rut not in ('', 'NONE', 'NAN') else None
-
-
-def _parse_fecha(valor):
-    if not valor:
-        return None
-    if isinstance(valor, (date, datetime)):
-        return valor.date() if isinstance(valor, datetime) else valor
-    s = str(valor).strip()
-    if s in ('', 'None', 'nan'):
-        return None
-    for fmt in ('%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d'):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except ValueError:
-            continue
+BATCH_SIZE = 1000
+
+
+def _observacion_sin_marca(hora_entrada, hora_salida):
+    """Observación de la anomalía SIN_MARCA, o None si el día está completo."""
+    if hora_entrada and not hora_salida:
+        return 'Solo tiene marca de entrada, falta salida.'
+    if not hora_entrada and hora_salida:
+        return 'Solo tiene marca de salida, falta entrada.'
     return None
 
 
-def _parse_hora(valor):
-    if not valor:
-        return None
-    if isinstance(valor, time):
-        return valor
-    if isinstance(valor, datetime):
-        return valor.time()
-    s = str(valor).strip()
-    for fmt in ('%H:%M:%S', '%H:%M'):
+def _registros_existentes(claves):
+    """
+    {(rut, fecha): (id, hora_entrada, hora_salida)} de los RegistroAsistencia
+    ya guardados para `claves`.
+    """
+    ruts   = {rut for rut, _ in claves}
+    fechas = [fecha for _, fecha in claves]
+    existentes = (
+        RegistroAsistencia.objects
+        .filter(colaborador_id__in=ruts, fecha__range=[min(fechas), max(fechas)])
+        .values_list('colaborador_id', 'fecha', 'id', 'hora_entrada', 'hora_salida')
+    )
+    return {
+        (rut, fecha): (pk, entrada, salida)
+        for rut, fecha, pk, entrada, salida in existentes if (rut, fecha) in claves
+    }
+
+
+def _guardar_lote(lote, archivo_origen, existentes):
+    """
+    Escribe un lote {(rut, fecha): (hora_entrada, hora_salida)}:
+    upsert de RegistroAsistencia, un DELETE de sus SIN_MARCA y un
+    bulk_create de las nuevas. Devuelve la cantidad de anomalías creadas.
+    """
+    registros = [
+        RegistroAsistencia(
+            colaborador_id = rut,
+            fecha          = fecha,
+            hora_entrada   = hora_entrada,
+            hora_salida    = hora_salida,
+            archivo_origen = archivo_origen,
+        )
+        for (rut, fecha), (hora_entrada, hora_salida) in lote.items()
+    ]
+    campos = ['hora_entrada', 'hora_salida', 'archivo_origen']
+
+    if connection.features.supports_update_conflicts_with_target:
+        RegistroAsistencia.objects.bulk_create(
+            registros,
+            update_conflicts = True,
+            unique_fields    = ['colaborador', 'fecha'],
+            update_fields    = campos,
+        )
+    else:
+        nuevos     = [r for r in registros if (r.colaborador_id, r.fecha) not in existentes]
+        actualizar = [r for r in registros if (r.colaborador_id, r.fecha) in existentes]
+        for r in actualizar:
+            r.pk = existentes[(r.colaborador_id, r.fecha)][0]
+        RegistroAsistencia.objects.bulk_create(nuevos)
+        RegistroAsistencia.objects.bulk_update(actualizar, campos)
+
+    ids = _registros_existentes(lote.keys())
+
+    # Recalcular SIN_MARCA (las del motor de reglas se recalculan aparte)
+    Anomalia.objects.filter(registro_id__in=[pk for pk, _, _ in ids.values()], tipo='SIN_MARCA').delete()
+
+    anomalias = []
+    for clave, (hora_entrada, hora_salida) in lote.items():
+        observacion = _observacion_sin_marca(hora_entrada, hora_salida)
+        if observacion:
+            anomalias.append(Anomalia(
+                registro_id    = ids[clave][0],
+                colaborador_id = clave[0],
+                fecha          = clave[1],
+                tipo           = 'SIN_MARCA',
+                observacion = observacion,
+            ))
+    Anomalia.objects.bulk_create(anomalias)
+    return len(anomalias)
+
+
+def _guardar_lote_por_fila(lote, archivo_origen, errores):
+    """
+    Fallback cuando el lote completo falla: se reintenta día a día para
+    aislar los que tienen error. Devuelve (claves fallidas, anomalías creadas).
+    """
+    fallidos  = set()
+    anomalias = 0
+    for (rut, fecha), (hora_entrada, hora_salida) in lote.items():
         try:
-            return datetime.strptime(s, fmt).time()
-        except ValueError:
-            continue
-    return None
+            with transaction.atomic():
+                registro, _ = RegistroAsistencia.objects.update_or_create(
+                    colaborador_id=rut,
+                    fecha=fecha,
+                    defaults={
+                        'hora_entrada'   : hora_entrada,
+                        'hora_salida'    : hora_salida,
+                        'archivo_origen' : archivo_origen,
+                    }
+                )
+                registro.anomalias.filter(tipo='SIN_MARCA').delete()
+                observacion = _observacion_sin_marca(hora_entrada, hora_salida)
+                if observacion:
+                    Anomalia.objects.create(
+                        registro=registro, colaborador_id=rut, fecha=fecha, tipo='SIN_MARCA', observacion=observacion
+                    )
+                    anomalias += 1
+        except Exception as e:
+            errores.append(f"{rut} {fecha}: {str(e)}")
+            fallidos.add((rut, fecha))
+    return fallidos, anomalias
 
 
 # ─────────────────────────────────────────────
-# Función principal
+# Escritura por lotes en Postgres (COPY + SQL por conjuntos)
 # ─────────────────────────────────────────────
 
-def procesar_estadia(archivo_file, archivo_origen=None):
+# Días-persona por lote cuando se escribe con COPY (y por checkpoint)
+BATCH_SIZE_COPY = 20_000
+
+OBS_FALTA_SALIDA  = _observacion_sin_marca(time(0), None)
+OBS_FALTA_ENTRADA = _observacion_sin_marca(None, time(0))
+
+
+def _guardar_lote_sql(lote, archivo_origen):
     """
-    Lee el Reporte de Estadía y actualiza RegistroAsistencia.
+    Versión Postgres de escribir un lote {(rut, fecha): (entrada, salida)}:
+    COPY a una tabla temporal y el resto en SQL por conjuntos (clasificar
+    contra lo guardado, upsert de RegistroAsistencia, SIN_MARCA y
+    DiaPendiente), sin traer filas a Python.
 
-    Returns:
-        dict: registros_creados, registros_actualizados,
-              ruts_no_encontrados, anomalias_creadas, errores
-    """
-    wb = openpyxl.load_workbook(archivo_file, read_only=True, data_only=True)
-    ws = wb.active
-
-    HEADER_ROW = 10
-    DATA_START  = 11
-
-    # Mapear headers
-    headers = {}
-    for col_idx, cell in enumerate(ws[HEADER_ROW], start=1):
-        val = str(cell.value or '').strip().upper()
-        if val:
-            headers[val] = col_idx
-
-    for campo in ['RUT', 'FECHA', 'HORA', 'MOVIMIENTO']:
-        if campo not in headers:
-            raise ValueError(
-                f"El archivo no tiene la columna obligatoria '{campo}'. "
-                "Verifica que sea el Reporte de Estadía correcto."
-            )
+    Devuelve (ruts desconocidos, sin_cambios, creados, actualizados, anomalías creadas).
+    """
+    qn        = connection.ops.quote_name
+    registro  = qn(RegistroAsistencia._meta.db_table)
+    anomalia  = qn(Anomalia._meta.db_table)
+    pendiente = qn(DiaPendiente._meta.db_table)
+    colab     = qn(Colaborador._meta.db_table)
+    # estado: D = RUT desconocido, I = igual a lo guardado, A = actualizar, N = nuevo
+    staging   = 'staging_estadia'
+
+    with connection.cursor() as cursor:
+        copiar_a_staging(
+            cursor, staging,
+            "(rut varchar(20), fecha date, hora_entrada time, hora_salida time, estado char(1))",
+            ['rut', 'fecha', 'hora_entrada', 'hora_salida'],
+            ((rut, fecha, entrada, salida) for (rut, fecha), (entrada, salida) in lote.items()),
+        )
+        cursor.execute(f"""
+            UPDATE {staging} s SET estado = 'D'
+            WHERE NOT EXISTS (SELECT 1 FROM {colab} c WHERE c.rut = s.rut)
+        """)
+        cursor.execute(f"""
+            UPDATE {staging} s SET estado = CASE
+                WHEN r.hora_entrada IS NOT DISTINCT FROM s.hora_entrada
+                 AND r.hora_salida  IS NOT DISTINCT FROM s.hora_salida THEN 'I' ELSE 'A' END
+            FROM {registro} r
+            WHERE s.estado IS NULL AND r.colaborador_id = s.rut AND r.fecha = s.fecha
+        """)
+        cursor.execute(f"UPDATE {staging} SET estado = 'N' WHERE estado IS NULL")
+
+        cursor.execute(f"SELECT estado, count(*) FROM {staging} GROUP BY estado")
+        conteo = dict(cursor.fetchall())
+        cursor.execute(f"SELECT DISTINCT rut FROM {staging} WHERE estado = 'D'")
+        desconocidos = {rut for rut, in cursor.fetchall()}
+        if not conteo.get('A') and not conteo.get('N'):
+            return desconocidos, conteo.get('I', 0), 0, 0, 0
+
+        cursor.execute(f"""
+            INSERT INTO {registro} (colaborador_id, fecha, hora_entrada, hora_salida, archivo_origen_id)
+            SELECT rut, fecha, hora_entrada, hora_salida, %s FROM {staging} WHERE estado IN ('A', 'N')
+            ON CONFLICT (colaborador_id, fecha) DO UPDATE SET
+                hora_entrada      = EXCLUDED.hora_entrada,
+                hora_salida       = EXCLUDED.hora_salida,
+                archivo_origen_id = EXCLUDED.archivo_origen_id
+        """, [archivo_origen.pk if archivo_origen else None])
+
+        # Recalcular SIN_MARCA (las del motor de reglas se recalculan aparte)
+        cursor.execute(f"""
+            DELETE FROM {anomalia} a USING {registro} r, {staging} s
+            WHERE a.registro_id = r.id AND a.tipo = 'SIN_MARCA'
+              AND r.colaborador_id = s.rut AND r.fecha = s.fecha AND s.estado = 'A'
+        """)
+        cursor.execute(f"""
+            INSERT INTO {anomalia} (registro_id, colaborador_id, fecha, tipo, observacion)
+            SELECT r.id, r.colaborador_id, r.fecha, 'SIN_MARCA', CASE WHEN s.hora_salida IS NULL THEN %s ELSE %s END
+            FROM {staging} s JOIN {registro} r ON r.colaborador_id = s.rut AND r.fecha = s.fecha
+            WHERE s.estado IN ('A', 'N') AND (s.hora_entrada IS NULL) <> (s.hora_salida IS NULL)
+        """, [OBS_FALTA_SALIDA, OBS_FALTA_ENTRADA])
+        anomalias = cursor.rowcount
+
+        cursor.execute(f"""
+            INSERT INTO {pendiente} (colaborador_id, fecha, creado)
+            SELECT rut, fecha, %s FROM {staging} WHERE estado IN ('A', 'N')
+            ON CONFLICT (colaborador_id, fecha) DO UPDATE SET creado = EXCLUDED.creado
+        """, [timezone.now()])
+
+    return desconocidos, conteo.get('I', 0), conteo.get('N', 0), conteo.get('A', 0), anomalias
+
+
+# ─────────────────────────────────────────────
+# Lectura y agrupación de marcajes
+# ─────────────────────────────────────────────
+
+# Máximo de días-persona en memoria antes de volcar a disco (entrada desordenada)
+SPILL_GRUPOS = 50_000
 
-    def col(row, nombre):
-        idx = headers.get(nombre)
-        return row[idx - 1].value if idx else None
 
-    # Agrupar marcajes por (rut, fecha)
-    marcajes = defaultdict(lambda: {'entradas': [], 'salidas': []})
+class _EntradaDesordenada(Exception):
+    """Un (rut, fecha) reaparece después de cerrado: el archivo no viene agrupado."""
 
-    for row in ws.iter_rows(min_row=DATA_START, values_only=False):
-        rut   = _limpiar_rut(col(row, 'RUT'))
-        fecha = _parse_fecha(col(row, 'FECHA'))
-        hora  = _parse_hora(col(row, 'HORA'))
-        movim = str(col(row, 'MOVIMIENTO') or '').strip().capitalize()
+
+COLUMNAS_ESTADIA = ['RUT', 'FECHA', 'HORA', 'MOVIMIENTO']
+
+
+def _abrir_reporte(archivo_file):
+    """Tabla del Reporte de Estadía (core.lectores), con el encabezado ya ubicado."""
+    try:
+        return abrir_tabla(archivo_file, requeridas=COLUMNAS_ESTADIA)
+    except EncabezadoNoEncontrado as e:
+        raise ValueError(
+            f"El archivo no tiene la columna obligatoria '{e.faltantes[0]}'. "
+            "Verifica que sea el Reporte de Estadía correcto."
+        )
+
+
+def _leer_marcajes(tabla):
+    """Entrega (rut, fecha, hora, movimiento) por cada marcaje Entrada/Salida válido."""
+    for _, (rut, fecha, hora, movim) in tabla.filas(COLUMNAS_ESTADIA):
+        rut   = limpiar_rut(rut)
+        fecha = parse_fecha(fecha)
+        hora  = parse_hora(hora)
+        movim = str(movim or '').strip().capitalize()
 
         if not all([rut, fecha, hora]):
             continue
 
-        if movim == 'Entrada':
-            marcajes[(rut, fecha)]['entradas'].append(hora)
-        elif movim == 'Salida':
-            marcajes[(rut, fecha)]['salidas'].append(hora)
+        if movim in ('Entrada', 'Salida'):
+            yield rut, fecha, hora, movim
+
+
+def _acumular(actual, hora, movim):
+    """Pliega un marcaje en (min entrada, max salida)."""
+    entrada, salida = actual
+    if movim == 'Entrada':
+        if entrada is None or hora < entrada:
+            entrada = hora
+    elif salida is None or hora > salida:
+        salida = hora
+    return entrada, salida
+
+
+def _agrupar_contiguo(marcajes):
+    """
+    Agrupa en streaming asumiendo que cada (rut, fecha) viene contiguo, como
+    en los exports de GREX (ordenados por RUT y fecha). Memoria: los RUT ya
+    cerrados y las fechas del RUT en curso, no los marcajes.
+
+    Lanza _EntradaDesordenada si un grupo reaparece después de cerrado.
+    """
+    clave, acumulado = None, None
+    ruts_cerrados    = set()
+    fechas_cerradas  = set()
+
+    for rut, fecha, hora, movim in marcajes:
+        if (rut, fecha) != clave:
+            if clave is not None:
+                yield clave, acumulado
+                if rut != clave[0]:
+                    ruts_cerrados.add(clave[0])
+                    fechas_cerradas = set()
+                else:
+                    fechas_cerradas.add(clave[1])
+            if rut in ruts_cerrados or fecha in fechas_cerradas:
+                raise _EntradaDesordenada()
+            clave, acumulado = (rut, fecha), (None, None)
+        acumulado = _acumular(acumulado, hora, movim)
+
+    if clave is not None:
+        yield clave, acumulado
+
+
+def _agrupar_con_spill(marcajes, max_grupos=None):
+    """
+    Agrupa entradas sin orden con memoria acotada: pliega hasta `max_grupos`
+    días-persona en memoria, los vuelca ordenados a un archivo temporal y al
+    final mezcla los tramos (heapq.merge) volviendo a plegar.
+    """
+    max_grupos = max_grupos or SPILL_GRUPOS
+    tramos     = []
+    grupos     = {}
+
+    def volcar():
+        tramo = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        for (rut, fecha), (entrada, salida) in sorted(grupos.items()):
+            tramo.write('\t'.join([
+                rut, fecha.isoformat(),
+                entrada.isoformat() if entrada else '',
+                salida.isoformat()  if salida  else '',
+            ]) + '\n')
+        tramo.seek(0)
+        tramos.append(tramo)
+        grupos.clear()
+
+    def leer(tramo):
+        for linea in tramo:
+            rut, fecha, entrada, salida = linea.rstrip('\n').split('\t')
+            yield (
+                (rut, date.fromisoformat(fecha)),
+                (time.fromisoformat(entrada) if entrada else None,
+                 time.fromisoformat(salida)  if salida  else None),
+            )
 
-    wb.close()
+    for rut, fecha, hora, movim in marcajes:
+        clave = (rut, fecha)
+        grupos[clave] = _acumular(grupos.get(clave, (None, None)), hora, movim)
+        if len(grupos) >= max_grupos:
+            volcar()
+
+    if not tramos:
+        yield from sorted(grupos.items())
+        return
+    if grupos:
+        volcar()
+
+    try:
+        clave, acumulado = None, None
+        for k, (entrada, salida) in heapq.merge(*(leer(t) for t in tramos), key=lambda g: g[0]):
+            if k != clave:
+                if clave is not None:
+                    yield clave, acumulado
+                clave, acumulado = k, (None, None)
+            if entrada:
+                acumulado = _acumular(acumulado, entrada, 'Entrada')
+            if salida:
+                acumulado = _acumular(acumulado, salida, 'Salida')
+        if clave is not None:
+            yield clave, acumulado
+    finally:
+        for tramo in tramos:
+            tramo.close()
 
-    # Pre-cargar colaboradores en memoria
-    ruts_en_reporte = {rut for rut, _ in marcajes.keys()}
-    colaboradores_map = {
-        c.rut: c
-        for c in Colaborador.objects.filter(rut__in=ruts_en_reporte)
+
+# ─────────────────────────────────────────────
+# Función principal
+# ─────────────────────────────────────────────
+
+def _estado_inicial(avance):
+    """Contadores de la importación, retomados desde `avance` si lo hay."""
+    avance = avance or {}
+    return {
+        'modo'                  : avance.get('modo'),
+        'dias'                  : avance.get('dias', 0),
+        'registros_creados'     : avance.get('registros_creados', 0),
+        'registros_actualizados': avance.get('registros_actualizados', 0),
+        'registros_sin_cambios' : avance.get('registros_sin_cambios', 0),
+        'anomalias_creadas'     : avance.get('anomalias_creadas', 0),
+        'ruts_desconocidos'     : set(avance.get('ruts_desconocidos', [])),
+        'errores'               : list(avance.get('errores', [])),
+        'fecha_desde'           : date.fromisoformat(avance['fecha_desde']) if avance.get('fecha_desde') else None,
+        'fecha_hasta'           : date.fromisoformat(avance['fecha_hasta']) if avance.get('fecha_hasta') else None,
     }
 
-    registros_creados     = 0
-    registros_actualizados = 0
-    ruts_desconocidos     = set()
-    anomalias_creadas     = 0
-    errores               = []
 
-    with transaction.atomic():
-        for (rut, fecha), tiempos in marcajes.items():
+def _avance_json(estado):
+    """Checkpoint serializable (JSONField) de los contadores."""
+    return {
+        **estado,
+        'ruts_desconocidos': sorted(estado['ruts_desconocidos']),
+        'fecha_desde'      : estado['fecha_desde'].isoformat() if estado['fecha_desde'] else None,
+        'fecha_hasta'      : estado['fecha_hasta'].isoformat() if estado['fecha_hasta'] else None,
+    }
 
-            colaborador = colaboradores_map.get(rut)
-            if not colaborador:
-                ruts_desconocidos.add(rut)
-                continue
 
-            entradas = sorted(tiempos['entradas'])
-            salidas  = sorted(tiempos['salidas'])
+def _escribir_dias(dias_agrupados, archivo_origen, avance=None, guardar_avance=None):
+    """
+    Consume ((rut, fecha), (entrada, salida)) y escribe por lotes de BATCH_SIZE.
 
-            hora_entrada = entradas[0]  if entradas else None
-            hora_salida  = salidas[-1]  if salidas  else None
+    Con `guardar_avance`, cada lote se confirma en su propia transacción junto
+    con el checkpoint (días consumidos y contadores), que se le entrega como
+    dict. `avance` es el checkpoint de un intento anterior: los días que ya
+    quedaron confirmados se saltan sin escribir ni contar de nuevo.
+    """
+    estado = _estado_inicial(avance)
 
+    def escribir(pendientes):
+        if usa_copy():
             try:
-                registro, created = RegistroAsistencia.objects.update_or_create(
-                    colaborador=colaborador,
-                    fecha=fecha,
-                    defaults={
-                        'hora_entrada'   : hora_entrada,
-                        'hora_salida'    : hora_salida,
-                        'archivo_origen' : archivo_origen,
-                    }
-                )
+                with transaction.atomic():
+                    desconocidos, iguales, creados, actualizados, anomalias = (
+                        _guardar_lote_sql(pendientes, archivo_origen)
+                    )
+            except Exception:
+                pass    # se reintenta por el ORM, que aísla los días con error
+            else:
+                estado['ruts_desconocidos'].update(desconocidos)
+                estado['registros_sin_cambios']  += iguales
+                estado['registros_creados']      += creados
+                estado['registros_actualizados'] += actualizados
+                estado['anomalias_creadas']      += anomalias
+                return
+
+        ruts = {rut for rut, _ in pendientes}
+        ruts_existentes = set(
+            Colaborador.objects.filter(rut__in=ruts).values_list('rut', flat=True)
+        )
+        estado['ruts_desconocidos'].update(ruts - ruts_existentes)
+        lote = {clave: horas for clave, horas in pendientes.items() if clave[0] in ruts_existentes}
+        if not lote:
+            return
+
+        existentes = _registros_existentes(lote.keys())
+
+        # Días que ya están guardados con las mismas horas: no se reescriben
+        # ni se reevalúan (resubir un archivo solapado cuesta solo lo nuevo)
+        iguales = [c for c, horas in lote.items() if c in existentes and existentes[c][1:] == horas]
+        estado['registros_sin_cambios'] += len(iguales)
+        for clave in iguales:
+            del lote[clave]
+        if not lote:
+            return
+
+        fallidos   = set()
+        try:
+            with transaction.atomic():
+                estado['anomalias_creadas'] += _guardar_lote(lote, archivo_origen, existentes)
+        except Exception:
+            fallidos, creadas = _guardar_lote_por_fila(lote, archivo_origen, estado['errores'])
+            estado['anomalias_creadas'] += creadas
+
+        for clave in lote:
+            if clave in fallidos:
+                continue
+            if clave in existentes:
+                estado['registros_actualizados'] += 1
+            else:
+                estado['registros_creados'] += 1
+        marcar_pendientes(clave for clave in lote if clave not in fallidos)
+
+    def confirmar(pendientes):
+        if guardar_avance is None:
+            escribir(pendientes)
+            estado['dias'] += len(pendientes)
+            return
+        with transaction.atomic():
+            escribir(pendientes)
+            estado['dias'] += len(pendientes)
+            guardar_avance(_avance_json(estado))
+
+    tamano     = BATCH_SIZE_COPY if usa_copy() else BATCH_SIZE
+    pendientes = {}
+    for clave, horas in islice(dias_agrupados, estado['dias'], None):
+        pendientes[clave] = horas
+        fecha = clave[1]
+        if estado['fecha_desde'] is None or fecha < estado['fecha_desde']:
+            estado['fecha_desde'] = fecha
+        if estado['fecha_hasta'] is None or fecha > estado['fecha_hasta']:
+            estado['fecha_hasta'] = fecha
+        if len(pendientes) >= tamano:
+            confirmar(pendientes)
+            pendientes = {}
+    if pendientes:
+        confirmar(pendientes)
 
-                if created:
-                    registros_creados += 1
-                else:
-                    registros_actualizados += 1
+    return {
+        'registros_creados'     : estado['registros_creados'],
+        'registros_actualizados': estado['registros_actualizados'],
+        'registros_sin_cambios' : estado['registros_sin_cambios'],
+        'ruts_no_encontrados'   : len(estado['ruts_desconocidos']),
+        'anomalias_creadas'     : estado['anomalias_creadas'],
+        'errores'               : estado['errores'],
+        'fecha_desde'           : estado['fecha_desde'],
+        'fecha_hasta'           : estado['fecha_hasta'],
+    }
 
-                # Recalcular anomalías
-                registro.anomalias.all().delete()
 
-                if hora_entrada and not hora_salida:
-                    Anomalia.objects.create(
-                        registro=registro,
-                        tipo='SIN_MARCA',
-                        observacion='Solo tiene marca de entrada, falta salida.'
-                    )
-                    anomalias_creadas += 1
-                elif not hora_entrada and hora_salida:
-                    Anomalia.objects.create(
-                        registro=registro,
-                        tipo='SIN_MARCA',
-                        observacion='Solo tiene marca de salida, falta entrada.'
-                    )
-                    anomalias_creadas += 1
+def _procesar_estadia(archivo_file, archivo_origen, agrupar, avance=None, guardar_avance=None):
+    with _abrir_reporte(archivo_file) as tabla:
+        return _escribir_dias(agrupar(_leer_marcajes(tabla)), archivo_origen, avance, guardar_avance)
 
-            except Exception as e:
-                errores.append(f"{rut} {fecha}: {str(e)}")
 
-    return {
-        'registros_creados'     : registros_creados,
-        'registros_actualizados': registros_actualizados,
-        'ruts_no_encontrados'   : len(ruts_desconocidos),
-        'anomalias_creadas'     : anomalias_creadas,
-        'errores'               : errores,
-    }
\ No newline at end of file
+def _es_contiguo(archivo_file):
+    """Recorre el archivo sin escribir para saber si viene agrupado por RUT/fecha."""
+    try:
+        with _abrir_reporte(archivo_file) as tabla:
+            for _ in _agrupar_contiguo(_leer_marcajes(tabla)):
+                pass
+    except _EntradaDesordenada:
+        return False
+    finally:
+        if hasattr(archivo_file, 'seek'):
+            archivo_file.seek(0)
+    return True
+
+
+def procesar_estadia(archivo_file, archivo_origen=None, avance=None, guardar_avance=None):
+    """
+    Lee el Reporte de Estadía y actualiza RegistroAsistencia.
+
+    Los marcajes se pliegan en streaming a (primera entrada, última salida)
+    por persona+fecha y se escriben por lotes de BATCH_SIZE días-persona:
+    un SELECT de los registros existentes, un upsert masivo sobre
+    (colaborador, fecha), un DELETE de sus SIN_MARCA y un bulk_create de
+    las nuevas. La memoria no crece con el tamaño del archivo. En Postgres
+    los lotes son de BATCH_SIZE_COPY y van por COPY + SQL (_guardar_lote_sql).
+
+    Los días que ya estaban guardados con las mismas horas se omiten; los
+    que cambian quedan en DiaPendiente para que el motor de reglas
+    recalcule solo esas anomalías (asistencia.utils.analizar_pendientes).
+
+    Si el archivo no viene agrupado por RUT/fecha, se deshace lo escrito y
+    se reprocesa con un ordenamiento externo acotado (_agrupar_con_spill).
+
+    Con `guardar_avance` (cola de cargas) cada lote se confirma por separado
+    con su checkpoint y un intento posterior retoma desde `avance`. Como ahí
+    no se puede deshacer lo confirmado, el orden del archivo se revisa antes
+    de escribir y el modo de agrupación queda en el checkpoint.
+
+    Returns:
+        dict: registros_creados, registros_actualizados, registros_sin_cambios,
+              ruts_no_encontrados, anomalias_creadas, errores y el rango de
+              fechas del archivo (fecha_desde, fecha_hasta)
+    """
+    if guardar_avance is not None:
+        avance = dict(avance or {})
+        if not avance.get('modo'):
+            avance['modo'] = 'contiguo' if _es_contiguo(archivo_file) else 'spill'
+        agrupar = _agrupar_contiguo if avance['modo'] == 'contiguo' else _agrupar_con_spill
+        return _procesar_estadia(archivo_file, archivo_origen, agrupar, avance, guardar_avance)
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                return _procesar_estadia(archivo_file, archivo_origen, _agrupar_contiguo)
+        except _EntradaDesordenada:
+            if hasattr(archivo_file, 'seek'):
+                archivo_file.seek(0)
+            return _procesar_estadia(archivo_file, archivo_origen, _agrupar_con_spill)
+
+
+def procesar_carga(carga):
+    """Punto de entrada de la cola (core.cargas) para cargas tipo ASISTENCIA."""
+    from .utils import analizar_pendientes     # utils carga pandas: solo en el worker
+
+    with carga.archivo.open('rb') as archivo:
+        resultado = procesar_estadia(
+            archivo, archivo_origen=carga,
+            avance=carga.avance, guardar_avance=partial(guardar_avance, carga),
+        )
+    # Reevaluar con las reglas solo los días que cambiaron en esta carga
+    resultado['anomalias_motor'] = analizar_pendientes()['anomalias']
+    resultado['mensaje'] = (
+        f"Nuevos: {resultado['registros_creados']} | "
+        f"Actualizados: {resultado['registros_actualizados']} | "
+        f"Sin cambios: {resultado['registros_sin_cambios']} | "
+        f"RUTs no encontrados: {resultado['ruts_no_encontrados']} | "
+        f"Anomalías: {resultado['anomalias_creadas'] + resultado['anomalias_motor']}"
+    )
+    return resultado
@@ -1,3 +1,541 @@
-from django.test import TestCase
+import random
+from datetime import date, time
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from openpyxl import Workbook
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from dotacion.models import Colaborador
+
+from .models import Anomalia, DiaPendiente, Marcaje, RegistroAsistencia, ReglaAsistencia
+from .pendientes import marcar_pendientes
+from .reglas import MatcherReglas, matcher_reglas, normalizar
+from .services import _agrupar_con_spill, _agrupar_contiguo, _EntradaDesordenada, procesar_estadia
+from .utils import (
+    analizar_asistencia_dia, analizar_asistencia_rango, analizar_pendientes, importar_asistencia_grex,
+    importar_fichas_grex, snapshot_analisis,
+)
+
+
+LUNES  = date(2025, 3, 3)
+SABADO = date(2025, 3, 8)
+
+
+def persona(rut, area='PACKING', turno='TURNO MAÑANA', estado_ficha='Vigente', **campos):
+    return Colaborador.objects.create(
+        rut=rut, nombre_completo=f'PERSONA {rut}', area=area, turno=turno, estado_ficha=estado_ficha, **campos,
+    )
+
+
+def marcar(rut, dia, *horas):
+    Marcaje.objects.bulk_create([
+        Marcaje(colaborador_id=rut, fecha=dia, hora=time(*map(int, h.split(':')))) for h in horas
+    ])
+
+
+def reporte_estadia(marcajes):
+    """Reporte de Estadía en memoria: 9 filas de metadata, el encabezado y una fila (rut, fecha, hora, movimiento) por marcaje."""
+    libro = Workbook()
+    hoja  = libro.active
+    hoja.append(['REPORTE DE ESTADIA'])
+    for _ in range(8):
+        hoja.append([])
+    hoja.append(['RUT', 'NOMBRE', 'FECHA', 'HORA', 'MOVIMIENTO'])
+    for rut, fecha, hora, movimiento in marcajes:
+        hoja.append([rut, 'PERSONA', fecha, hora, movimiento])
+    archivo = BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+def registros():
+    return sorted(RegistroAsistencia.objects.values_list('colaborador_id', 'fecha', 'hora_entrada', 'hora_salida'))
+
+
+def anomalias():
+    return sorted(
+        Anomalia.objects.values_list('colaborador_id', 'fecha', 'tipo', 'observacion', 'minutos_perdidos')
+    )
+
+
+# Lotes de dos días-persona: cada archivo de prueba se escribe en varios lotes
+@mock.patch('asistencia.services.BATCH_SIZE', 2)
+@mock.patch('asistencia.services.BATCH_SIZE_COPY', 2)
+class ProcesarEstadiaTests(TestCase):
+
+    MARCAJES = [
+        ('1-9', '03-03-2025', '08:00', 'Entrada'),
+        ('1-9', '03-03-2025', '08:05', 'Entrada'),     # gana la primera entrada
+        ('1-9', '03-03-2025', '17:00', 'Salida'),
+        ('1-9', '04-03-2025', '08:10', 'Entrada'),     # sin salida: SIN_MARCA
+        ('2-7', '03-03-2025', '07:55', 'Entrada'),
+        ('2-7', '03-03-2025', '13:00', 'Salida'),
+        ('2-7', '03-03-2025', '17:30', 'Salida'),      # gana la última salida
+        ('2-7', '03-03-2025', '12:00', 'Colación'),    # otro movimiento: se ignora
+        ('9-9', '03-03-2025', '08:00', 'Entrada'),     # RUT fuera de la dotación
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        persona('1-9')
+        persona('2-7')
+
+    def test_escribe_por_lotes(self):
+        resultado = procesar_estadia(reporte_estadia(self.MARCAJES))
+        self.assertEqual(
+            {k: resultado[k] for k in ('registros_creados', 'registros_actualizados', 'ruts_no_encontrados', 'anomalias_creadas')},
+            {'registros_creados': 3, 'registros_actualizados': 0, 'ruts_no_encontrados': 1, 'anomalias_creadas': 1},
+        )
+        self.assertEqual((resultado['fecha_desde'], resultado['fecha_hasta']), (LUNES, date(2025, 3, 4)))
+        self.assertEqual(registros(), [
+            ('1-9', LUNES, time(8, 0), time(17, 0)),
+            ('1-9', date(2025, 3, 4), time(8, 10), None),
+            ('2-7', LUNES, time(7, 55), time(17, 30)),
+        ])
+        self.assertEqual(anomalias(), [('1-9', date(2025, 3, 4), 'SIN_MARCA', 'Solo tiene marca de entrada, falta salida.', None)])
+
+    def test_reimportar_solo_escribe_lo_que_cambia(self):
+        procesar_estadia(reporte_estadia(self.MARCAJES))
+        DiaPendiente.objects.all().delete()
+
+        completo  = self.MARCAJES + [('1-9', '04-03-2025', '17:00', 'Salida')]
+        resultado = procesar_estadia(reporte_estadia(completo))
+        self.assertEqual(
+            (resultado['registros_creados'], resultado['registros_actualizados'], resultado['registros_sin_cambios']),
+            (0, 1, 2),
+        )
+        self.assertEqual(anomalias(), [])
+        self.assertEqual(list(DiaPendiente.objects.values_list('colaborador_id', 'fecha')), [('1-9', date(2025, 3, 4))])
+
+class AgrupacionMarcajesTests(TestCase):
+
+    MARCAJES = [
+        (rut, date(2025, 3, dia), time(h, m), movimiento)
+        for rut in ('1-9', '2-7', '3-5')
+        for dia in (3, 4, 5)
+        for h, m, movimiento in ((8, dia, 'Entrada'), (7, 50 + dia, 'Entrada'), (17, dia, 'Salida'))
+    ]
+
+    def test_spill_igual_al_contiguo(self):
+        esperado = list(_agrupar_contiguo(self.MARCAJES))
+        self.assertEqual(len(esperado), 9)
+        self.assertEqual(esperado[0], (('1-9', LUNES), (time(7, 53), time(17, 3))))
+
+        desordenados = self.MARCAJES[1::2] + self.MARCAJES[::2]
+        for max_grupos in (2, 4, 100):                   # con y sin tramos en disco
+            self.assertEqual(list(_agrupar_con_spill(desordenados, max_grupos)), esperado)
+
+    def test_contiguo_detecta_desorden(self):
+        desordenados = self.MARCAJES[3:] + self.MARCAJES[:3]
+        with self.assertRaises(_EntradaDesordenada):
+            list(_agrupar_contiguo(desordenados))
+
+    def test_archivo_desordenado_se_reprocesa(self):
+        persona('1-9')
+        persona('2-7')
+        texto = [(rut, fecha.strftime('%d-%m-%Y'), hora.strftime('%H:%M'), mov) for rut, fecha, hora, mov in self.MARCAJES]
+        procesar_estadia(reporte_estadia(texto))
+        ordenado = registros()
+        RegistroAsistencia.objects.all().delete()
+
+        # Un RUT vuelve a aparecer al final: se deshace lo escrito y se agrupa con spill
+        resultado = procesar_estadia(reporte_estadia(texto[5:] + texto[:5]))
+        self.assertEqual(resultado['registros_creados'], 6)
+        self.assertEqual(registros(), ordenado)
+
+
+class AnalisisDiaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        ReglaAsistencia.objects.create(nombre='MAÑANA', entrada_teorica=time(8, 0), holgura_minutos=5, tiempo_maximo_colacion=60)
+        for rut in ('1-9', '2-7', '3-5', '4-3'):
+            persona(rut)
+
+    def test_anomalias_del_motor(self):
+        marcar('1-9', LUNES, '08:03', '13:00', '14:00', '17:00')      # sin anomalías
+        marcar('2-7', LUNES, '08:20', '13:00', '14:30', '17:00')      # atraso y exceso de colación
+        marcar('3-5', date(2025, 3, 4), '08:00')                       # marcó otro día: ausente
+        self.assertEqual(analizar_asistencia_dia(LUNES), 4)
+        self.assertEqual(anomalias(), [
+            ('2-7', LUNES, 'ATRASO', 'Entró 08:20', 20),
+            ('2-7', LUNES, 'EXCESO_COLACION', 'Tomó 90 min', 30),
+            ('3-5', LUNES, 'AUSENCIA', None, 480),
+            ('4-3', LUNES, 'AUSENCIA', None, 480),
+        ])
+
+    def test_reanalizar_no_duplica(self):
+        analizar_asistencia_dia(LUNES)
+        marcar('3-5', LUNES, '08:00')
+        analizar_asistencia_dia(LUNES)
+        self.assertEqual([a[0] for a in anomalias()], ['1-9', '2-7', '4-3'])
+
+    def test_conserva_sin_marca_de_la_importacion(self):
+        marcar('1-9', LUNES, '08:00')
+        registro = RegistroAsistencia.objects.create(colaborador_id='1-9', fecha=LUNES, hora_entrada=time(8, 0))
+        Anomalia.objects.create(
+            registro=registro, colaborador_id='1-9', fecha=LUNES, tipo='SIN_MARCA',
+            observacion='Solo tiene marca de entrada, falta salida.',
+        )
+        analizar_asistencia_dia(LUNES)
+        analizar_asistencia_dia(LUNES)
+        self.assertEqual([a[2] for a in anomalias() if a[0] == '1-9'], ['SIN_MARCA'])
+
+    def test_no_crea_registros_de_asistencia(self):
+        RegistroAsistencia.objects.create(colaborador_id='1-9', fecha=LUNES, hora_entrada=time(8, 20))
+        marcar('1-9', LUNES, '08:20')
+        analizar_asistencia_dia(LUNES)
+        self.assertEqual(RegistroAsistencia.objects.count(), 1)
+        self.assertEqual([a[:3] for a in anomalias()], [
+            ('1-9', LUNES, 'ATRASO'), ('2-7', LUNES, 'AUSENCIA'), ('3-5', LUNES, 'AUSENCIA'), ('4-3', LUNES, 'AUSENCIA'),
+        ])
+
+        # Una importación posterior de los ausentes los cuenta como registros nuevos
+        resultado = procesar_estadia(reporte_estadia([
+            ('2-7', '03-03-2025', '08:00', 'Entrada'), ('2-7', '03-03-2025', '17:00', 'Salida'),
+        ]))
+        self.assertEqual((resultado['registros_creados'], resultado['registros_actualizados']), (1, 0))
+
+    def test_fin_de_semana_sin_ausencias(self):
+        self.assertEqual(analizar_asistencia_dia(SABADO), 0)
+
+    def test_turno_noche_usa_el_dia_siguiente(self):
+        ReglaAsistencia.objects.create(
+            nombre='NOCHE', palabra_clave_turno='NOCHE', entrada_teorica=time(22, 0), es_turno_noche=True,
+        )
+        persona('5-1', turno='TURNO NOCHE')
+        persona('6-K', turno='TURNO NOCHE')
+        marcar('5-1', LUNES, '22:10')
+        marcar('6-K', date(2025, 3, 4), '00:30')         # solo marcó pasada la medianoche: no es ausencia
+        analizar_asistencia_dia(LUNES)
+        nocturnos = [a for a in anomalias() if a[0] in ('5-1', '6-K')]
+        self.assertEqual(nocturnos, [('5-1', LUNES, 'ATRASO', 'Entró 22:10', 10)])
+
+
+class SnapshotAnalisisTests(TestCase):
+
+    def test_sin_reglas(self):
+        persona('1-9')
+        self.assertIsNone(snapshot_analisis())
+
+    def test_vigentes_segun_estado_ficha(self):
+        # Mismo criterio que antes del motor por lotes: el texto de GREX, no Colaborador.estado
+        ReglaAsistencia.objects.create(nombre='GENERAL', entrada_teorica=time(8, 0))
+        persona('1-9', estado_ficha='Vigente')
+        persona('2-7', estado_ficha='VIGENTE CON LICENCIA', estado='BLOQUEADO')
+        persona('3-5', estado_ficha='Finiquitado')
+        persona('4-3', estado_ficha=None)
+        colaboradores, _ = snapshot_analisis()
+        self.assertEqual(sorted(c[0] for c in colaboradores), ['1-9', '2-7'])
+
+
+def semana_con_marcajes():
+    ReglaAsistencia.objects.create(nombre='MAÑANA', entrada_teorica=time(8, 0), holgura_minutos=5, tiempo_maximo_colacion=60)
+    for rut in ('1-9', '2-7', '3-5'):
+        persona(rut)
+    for dia in range(3, 10):
+        fecha = date(2025, 3, dia)
+        marcar('1-9', fecha, '08:00', '13:00', '14:00', '17:00')
+        marcar('2-7', fecha, f'08:{dia + 3:02d}', '13:00', '14:30', '17:00')
+        # 3-5 no marca nunca
+
+
+class AnalisisRangoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        semana_con_marcajes()
+
+    def test_rango_igual_a_dia_por_dia(self):
+        for dia in range(3, 10):
+            analizar_asistencia_dia(date(2025, 3, dia))
+        por_dia = anomalias()
+        Anomalia.objects.all().delete()
+
+        resumen = analizar_asistencia_rango(LUNES, date(2025, 3, 9))
+        self.assertEqual(anomalias(), por_dia)
+        self.assertEqual((resumen['dias'], resumen['personas'], resumen['anomalias']), (7, 3, len(por_dia)))
+        self.assertEqual(resumen['por_dia'][SABADO], 2)          # sin ausencias el fin de semana
+
+
+class AnalisisRangoProcesosTests(TransactionTestCase):
+    """Los procesos del pool abren su propia conexión: necesitan datos confirmados y una BD compartida."""
+
+    def test_pool_igual_a_un_proceso(self):
+        if connection.vendor == 'sqlite':
+            self.skipTest('la BD de pruebas de SQLite vive en memoria del proceso')
+        semana_con_marcajes()
+        analizar_asistencia_rango(LUNES, date(2025, 3, 9))
+        un_proceso = anomalias()
+        Anomalia.objects.all().delete()
+
+        resumen = analizar_asistencia_rango(LUNES, date(2025, 3, 9), workers=3)
+        self.assertEqual(anomalias(), un_proceso)
+        self.assertEqual(resumen['anomalias'], len(un_proceso))
+
+
+def regla_por_bucle(reglas, area, turno):
+    """Selección anterior al índice compilado, tal cual: se recorre la lista de reglas."""
+    area_colab, turno_colab = normalizar(area), normalizar(turno)
+    candidatas = [r for r in reglas if not normalizar(r.area) or normalizar(r.area) in area_colab]
+    if not candidatas:
+        return None
+    for cand in candidatas:
+        clave = normalizar(cand.palabra_clave_turno)
+        if clave and clave in turno_colab:
+            return cand
+    for cand in candidatas:
+        if not cand.palabra_clave_turno:
+            return cand
+    return candidatas[0]
+
+
+class MatcherReglasTests(TestCase):
+
+    def _reglas(self, *definiciones):
+        return [
+            ReglaAsistencia(id=i, nombre=f'R{i}', area=area, palabra_clave_turno=clave, entrada_teorica=time(8, 0))
+            for i, (area, clave) in enumerate(definiciones, 1)
+        ]
+
+    def test_precedencia(self):
+        reglas = self._reglas(
+            ('PACKING', ''),            # R1: genérica de packing
+            ('PACK', 'NOCHE'),          # R2: el área se busca como texto contenido
+            ('PACKING', 'NOCHE'),       # R3: llega tarde, gana R2
+            ('CAMPO', 'MAÑANA'),        # R4
+            ('CAMPO', 'TARDE'),         # R5
+            ('BODEGA', '  '),           # R6: clave en blanco, no es genérica
+            ('', 'NOCHE'),              # R7: noche en cualquier área
+        )
+        matcher = MatcherReglas(reglas)
+        casos = {
+            ('Packing Norte', 'turno noche'): 'R2',
+            ('PACKING', 'TURNO DIA'):         'R1',
+            ('CAMPO', 'TURNO TARDE'):         'R5',
+            ('CAMPO', 'TURNO DIA'):           'R4',   # ni clave ni genérica: la primera candidata
+            ('BODEGA', 'TURNO DIA'):          'R6',
+            ('ADMINISTRACION', 'TURNO DIA'):  'R7',
+            (None, None):                     'R7',
+        }
+        for (area, turno), esperada in casos.items():
+            self.assertEqual(matcher.regla_para(area, turno).nombre, esperada, (area, turno))
+        self.assertIsNone(MatcherReglas(reglas[:-1]).regla_para('ADMINISTRACION', 'TURNO NOCHE'))
+
+    def test_igual_al_bucle_con_patrones_solapados(self):
+        azar    = random.Random(12)
+        piezas  = ['A', 'B', 'AB', 'BA', 'ABA', 'C', '']
+        for _ in range(50):
+            reglas  = self._reglas(*[(azar.choice(piezas), azar.choice(piezas)) for _ in range(azar.randint(1, 8))])
+            matcher = MatcherReglas(reglas)
+            for _ in range(40):
+                area  = ''.join(azar.choices('ABC', k=azar.randint(0, 5)))
+                turno = ''.join(azar.choices('ABC ', k=azar.randint(0, 6)))
+                self.assertIs(matcher.regla_para(area, turno), regla_por_bucle(reglas, area, turno), (area, turno))
+
+    def test_matcher_se_renueva_al_cambiar_reglas(self):
+        self.assertIsNone(matcher_reglas())
+        regla = ReglaAsistencia.objects.create(nombre='GENERAL', entrada_teorica=time(8, 0))
+        self.assertEqual(matcher_reglas().regla_para('PACKING', 'DIA'), regla)
+        self.assertIs(matcher_reglas(), matcher_reglas())
+
+        noche = ReglaAsistencia.objects.create(nombre='NOCHE', palabra_clave_turno='NOCHE', entrada_teorica=time(22, 0))
+        self.assertEqual(matcher_reglas().regla_para('PACKING', 'TURNO NOCHE'), noche)
+
+
+class AnalisisPendientesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        semana_con_marcajes()
+        ReglaAsistencia.objects.create(
+            nombre='NOCHE', palabra_clave_turno='NOCHE', entrada_teorica=time(22, 0), es_turno_noche=True,
+        )
+        persona('4-3', turno='TURNO NOCHE')
+        marcar('4-3', LUNES, '22:00')
+        marcar('4-3', date(2025, 3, 4), '22:00')
+
+    def test_solo_reevalua_lo_pendiente(self):
+        analizar_asistencia_rango(LUNES, date(2025, 3, 7))
+        antes = dict(Anomalia.objects.values_list('id', 'colaborador_id'))
+
+        # 3-5 aparece marcando el martes; también cambia un día de 1-9 sin quedar pendiente
+        marcar('3-5', date(2025, 3, 4), '08:00')
+        Marcaje.objects.filter(colaborador_id='1-9', fecha=date(2025, 3, 5), hora=time(8, 0)).update(hora=time(9, 0))
+        marcar_pendientes([('3-5', date(2025, 3, 4))])
+
+        resumen = analizar_pendientes()
+        self.assertEqual((resumen['pendientes'], resumen['evaluados'], resumen['anomalias']), (1, 1, 0))
+        self.assertNotIn(('3-5', date(2025, 3, 4), 'AUSENCIA', None, 480), anomalias())
+        self.assertNotIn(('1-9', date(2025, 3, 5), 'ATRASO', 'Entró 09:00', 60), anomalias())
+        # Las anomalías de las demás personas-día no se tocaron
+        self.assertEqual(
+            {pk: rut for pk, rut in antes.items() if rut != '3-5'},
+            dict(Anomalia.objects.exclude(colaborador_id='3-5').values_list('id', 'colaborador_id')),
+        )
+        self.assertFalse(DiaPendiente.objects.exists())
+
+    def test_turno_noche_reevalua_el_dia_anterior(self):
+        analizar_asistencia_rango(LUNES, date(2025, 3, 7))
+        self.assertIn(('4-3', date(2025, 3, 5), 'AUSENCIA', None, 480), anomalias())
+
+        # La marca del jueves 00:30 cae en la ventana del turno del miércoles y en la del jueves:
+        # ninguno de los dos días queda como ausencia
+        marcar('4-3', date(2025, 3, 6), '00:30')
+        marcar_pendientes([('4-3', date(2025, 3, 6))])
+        resumen = analizar_pendientes()
+
+        self.assertEqual(resumen['evaluados'], 2)
+        nocturnas = [a for a in anomalias() if a[0] == '4-3']
+        self.assertEqual(nocturnas, [('4-3', date(2025, 3, 7), 'AUSENCIA', None, 480)])
+
+    def test_sin_reglas_quedan_pendientes(self):
+        ReglaAsistencia.objects.all().delete()
+        marcar_pendientes([('1-9', LUNES)])
+        self.assertEqual(analizar_pendientes()['evaluados'], 0)
+        self.assertTrue(DiaPendiente.objects.exists())
+
+
+def csv_grex(nombre, encabezado, filas):
+    """Export GREX en CSV (latin-1, separado por ;) con dos filas de metadata."""
+    lineas = ['EXPORTACION GREX', 'Empresa;AURORA', ';'.join(encabezado)]
+    lineas += [';'.join('' if v is None else str(v) for v in fila) for fila in filas]
+    return SimpleUploadedFile(nombre, '\r\n'.join(lineas).encode('latin-1'))
+
+
+def xlsx_grex(nombre, encabezado, filas):
+    libro = Workbook()
+    hoja  = libro.active
+    hoja.append(['EXPORTACION GREX'])
+    hoja.append([])
+    hoja.append(encabezado)
+    for fila in filas:
+        hoja.append(list(fila))
+    archivo = BytesIO()
+    libro.save(archivo)
+    return SimpleUploadedFile(nombre, archivo.getvalue())
+
+
+class ImportadoresGrexTests(TestCase):
+
+    ENCABEZADO_FICHAS = ['RUT', 'NOMBRES', 'PRIMER APELLIDO', 'SEGUNDO APELLIDO', 'ÁREA', 'CARGO', 'ESTADO FICHA', 'TURNO']
+    FICHAS = [
+        ('1.111.111-1', 'ANA', 'SOTO', None, 'PACKING', 'OPERARIA', 'Vigente', 'TURNO MAÑANA'),
+        ('2.222.222-2', 'LUIS  ', 'PEREZ', 'ROJAS', 'CAMPO', None, None, None),
+        ('x', 'SIN', 'RUT', None, None, None, None, None),                     # RUT inválido: se descarta
+        ('1.111.111-1', 'ANA', 'SOTO', 'DIAZ', 'PACKING', 'SUPERVISORA', 'Vigente', 'TURNO NOCHE'),
+    ]
+
+    def _fichas(self):
+        return sorted(Colaborador.objects.values_list('rut', 'nombre_completo', 'area', 'cargo', 'estado_ficha', 'turno'))
+
+    def test_fichas_csv_y_xlsx(self):
+        persona('2222222-2', area='CAMPO')
+        esperado = [
+            ('1111111-1', 'ANA SOTO DIAZ', 'PACKING', 'SUPERVISORA', 'Vigente', 'TURNO NOCHE'),     # gana la última
+            ('2222222-2', 'LUIS PEREZ ROJAS', 'CAMPO', None, 'Vigente', ''),
+        ]
+        self.assertEqual(importar_fichas_grex(csv_grex('fichas.csv', self.ENCABEZADO_FICHAS, self.FICHAS)), (1, 2))
+        self.assertEqual(self._fichas(), esperado)
+
+        Colaborador.objects.all().delete()
+        self.assertEqual(importar_fichas_grex(xlsx_grex('fichas.xlsx', self.ENCABEZADO_FICHAS, self.FICHAS)), (2, 1))
+        self.assertEqual(self._fichas(), esperado)
+
+    def test_fichas_sin_rut(self):
+        with self.assertRaisesMessage(Exception, "No se encontró la columna 'RUT'."):
+            importar_fichas_grex(csv_grex('fichas.csv', ['NOMBRES'], [('ANA',)]))
+
+    def test_marcajes(self):
+        persona('1-9')
+        persona('2-7')
+        encabezado = ['RUT', 'FECHA', 'HORA', 'MOVIMIENTO', 'CÓDIGO DISPOSITIVO']
+        filas = [
+            ('1-9', '03-03-2025', '8:00', 'Entrada', 'RELOJ1'),
+            ('1-9', '03-03-2025', '08:00:00', 'Entrada', 'RELOJ2'),      # mismo marcaje: gana el primero
+            ('1-9', '2025-03-03', '17:05:30', 'Salida', None),
+            ('2-7', '04/03/2025', '25:00', 'Entrada', None),             # hora inválida: se descarta
+            ('2-7', '04/03/2025', '07:58', 'Entrada', None),
+            ('9-9', '03-03-2025', '08:00', 'Entrada', None),             # RUT fuera de la dotación
+        ]
+        self.assertEqual(importar_asistencia_grex(csv_grex('marcajes.csv', encabezado, filas)), (3, 1))
+        self.assertEqual(
+            sorted(Marcaje.objects.values_list('colaborador_id', 'fecha', 'hora', 'dispositivo')),
+            [
+                ('1-9', LUNES, time(8, 0), 'RELOJ1'),
+                ('1-9', LUNES, time(17, 5, 30), None),
+                ('2-7', date(2025, 3, 4), time(7, 58), None),
+            ],
+        )
+        self.assertEqual(
+            sorted(DiaPendiente.objects.values_list('colaborador_id', 'fecha')),
+            [('1-9', LUNES), ('2-7', date(2025, 3, 4))],
+        )
+
+        # Reimportar no duplica ni deja días pendientes nuevos
+        DiaPendiente.objects.all().delete()
+        self.assertEqual(importar_asistencia_grex(xlsx_grex('marcajes.xlsx', encabezado, filas)), (0, 1))
+        self.assertEqual(Marcaje.objects.count(), 3)
+        self.assertFalse(DiaPendiente.objects.exists())
+
+
+class CaidaSimulada(Exception):
+    pass
+
+
+@mock.patch('asistencia.services.BATCH_SIZE', 2)
+@mock.patch('asistencia.services.BATCH_SIZE_COPY', 2)
+class CheckpointEstadiaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for rut in ('1-9', '2-7', '3-5'):
+            persona(rut)
+        cls.marcajes = [
+            (rut, f'{dia:02d}-03-2025', hora, movimiento)
+            for rut in ('1-9', '2-7', '3-5')
+            for dia in (3, 4)
+            for hora, movimiento in (('08:00', 'Entrada'), ('17:00', 'Salida'))
+        ]
+
+    def _importar_con_caida(self, marcajes, caer_en):
+        """Importa guardando checkpoints; el worker muere al confirmar el lote `caer_en`. Devuelve el último checkpoint."""
+        checkpoints = []
+
+        def guardar(avance):
+            if len(checkpoints) + 1 == caer_en:
+                raise CaidaSimulada()
+            checkpoints.append(avance)
+
+        with self.assertRaises(CaidaSimulada):
+            procesar_estadia(reporte_estadia(marcajes), guardar_avance=guardar)
+        return checkpoints[-1]
+
+    def test_retomar_no_duplica_dias(self):
+        avance = self._importar_con_caida(self.marcajes, caer_en=2)
+        self.assertEqual((avance['dias'], avance['registros_creados'], avance['modo']), (2, 2, 'contiguo'))
+        self.assertEqual(RegistroAsistencia.objects.count(), 2)          # el lote 2 se deshizo
+
+        guardados = []
+        resultado = procesar_estadia(reporte_estadia(self.marcajes), avance=avance, guardar_avance=guardados.append)
+        self.assertEqual(
+            (resultado['registros_creados'], resultado['registros_actualizados'], resultado['registros_sin_cambios']),
+            (6, 0, 0),
+        )
+        self.assertEqual([g['dias'] for g in guardados], [4, 6])
+        self.assertEqual(RegistroAsistencia.objects.count(), 6)
+        self.assertEqual((resultado['fecha_desde'], resultado['fecha_hasta']), (LUNES, date(2025, 3, 4)))
+
+    def test_retomar_desordenado_sigue_con_spill(self):
+        desordenados = self.marcajes[2:] + self.marcajes[:2]          # 1-9 reaparece al final
+        avance = self._importar_con_caida(desordenados, caer_en=3)
+        self.assertEqual(avance['modo'], 'spill')
+
+        resultado = procesar_estadia(reporte_estadia(desordenados), avance=avance, guardar_avance=lambda a: None)
+        self.assertEqual(resultado['registros_creados'], 6)
+        self.assertEqual(RegistroAsistencia.objects.count(), 6)
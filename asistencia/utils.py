@@ -1,235 +1,485 @@
+import csv
+import io
+import time
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, date
-from django.db.models import Q
-from asistencia.models import Colaborador, Marcaje, ReglaAsistencia, Anomalia
+from django.db import connection, connections, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from core.bulk import insertar_filas
+from dotacion.dotacion_diaria import CAMPOS_DOTACION, afectados, marcar_afectados
+from dotacion.kpis import invalidar_kpis_al_confirmar
+from dotacion.models import Colaborador
+from asistencia.models import Marcaje, Anomalia
+from asistencia.pendientes import descartar_pendientes, leer_pendientes, marcar_pendientes
+from asistencia.reglas import matcher_reglas
 
 # ==========================================
-# 1. IMPORTADOR DE FICHAS (PERSONAS)
+# 0. LECTURA DE REPORTES GREX
 # ==========================================
-def importar_fichas_grex(archivo):
+# Los importadores trabajan con columnas completas (pandas vectorizado): el
+# encabezado se detecta con una búsqueda sobre las primeras filas, RUT /
+# fecha / hora se normalizan de una vez, el cruce con Colaborador es contra
+# un set precargado y los marcajes se escriben con INSERT multi-fila
+# (core.bulk), sin instanciar un modelo por fila.
+
+BATCH_SIZE = 1000
+
+# El encabezado de los reportes GREX está en las primeras filas (metadata arriba)
+FILAS_BUSQUEDA_ENCABEZADO = 100
+
+FORMATOS_FECHA = ('%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S')
+
+
+def _fila_encabezado(textos, requeridas):
+    """Índice de la primera fila que contiene todas las `requeridas` (textos ya en mayúsculas)."""
+    coincide = np.ones(len(textos), dtype=bool)
+    for req in requeridas:
+        coincide &= textos.apply(lambda col: col.str.contains(req, regex=False)).any(axis=1).to_numpy()
+    if not coincide.any():
+        return None
+    return int(np.argmax(coincide))
+
+
+def _leer_reporte(archivo, requeridas, error_encabezado):
+    """DataFrame (todo como texto) desde la fila de encabezado de un reporte CSV o Excel."""
+    es_csv = archivo.name.lower().endswith('.csv')
     try:
-        if archivo.name.lower().endswith('.csv'):
-            df_raw = pd.read_csv(archivo, header=None, sep=None, engine='python', encoding='latin-1')
+        if es_csv:
+            contenido = archivo.read()
+            lineas    = contenido[:1_000_000].decode('latin-1').splitlines()[:FILAS_BUSQUEDA_ENCABEZADO]
+            textos    = pd.DataFrame({0: pd.Series(lineas, dtype=str).str.upper()})
         else:
-            df_raw = pd.read_excel(archivo, header=None)
+            raw    = pd.read_excel(archivo, header=None, dtype=object)
+            textos = raw.head(FILAS_BUSQUEDA_ENCABEZADO).astype(str).apply(lambda col: col.str.upper())
     except Exception as e:
         raise Exception(f"No se pudo leer el archivo: {e}")
 
-    header_idx = None
-    for i, row in df_raw.iterrows():
-        if row.astype(str).str.contains('RUT').any():
-            header_idx = i
+    idx = _fila_encabezado(textos, requeridas)
+    if idx is None:
+        raise Exception(error_encabezado)
+
+    if es_csv:
+        # Motor C de pandas: el separador se detecta solo sobre la fila de encabezado
+        try:
+            sep = csv.Sniffer().sniff(lineas[idx], delimiters=',;\t|').delimiter
+        except csv.Error:
+            sep = ','
+        try:
+            df = pd.read_csv(
+                io.BytesIO(contenido), skiprows=idx, sep=sep, dtype=str,
+                encoding='latin-1', keep_default_na=False,
+            )
+        except Exception as e:
+            raise Exception(f"No se pudo leer el archivo: {e}")
+    else:
+        df = raw.iloc[idx + 1:].copy()
+        df.columns = raw.iloc[idx].astype(str)
+
+    df.columns = df.columns.astype(str).str.strip().str.upper()
+    df = df.loc[:, ~df.columns.duplicated()]
+    return df.reset_index(drop=True)
+
+
+def _texto(df, columna):
+    """Columna como texto limpio (vacío -> NA); NA completo si la columna no existe."""
+    if columna not in df:
+        return pd.Series(pd.NA, index=df.index, dtype='string')
+    s = df[columna].astype('string').str.strip()
+    return s.mask(s.str.upper().isin(['', 'NONE', 'NAN', 'NAT', '<NA>']))
+
+
+def _normalizar_rut(df):
+    """RUT sin puntos y en mayúsculas (mismo criterio que las cargas de dotación)."""
+    rut = _texto(df, 'RUT').str.replace('.', '', regex=False).str.upper()
+    return rut.mask(rut.str.len() < 3)
+
+
+def _normalizar_fecha(df, columna='FECHA'):
+    texto = _texto(df, columna)
+    fecha = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    for fmt in FORMATOS_FECHA:
+        faltan = fecha.isna() & texto.notna()
+        if not faltan.any():
             break
-    
-    if header_idx is None:
-        raise Exception("No se encontró la columna 'RUT'.")
+        fecha[faltan] = pd.to_datetime(texto[faltan], format=fmt, errors='coerce')
+    return fecha
 
-    df = df_raw.iloc[header_idx + 1:].copy()
-    df.columns = df_raw.iloc[header_idx].astype(str).str.strip().str.upper()
-    df = df.replace({np.nan: None})
 
-    c_creados = 0
-    c_actualizados = 0
+def _normalizar_hora(df, columna='HORA'):
+    """Hora como texto 'HH:MM:SS' (NA si no es válida). Acepta H:MM, segundos opcionales y fecha delante."""
+    partes = _texto(df, columna).str.extract(r'(\d{1,2}):(\d{2})(?::(\d{2}))?(?:\.\d+)?$')
+    partes[2] = partes[2].fillna('00')
+    valida = (
+        partes[0].astype('Int64').lt(24) &
+        partes[1].astype('Int64').lt(60) &
+        partes[2].astype('Int64').lt(60)
+    ).fillna(False)
+    hora = partes[0].str.zfill(2) + ':' + partes[1] + ':' + partes[2]
+    return hora.where(valida)
 
-    for _, row in df.iterrows():
-        rut_raw = str(row.get('RUT', '')).strip()
-        if not rut_raw or rut_raw in ['None', 'nan', '']:
-            continue
 
-        obj, created = Colaborador.objects.update_or_create(
-            rut=rut_raw,
-            defaults={
-                'nombres': row.get('NOMBRES'),
-                'apellido_paterno': row.get('PRIMER APELLIDO'),
-                'area': row.get('ÁREA'),
-                'seccion': row.get('SECCIÓN'),
-                'cargo': row.get('CARGO'),
-                'estado_ficha': row.get('ESTADO FICHA', 'Vigente'),
-                'turno': row.get('TURNO', '') # Guardamos el texto del turno para las reglas
-            }
-        )
-        if created: c_creados += 1
-        else: c_actualizados += 1
-        
-    return c_creados, c_actualizados
+def _sin_na(s):
+    """Lista con None en lugar de NA (para pasar a los modelos)."""
+    return s.astype(object).where(s.notna(), None).tolist()
+
 
 # ==========================================
-# 2. IMPORTADOR DE ASISTENCIA (MARCAJES)
+# 1. IMPORTADOR DE FICHAS (PERSONAS)
 # ==========================================
-def importar_asistencia_grex(archivo):
-    try:
-        if archivo.name.lower().endswith('.csv'):
-            df_raw = pd.read_csv(archivo, header=None, sep=None, engine='python', encoding='latin-1')
-        else:
-            df_raw = pd.read_excel(archivo, header=None)
-    except Exception as e:
-        raise Exception(f"Error lectura: {e}")
+CAMPOS_FICHA_GREX = ['nombre_completo', 'area', 'seccion', 'cargo', 'estado_ficha', 'turno']
 
-    header_idx = None
-    for i, row in df_raw.iterrows():
-        s = row.astype(str).str.upper()
-        if s.str.contains('MOVIMIENTO').any() and s.str.contains('RUT').any():
-            header_idx = i
-            break
-            
-    if header_idx is None:
-        raise Exception("No se encontró columna 'MOVIMIENTO' o 'RUT'")
 
-    df = df_raw.iloc[header_idx + 1:].copy()
-    df.columns = df_raw.iloc[header_idx].astype(str).str.strip().str.upper()
-    df = df.replace({np.nan: None})
+def importar_fichas_grex(archivo):
+    """
+    Carga rápida de fichas (área, cargo, turno...). Devuelve (creados, actualizados)
+    con la misma cuenta que el upsert fila a fila: un RUT repetido en el archivo
+    se crea una vez y las demás apariciones cuentan como actualizaciones.
+    """
+    df  = _leer_reporte(archivo, ['RUT'], "No se encontró la columna 'RUT'.")
+    rut = _normalizar_rut(df)
+    df, rut = df[rut.notna()], rut[rut.notna()]
+    filas = len(df)
 
-    nuevos = 0
-    no_encontrados = 0
+    nombre = (
+        _texto(df, 'NOMBRES').fillna('') + ' ' +
+        _texto(df, 'PRIMER APELLIDO').fillna('') + ' ' +
+        _texto(df, 'SEGUNDO APELLIDO').fillna('')
+    ).str.replace(r'\s+', ' ', regex=True).str.strip()
 
-    for index, row in df.iterrows():
-        rut_excel = str(row.get('RUT', '')).strip()
-        fecha_str = str(row.get('FECHA', '')).strip()
-        hora_str = str(row.get('HORA', '')).strip()
-        
-        if not rut_excel or len(rut_excel) < 3: continue
+    fichas = pd.DataFrame({
+        'rut'            : rut,
+        'nombre_completo': nombre,
+        'area'           : _texto(df, 'ÁREA'),
+        'seccion'        : _texto(df, 'SECCIÓN'),
+        'cargo'          : _texto(df, 'CARGO'),
+        'estado_ficha'   : _texto(df, 'ESTADO FICHA').fillna('Vigente'),
+        'turno'          : _texto(df, 'TURNO').fillna(''),   # texto del turno para las reglas
+    }).drop_duplicates('rut', keep='last')                   # gana la última fila, como antes
 
-        try:
-            colaborador = Colaborador.objects.get(rut=rut_excel)
-        except Colaborador.DoesNotExist:
-            no_encontrados += 1
-            continue
+    ruts = fichas['rut'].tolist()
+    anteriores = {}
+    for i in range(0, len(ruts), BATCH_SIZE):
+        for previo in Colaborador.objects.filter(rut__in=ruts[i:i + BATCH_SIZE]).values('rut', *CAMPOS_DOTACION):
+            anteriores[previo['rut']] = previo
 
-        # Lógica Robusta de Fecha
-        fecha_obj = None
-        try:
-            if isinstance(row.get('FECHA'), (datetime, pd.Timestamp)):
-                fecha_obj = row.get('FECHA').date()
-            else:
-                for fmt in ('%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d'):
-                    try:
-                        fecha_obj = datetime.strptime(fecha_str, fmt).date()
-                        break
-                    except ValueError: continue
-            
-            if not fecha_obj: continue
-        except:
-            continue
+    columnas = {c: _sin_na(fichas[c]) for c in fichas.columns}
+    objs = [
+        Colaborador(**{c: columnas[c][i] for c in columnas}, hash_ficha=None)
+        for i in range(len(fichas))
+    ]
 
-        # Crear Marcaje
-        try:
-            _, created = Marcaje.objects.get_or_create(
-                colaborador=colaborador,
-                fecha=fecha_obj,
-                hora=hora_str,
-                defaults={
-                    'tipo_movimiento': row.get('MOVIMIENTO'),
-                    'dispositivo': row.get('CÓDIGO DISPOSITIVO')
-                }
+    with transaction.atomic():
+        # hash_ficha en NULL: la próxima carga de dotación compara campo a campo
+        campos = CAMPOS_FICHA_GREX + ['hash_ficha', 'updated_at']
+        if connection.features.supports_update_conflicts_with_target:
+            Colaborador.objects.bulk_create(
+                objs, batch_size=BATCH_SIZE,
+                update_conflicts=True, unique_fields=['rut'], update_fields=campos,
             )
-            if created: nuevos += 1
-        except:
-            pass
+        else:
+            Colaborador.objects.bulk_create([o for o in objs if o.rut not in anteriores], batch_size=BATCH_SIZE)
+            actualizar = [o for o in objs if o.rut in anteriores]
+            for o in actualizar:
+                o.updated_at = timezone.now()
+            Colaborador.objects.bulk_update(actualizar, campos, batch_size=BATCH_SIZE)
+
+        # El área define el grupo de DotacionDiaria: se recalculan los que cambiaron
+        grupos = {}
+        for o in objs:
+            previo = anteriores.get(o.rut)
+            if previo and (previo['area'] or '') != (o.area or ''):
+                for g, desde in afectados({**previo, 'area': o.area}, previo).items():
+                    grupos[g] = min(grupos.get(g, desde), desde)
+        marcar_afectados(grupos)
+        invalidar_kpis_al_confirmar()
+
+    c_creados = len(objs) - len(anteriores)
+    return c_creados, filas - c_creados
+
+# ==========================================
+# 2. IMPORTADOR DE ASISTENCIA (MARCAJES)
+# ==========================================
+def importar_asistencia_grex(archivo):
+    """
+    Carga de marcajes individuales. Devuelve (nuevos, no_encontrados): marcajes
+    insertados y filas cuyo RUT no existe en dotación.
+    """
+    df = _leer_reporte(archivo, ['MOVIMIENTO', 'RUT'], "No se encontró columna 'MOVIMIENTO' o 'RUT'")
+
+    marcajes = pd.DataFrame({
+        'rut'            : _normalizar_rut(df),
+        'fecha'          : _normalizar_fecha(df),
+        'hora'           : _normalizar_hora(df),
+        'tipo_movimiento': _texto(df, 'MOVIMIENTO'),
+        'dispositivo'    : _texto(df, 'CÓDIGO DISPOSITIVO'),
+    })
+    marcajes = marcajes[marcajes['rut'].notna()]
+
+    # Cruce contra los RUTs de dotación precargados (la PK de Colaborador es el RUT)
+    ruts_validos   = set(Colaborador.objects.values_list('rut', flat=True))
+    conocido       = marcajes['rut'].isin(ruts_validos)
+    no_encontrados = int((~conocido).sum())
+
+    marcajes = marcajes[conocido & marcajes['fecha'].notna() & marcajes['hora'].notna()].copy()
+    marcajes['fecha'] = marcajes['fecha'].dt.strftime('%Y-%m-%d')          # texto ISO, listo para la BD
+    marcajes = marcajes.drop_duplicates(['rut', 'fecha', 'hora'])        # gana el primero, como antes
+    if marcajes.empty:
+        return 0, no_encontrados
 
-    return nuevos, no_encontrados
+    # Solo se insertan los que no estaban (anti-join contra la BD)
+    ruts = marcajes['rut'].unique().tolist()
+    existentes = []
+    for i in range(0, len(ruts), BATCH_SIZE):
+        existentes += [
+            (rut, str(fecha), str(hora))
+            for rut, fecha, hora in
+            Marcaje.objects
+            .filter(colaborador_id__in=ruts[i:i + BATCH_SIZE],
+                    fecha__range=[marcajes['fecha'].min(), marcajes['fecha'].max()])
+            .values_list('colaborador_id', 'fecha', 'hora')
+            .iterator(chunk_size=BATCH_SIZE * 10)
+        ]
+    if existentes:
+        existentes = pd.DataFrame(existentes, columns=['rut', 'fecha', 'hora']).astype('string')
+        cruce      = marcajes.merge(existentes, on=['rut', 'fecha', 'hora'], how='left', indicator=True)
+        marcajes   = marcajes[(cruce['_merge'] == 'left_only').to_numpy()]
+
+    nuevos = marcajes[['rut', 'fecha', 'hora', 'tipo_movimiento', 'dispositivo']]
+    with transaction.atomic():
+        insertar_filas(
+            Marcaje, ['colaborador', 'fecha', 'hora', 'tipo_movimiento', 'dispositivo'],
+            zip(*(_sin_na(nuevos[c]) for c in nuevos.columns)),
+            on_conflict=OnConflict.IGNORE,
+        )
+        # Solo los días con marcajes nuevos se reevalúan (analizar_pendientes)
+        marcar_pendientes(set(zip(nuevos['rut'], nuevos['fecha'])))
+
+    return len(nuevos), no_encontrados
 
 # ==========================================
 # 3. MOTOR DE ANÁLISIS (REGLAS Y ANOMALÍAS)
 # ==========================================
+# El motor trabaja por lotes: la regla de cada (área, turno) se resuelve una
+# sola vez con el índice compilado de asistencia.reglas, los marcajes del día se traen en un único query y las anomalías
+# se escriben con bulk_create. Las anomalías del motor se guardan por
+# persona-día (colaborador, fecha): el análisis no crea RegistroAsistencia.
 
+# Tipos que genera el motor (SIN_MARCA lo genera la importación de Estadía)
+TIPOS_MOTOR = ('AUSENCIA', 'ATRASO', 'EXCESO_COLACION')
 
-def analizar_asistencia_dia(fecha_analisis):
-    # print(f"Analizando {fecha_analisis}...") # Opcional para no saturar la consola
-    
-    colaboradores = Colaborador.objects.filter(estado_ficha__icontains='Vigente')
-    todas_las_reglas = list(ReglaAsistencia.objects.all())
-    
-    if not todas_las_reglas: return 0
-
-    # Limpieza preventiva: Borrar anomalías de ese día para recalcular desde cero
-    Anomalia.objects.filter(fecha=fecha_analisis).delete()
-    
-    anomalias_creadas = 0
-
-    for colab in colaboradores:
-        # --- A. BUSCADOR DE REGLA (Misma lógica anterior) ---
-        area_colab = str(colab.area).strip().upper() if colab.area else ""
-        turno_colab = str(colab.turno).strip().upper() if colab.turno else ""
-        
-        regla_aplicar = None
-        candidatas = []
-
-        # Filtro por Área (Flexible)
-        for r in todas_las_reglas:
-            area_regla = str(r.area).strip().upper() if r.area else ""
-            if not area_regla or area_regla in area_colab:
-                candidatas.append(r)
-        
-        # Filtro por Turno
-        if candidatas:
-            for cand in candidatas:
-                clave = str(cand.palabra_clave_turno).strip().upper() if cand.palabra_clave_turno else ""
-                if clave and clave in turno_colab:
-                    regla_aplicar = cand
-                    break
-            if not regla_aplicar:
-                # Si no hay match de turno, buscar la genérica (sin palabra clave)
-                for cand in candidatas:
-                    if not cand.palabra_clave_turno:
-                        regla_aplicar = cand
-                        break
-        
-        # Fallback final: Si sigue sin regla, forzar la primera candidata disponible
-        if not regla_aplicar and candidatas:
-            regla_aplicar = candidatas[0]
-
-        if not regla_aplicar: continue
-
-        # --- B. ANÁLISIS ---
-        inicio = datetime.combine(fecha_analisis, datetime.min.time())
-        fin = datetime.combine(fecha_analisis, datetime.max.time())
-        if regla_aplicar.es_turno_noche:
-            fin = fin + timedelta(days=1)
-
-        marcajes = Marcaje.objects.filter(colaborador=colab, fecha__range=[inicio.date(), fin.date()]).order_by('fecha', 'hora')
-        times = [datetime.combine(m.fecha, m.hora) for m in marcajes]
-
-        # 1. Ausencia (Usamos update_or_create para evitar IntegrityError)
-        if not times:
-            # Solo marcar falta si no es fin de semana (Lógica simple: 5=Sábado, 6=Domingo)
-            if fecha_analisis.weekday() < 5: 
-                Anomalia.objects.update_or_create(
-                    colaborador=colab, fecha=fecha_analisis, tipo='FALTA',
-                    defaults={'minutos_perdidos': 480}
-                )
-                anomalias_creadas += 1
+MINUTOS_FALTA = 480
+
+
+def _por_lotes(qs, ruts, campo='colaborador_id'):
+    """`qs` completo, o filtrado por `ruts` en lotes de BATCH_SIZE (límite de parámetros)."""
+    if ruts is None:
+        return [qs]
+    ruts = sorted(ruts)
+    return [qs.filter(**{f'{campo}__in': ruts[i:i + BATCH_SIZE]}) for i in range(0, len(ruts), BATCH_SIZE)]
+
+
+def _marcajes_del_dia(fecha_analisis, ruts=None):
+    """
+    {rut: [datetime, ...]} ordenados, con un solo query (uno por lote si se
+    limita a `ruts`). Incluye el día siguiente para los turnos de noche.
+    """
+    marcajes = {}
+    qs = (
+        Marcaje.objects
+        .filter(fecha__range=[fecha_analisis, fecha_analisis + timedelta(days=1)])
+        .order_by('colaborador_id', 'fecha', 'hora')
+        .values_list('colaborador_id', 'fecha', 'hora')
+    )
+    for consulta in _por_lotes(qs, ruts):
+        for rut, fecha, hora in consulta.iterator(chunk_size=BATCH_SIZE):
+            marcajes.setdefault(rut, []).append(datetime.combine(fecha, hora))
+    return marcajes
+
+
+def evaluar_dia(regla, fecha_analisis, times):
+    """Anomalías de una persona en un día: lista de (tipo, detalle, minutos_perdidos)."""
+    if not regla.es_turno_noche:
+        times = [t for t in times if t.date() == fecha_analisis]
+
+    # 1. Ausencia: solo de lunes a viernes
+    if not times:
+        if fecha_analisis.weekday() < 5:
+            return [('AUSENCIA', None, MINUTOS_FALTA)]
+        return []
+
+    hallazgos = []
+
+    # 2. Atraso
+    entrada_real = times[0]
+    entrada_teorica = datetime.combine(fecha_analisis, regla.entrada_teorica)
+    if regla.es_turno_noche and entrada_real.hour < 12:
+        entrada_teorica += timedelta(days=1)
+
+    diff_entrada = (entrada_real - entrada_teorica).total_seconds() / 60
+    if diff_entrada > regla.holgura_minutos:
+        hallazgos.append(('ATRASO', f"Entró {entrada_real.strftime('%H:%M')}", int(diff_entrada)))
+
+    # 3. Colación
+    if len(times) >= 4:
+        delta_col = (times[2] - times[1]).total_seconds() / 60
+        if delta_col > (regla.tiempo_maximo_colacion + regla.holgura_minutos):
+            exceso = int(delta_col - regla.tiempo_maximo_colacion)
+            hallazgos.append(('EXCESO_COLACION', f"Tomó {int(delta_col)} min", exceso))
+
+    return hallazgos
+
+
+def _analizar_dia(fecha_analisis, colaboradores, regla_de, ruts=None):
+    """
+    Analiza un día con el snapshot ya cargado (colaboradores: [(rut, área, turno)]).
+    Con `ruts` solo se reevalúan esas personas (recálculo incremental).
+    """
+    if ruts is not None:
+        colaboradores = [c for c in colaboradores if c[0] in ruts]
+    marcajes  = _marcajes_del_dia(fecha_analisis, ruts)
+    hallazgos = {}
+    for rut, area, turno in colaboradores:
+        regla = regla_de(area, turno)
+        if regla is None:
             continue
+        encontrados = evaluar_dia(regla, fecha_analisis, marcajes.get(rut, []))
+        if encontrados:
+            hallazgos[rut] = encontrados
 
-        # 2. Atraso
-        entrada_real = times[0]
-        entrada_teorica = datetime.combine(fecha_analisis, regla_aplicar.entrada_teorica)
-        if regla_aplicar.es_turno_noche and entrada_real.hour < 12:
-             entrada_teorica += timedelta(days=1)
-
-        diff_entrada = (entrada_real - entrada_teorica).total_seconds() / 60
-        if diff_entrada > regla_aplicar.holgura_minutos:
-            Anomalia.objects.update_or_create(
-                colaborador=colab, fecha=fecha_analisis, tipo='ATRASO',
-                defaults={
-                    'detalle': f"Entró {entrada_real.strftime('%H:%M')}",
-                    'minutos_perdidos': int(diff_entrada)
-                }
+    with transaction.atomic():
+        # Recalcular desde cero las anomalías del motor para ese día (o esas personas)
+        qs = Anomalia.objects.filter(fecha=fecha_analisis, tipo__in=TIPOS_MOTOR)
+        for consulta in _por_lotes(qs, ruts, 'colaborador_id'):
+            consulta.delete()
+        anomalias = [
+            Anomalia(
+                colaborador_id=rut, fecha=fecha_analisis, tipo=tipo, observacion=detalle, minutos_perdidos=minutos,
             )
-            anomalias_creadas += 1
-            
-        # 3. Colación
-        if len(times) >= 4:
-            delta_col = (times[2] - times[1]).total_seconds() / 60
-            if delta_col > (regla_aplicar.tiempo_maximo_colacion + regla_aplicar.holgura_minutos):
-                exceso = int(delta_col - regla_aplicar.tiempo_maximo_colacion)
-                Anomalia.objects.update_or_create(
-                    colaborador=colab, fecha=fecha_analisis, tipo='EXCESO_COLACION',
-                    defaults={
-                        'detalle': f"Tomó {int(delta_col)} min",
-                        'minutos_perdidos': exceso
-                    }
-                )
-                anomalias_creadas += 1
-
-    return anomalias_creadas
\ No newline at end of file
+            for rut, encontrados in hallazgos.items()
+            for tipo, detalle, minutos in encontrados
+        ]
+        Anomalia.objects.bulk_create(anomalias, batch_size=BATCH_SIZE)
+    return len(anomalias)
+
+
+def snapshot_analisis():
+    """
+    (colaboradores [(rut, área, turno)], MatcherReglas) o None si no hay reglas.
+    Se analizan las fichas cuyo estado en GREX (estado_ficha) dice vigente.
+    """
+    matcher = matcher_reglas()
+    if matcher is None:
+        return None
+    colaboradores = list(
+        Colaborador.objects.filter(estado_ficha__icontains='Vigente').values_list('rut', 'area', 'turno')
+    )
+    return colaboradores, matcher
+
+
+def analizar_asistencia_dia(fecha_analisis):
+    """Genera las anomalías (ausencia, atraso, exceso de colación) de un día. Devuelve cuántas."""
+    snapshot = snapshot_analisis()
+    if snapshot is None:
+        return 0
+    colaboradores, matcher = snapshot
+    return _analizar_dia(fecha_analisis, colaboradores, matcher.regla_para)
+
+# ==========================================
+# 4. ANÁLISIS POR RANGO DE FECHAS
+# ==========================================
+# El snapshot (colaboradores + reglas) se carga una vez y se reparte a los
+# procesos del pool al iniciarlos; cada proceso abre su propia conexión y
+# analiza días completos, así cada transacción toca un solo día y dos días
+# distintos nunca compiten por las mismas filas.
+
+_snapshot_worker = None
+
+
+def _iniciar_worker(colaboradores, matcher):
+    global _snapshot_worker
+    import django
+    from django.apps import apps
+    if not apps.ready:              # start method 'spawn': el hijo parte sin Django
+        django.setup()
+    _snapshot_worker = (colaboradores, matcher.regla_para)
+
+
+def _analizar_dia_worker(fecha_analisis):
+    return fecha_analisis, _analizar_dia(fecha_analisis, *_snapshot_worker)
+
+
+def analizar_asistencia_rango(inicio, fin, workers=1):
+    """
+    Analiza todos los días entre inicio y fin (inclusive) repartidos en
+    `workers` procesos. Devuelve un resumen con el throughput en
+    personas-día por segundo.
+    """
+    t0       = time.perf_counter()
+    dias     = [inicio + timedelta(days=i) for i in range((fin - inicio).days + 1)]
+    snapshot = snapshot_analisis()
+    resumen  = {'dias': len(dias), 'personas': 0, 'anomalias': 0, 'por_dia': {}}
+
+    if snapshot is not None and dias:
+        colaboradores, matcher = snapshot
+        resumen['personas'] = len(colaboradores)
+
+        if workers <= 1 or len(dias) == 1:
+            for f in dias:
+                resumen['por_dia'][f] = _analizar_dia(f, colaboradores, matcher.regla_para)
+        else:
+            # Los hijos no deben heredar la conexión abierta del padre (fork)
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers = min(workers, len(dias)),
+                initializer = _iniciar_worker,
+                initargs    = (colaboradores, matcher),
+            ) as pool:
+                for f, n in pool.map(_analizar_dia_worker, dias):
+                    resumen['por_dia'][f] = n
+
+        resumen['anomalias'] = sum(resumen['por_dia'].values())
+
+    resumen['segundos'] = time.perf_counter() - t0
+    personas_dia = resumen['personas'] * resumen['dias']
+    resumen['personas_dia_por_seg'] = personas_dia / resumen['segundos'] if resumen['segundos'] else 0
+    return resumen
+
+# ==========================================
+# 5. RECÁLCULO INCREMENTAL (DÍAS PENDIENTES)
+# ==========================================
+# Las cargas dejan en DiaPendiente los (rut, fecha) que cambiaron; acá se
+# reevalúan solo esos pares. Un cambio en el día d también afecta el análisis
+# del día d-1 de quien tiene turno de noche (su ventana llega hasta d).
+
+def analizar_pendientes():
+    """Reevalúa las personas-día pendientes y las descarta. Devuelve un resumen."""
+    t0 = time.perf_counter()
+    resumen = {'pendientes': 0, 'evaluados': 0, 'anomalias': 0, 'segundos': 0}
+
+    snapshot = snapshot_analisis()
+    if snapshot is None:            # sin reglas no hay nada que evaluar: quedan pendientes
+        return resumen
+    colaboradores, matcher = snapshot
+
+    momento, pendientes = leer_pendientes()
+    resumen['pendientes'] = len(pendientes)
+
+    info = {c[0]: c for c in colaboradores}
+    por_dia = {}
+    for _, rut, fecha in pendientes:
+        por_dia.setdefault(fecha, set()).add(rut)
+        if rut in info:
+            regla = matcher.regla_para(info[rut][1], info[rut][2])
+            if regla is not None and regla.es_turno_noche:
+                por_dia.setdefault(fecha - timedelta(days=1), set()).add(rut)
+
+    for fecha, ruts in sorted(por_dia.items()):
+        resumen['anomalias'] += _analizar_dia(fecha, colaboradores, matcher.regla_para, ruts)
+        resumen['evaluados'] += len(ruts)
+
+    descartar_pendientes((pk for pk, _, _ in pendientes), momento)
+    resumen['segundos'] = time.perf_counter() - t0
+    return resumen
@@ -1,11 +1,12 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 
 from .forms import CargaEstadiaForm
 from .models import RegistroAsistencia, Anomalia
-from .services import procesar_estadia
+from core.cargas import aviso_repetida, carga_en_sesion, encolar
 
 
 @login_required
@@ -14,23 +15,11 @@ def index(request):
     if request.method == 'POST':
         form = CargaEstadiaForm(request.POST, request.FILES)
         if form.is_valid():
-            try:
-                resultado = procesar_estadia(request.FILES['archivo'])
-                messages.success(
-                    request,
-                    f"✅ Estadía procesada. "
-                    f"Nuevos: {resultado['registros_creados']} | "
-                    f"Actualizados: {resultado['registros_actualizados']} | "
-                    f"RUTs no encontrados: {resultado['ruts_no_encontrados']} | "
-                    f"Anomalías: {resultado['anomalias_creadas']}"
-                )
-                if resultado['errores']:
-                    for err in resultado['errores'][:5]:
-                        messages.warning(request, f"⚠️ {err}")
-            except ValueError as e:
-                messages.error(request, f"❌ {str(e)}")
-            except Exception as e:
-                messages.error(request, f"❌ Error inesperado: {str(e)}")
+            carga, creada = encolar(request, 'ASISTENCIA', request.FILES['archivo'])
+            if creada:
+                messages.info(request, "📥 Archivo recibido. Se está procesando en segundo plano.")
+            else:
+                messages.info(request, aviso_repetida(carga))
             return redirect('asistencia_index')
     else:
         form = CargaEstadiaForm()
@@ -40,10 +29,13 @@ def index(request):
         RegistroAsistencia.objects
         .filter(fecha=hoy)
         .select_related('colaborador')
+        .annotate(con_anomalia=Exists(
+            Anomalia.objects.filter(colaborador=OuterRef('colaborador'), fecha=OuterRef('fecha'))
+        ))
         .order_by('colaborador__nombre_completo')
     )
     total_hoy      = registros_hoy.count()
-    anomalias_hoy  = Anomalia.objects.filter(registro__fecha=hoy).count()
+    anomalias_hoy  = Anomalia.objects.filter(fecha=hoy).count()
     sin_salida_hoy = registros_hoy.filter(hora_salida__isnull=True).count()
 
     ultimas_fechas = (
@@ -55,6 +47,7 @@ def index(request):
 
     context = {
         'form'           : form,
+        'carga'          : carga_en_sesion(request, 'ASISTENCIA'),
         'hoy'            : hoy,
         'total_hoy'      : total_hoy,
         'anomalias_hoy'  : anomalias_hoy,
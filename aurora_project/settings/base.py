@@ -61,6 +61,22 @@ DATABASES = {
     }
 }
 
+# 'kpis' guarda los snapshots del dashboard de dotación y su contador de
+# versión. Va en la BD para que lo compartan los procesos web y el worker de
+# cargas (python manage.py createcachetable). Con Redis/Memcached disponible
+# basta cambiar el BACKEND.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'kpis': {
+        'BACKEND' : 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_kpis',
+        'TIMEOUT' : 60 * 60,
+        'OPTIONS' : {'MAX_ENTRIES': 500},
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
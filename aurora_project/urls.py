@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from core.views import dashboard
+from core.views import dashboard, api_estado_carga
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,6 +10,7 @@ urlpatterns = [
 
     # Dashboard principal (raíz)
     path('', dashboard, name='dashboard'),
+    path('cargas/<int:pk>/estado/', api_estado_carga, name='api_estado_carga'),
 
     # Módulos independientes
     path('dotacion/', include('dotacion.urls')),
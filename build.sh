@@ -4,4 +4,7 @@ set -o errexit
 pip install -r requirements.txt
 python manage.py collectstatic --no-input
 python manage.py migrate
+python manage.py createcachetable
+python manage.py reconstruir_dotacion_diaria --extender
+python manage.py reconstruir_resumen_transporte --si-falta
 python manage.py createsuperuser --no-input || true
\ No newline at end of file
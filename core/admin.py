@@ -1 +1,9 @@
+from django.contrib import admin
+from .models import CargaInformacion
 
+@admin.register(CargaInformacion)
+class CargaInformacionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'usuario', 'fecha_carga', 'estado', 'fecha_datos_desde', 'fecha_datos_hasta', 'hash_contenido')
+    list_filter = ('tipo', 'procesado')
+    search_fields = ('hash_contenido', 'archivo')
+    readonly_fields = ('hash_contenido', 'fecha_datos_desde', 'fecha_datos_hasta', 'fecha_inicio', 'latido', 'fecha_fin', 'resultado', 'avance')
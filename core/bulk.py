@@ -0,0 +1,186 @@
+"""
+Inserción masiva sin instanciar modelos.
+
+bulk_create crea y prepara cada objeto en Python; en cargas de cientos de
+miles de filas ese costo supera al de la base de datos. Acá las filas llegan
+como tuplas con valores ya listos para la BD (texto ISO para fechas y horas)
+y se insertan con INSERT multi-fila: un round trip por lote, igual que
+bulk_create, pero sin el trabajo por objeto.
+
+En Postgres las cargas grandes usan además COPY: las filas se copian desde
+un buffer en memoria a una tabla temporal (sin WAL) y desde ahí se escriben
+con SQL por conjuntos (INSERT ... SELECT ... ON CONFLICT). SQLite sigue por
+el ORM; usa_copy() elige según el backend.
+"""
+import io
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models.constants import OnConflict
+from django.db.models.fields import AutoFieldMixin
+
+
+BATCH_SIZE = 1000
+
+
+def insertar_filas(modelo, campos, filas, on_conflict=None, unicos=(), actualizar=()):
+    """
+    Inserta `filas` (iterable de tuplas en el orden de `campos`) en la tabla de `modelo`.
+
+    on_conflict: None, OnConflict.IGNORE u OnConflict.UPDATE (con `unicos` y
+                 `actualizar`, como update_conflicts de bulk_create).
+    Devuelve la cantidad de filas enviadas.
+    """
+    ops      = connection.ops
+    columnas = [modelo._meta.get_field(c).column for c in campos]
+    sufijo   = ops.on_conflict_suffix_sql(
+        None, on_conflict,
+        [modelo._meta.get_field(c).column for c in actualizar],
+        [modelo._meta.get_field(c).column for c in unicos],
+    )
+    inicio = "%s %s (%s) " % (
+        ops.insert_statement(on_conflict=on_conflict),
+        ops.quote_name(modelo._meta.db_table),
+        ", ".join(map(ops.quote_name, columnas)),
+    )
+
+    max_params = connection.features.max_query_params
+    lote = min(BATCH_SIZE, max_params // len(columnas)) if max_params else BATCH_SIZE
+    fila_sql = ["%s"] * len(columnas)
+
+    filas = list(filas)
+    with connection.cursor() as cursor:
+        for i in range(0, len(filas), lote):
+            bloque = filas[i:i + lote]
+            sql    = inicio + ops.bulk_insert_sql(columnas, [fila_sql] * len(bloque))
+            if sufijo:
+                sql += " " + sufijo
+            cursor.execute(sql, [v for fila in bloque for v in fila])
+    return len(filas)
+
+
+# ─────────────────────────────────────────────
+# Postgres: COPY a una tabla temporal de staging
+# ─────────────────────────────────────────────
+
+def usa_copy():
+    """True si la base es Postgres: las cargas van por COPY + SQL por conjuntos."""
+    return connection.vendor == 'postgresql'
+
+
+_ESCAPES_COPY = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _texto_copy(valor):
+    """Valor en el formato de texto de COPY: \\N para NULL y escapes de tab/salto/backslash."""
+    if valor is None:
+        return '\\N'
+    return str(valor).translate(_ESCAPES_COPY)
+
+
+def _buffer_copy(filas):
+    """(buffer en memoria con `filas` en el formato de texto de COPY, cantidad de filas)."""
+    buffer = io.StringIO()
+    n = 0
+    for fila in filas:
+        buffer.write('\t'.join(map(_texto_copy, fila)))
+        buffer.write('\n')
+        n += 1
+    buffer.seek(0)
+    return buffer, n
+
+
+def _copy(cursor, sql, buffer):
+    # copy_expert/copy no pasan por CursorWrapper.execute: los errores se
+    # traducen a mano (IntegrityError de Django, etc.)
+    with connection.wrap_database_errors:
+        if hasattr(cursor.cursor, 'copy_expert'):      # psycopg2
+            cursor.copy_expert(sql, buffer)
+        else:                                           # psycopg 3
+            with cursor.copy(sql) as copia:
+                copia.write(buffer.getvalue())
+
+
+def copiar_a_staging(cursor, staging, definicion, columnas, filas):
+    """
+    Deja en la tabla temporal `staging` solo `filas` (tuplas en el orden de
+    `columnas`), cargadas con un COPY desde un buffer en memoria.
+
+    `definicion` es el cuerpo del CREATE TABLE, p. ej. "(rut varchar(20), fecha date)"
+    o "(LIKE tabla INCLUDING DEFAULTS)". La tabla se crea una vez por
+    transacción (ON COMMIT DROP) y es temporal: no escribe WAL.
+    Devuelve la cantidad de filas copiadas.
+    """
+    qn = connection.ops.quote_name
+    cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {qn(staging)} {definicion} ON COMMIT DROP")
+    cursor.execute(f"TRUNCATE {qn(staging)}")
+
+    buffer, n = _buffer_copy(filas)
+    _copy(cursor, f"COPY {qn(staging)} ({', '.join(map(qn, columnas))}) FROM STDIN", buffer)
+    return n
+
+
+def _campos_y_valores(objs):
+    """Campos concretos (sin AutoField) y generador de valores preparados como en bulk_create."""
+    # La conexión real y no el proxy django.db.connection: se consulta por cada valor
+    db     = connections[DEFAULT_DB_ALIAS]
+    campos = [f for f in objs[0]._meta.concrete_fields if not isinstance(f, AutoFieldMixin)]
+    valores = (
+        [f.get_db_prep_save(f.pre_save(obj, True), db) for f in campos]
+        for obj in objs
+    )
+    return campos, valores
+
+
+def copiar_objetos(objs):
+    """
+    Equivalente Postgres de bulk_create sin conflictos: un COPY directo a la
+    tabla del modelo. Los objetos no reciben su pk.
+    """
+    if not objs:
+        return 0
+    meta = objs[0]._meta
+    qn   = connection.ops.quote_name
+    campos, valores = _campos_y_valores(objs)
+    buffer, _ = _buffer_copy(valores)
+    sql       = f"COPY {qn(meta.db_table)} ({', '.join(qn(f.column) for f in campos)}) FROM STDIN"
+    with connection.cursor() as cursor:
+        _copy(cursor, sql, buffer)
+    return len(objs)
+
+
+def upsert_con_copy(objs, unicos, actualizar):
+    """
+    Equivalente Postgres de bulk_create(update_conflicts=True): COPY de las
+    instancias a una tabla temporal con las columnas del modelo y un único
+    INSERT ... SELECT ... ON CONFLICT (unicos) DO UPDATE SET actualizar.
+
+    Los valores se preparan como en bulk_create (pre_save con add=True, así
+    auto_now/auto_now_add quedan con la hora actual). Los objetos de `objs`
+    no deben repetir `unicos`.
+    """
+    if not objs:
+        return 0
+    meta     = objs[0]._meta
+    qn       = connection.ops.quote_name
+    campos, filas = _campos_y_valores(objs)
+    columnas = [f.column for f in campos]
+    staging  = f"staging_{meta.db_table}"
+
+    conflicto = ", ".join(qn(meta.get_field(c).column) for c in unicos)
+    asignar   = ", ".join(
+        f"{qn(col)} = EXCLUDED.{qn(col)}" for col in (meta.get_field(c).column for c in actualizar)
+    )
+    lista = ", ".join(map(qn, columnas))
+
+    # Solo las columnas copiadas: con LIKE la tabla arrastraría el NOT NULL del
+    # id autoincremental, que en el COPY viene vacío
+    definicion = "(%s)" % ", ".join(f"{qn(f.column)} {f.db_type(connection)}" for f in campos)
+
+    with connection.cursor() as cursor:
+        n = copiar_a_staging(cursor, staging, definicion, columnas, filas)
+        cursor.execute(
+            f"INSERT INTO {qn(meta.db_table)} ({lista}) "
+            f"SELECT {lista} FROM {qn(staging)} "
+            f"ON CONFLICT ({conflicto}) DO UPDATE SET {asignar}"
+        )
+    return n
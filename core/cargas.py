@@ -0,0 +1,233 @@
+"""
+Cola de cargas GREX respaldada en la base de datos.
+
+Las vistas solo guardan el archivo como CargaInformacion; el comando
+`procesar_cargas` toma las pendientes y ejecuta el importador de cada tipo.
+
+Varios workers pueden correr en paralelo: cada uno toma una carga con
+SELECT ... FOR UPDATE SKIP LOCKED (Postgres) y la marca con un UPDATE
+condicional sobre `latido`, así una carga nunca la procesan dos.
+
+Mientras corre el importador, un hilo del worker renueva `latido` cada
+INTERVALO_LATIDO, en todas las fases (también en las que no confirman nada,
+como Fichas en una sola transacción). Solo vuelve a la cola una carga sin
+latido hace más de REINTENTAR_DESPUES: la de un worker que murió.
+
+Los importadores largos confirman por lotes y dejan un checkpoint en
+`avance` (guardar_avance); el siguiente intento retoma desde ahí.
+
+Cada archivo se guarda con su SHA-256: si el archivo es el mismo de la
+última carga de su tipo (en cola, en proceso o terminada bien) no se encola
+otra vez, se responde con esa carga y su resumen. Un archivo que coincide con
+una carga más antigua sí se procesa: volver a subir una foto anterior es
+deshacer las cargas posteriores.
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import CargaInformacion
+
+
+# Importador por tipo: recibe la CargaInformacion y devuelve el dict de resultado
+PROCESADORES = {
+    'DOTACION'  : 'dotacion.services.procesar_carga',
+    'ASISTENCIA': 'asistencia.services.procesar_carga',
+    'TRANSPORTE': 'transporte.services.procesar_carga',
+}
+
+# Una carga tomada sin latido hace más de esto se considera abandonada (su worker murió)
+REINTENTAR_DESPUES = timedelta(minutes=30)
+INTERVALO_LATIDO   = timedelta(minutes=1)
+
+
+def hash_archivo(archivo):
+    """SHA-256 del archivo subido, leído por chunks (no se carga entero en memoria)."""
+    h = hashlib.sha256()
+    for chunk in archivo.chunks():
+        h.update(chunk)
+    archivo.seek(0)
+    return h.hexdigest()
+
+
+def carga_previa(tipo, hash_contenido):
+    """
+    Última carga del tipo (en cola, en proceso o terminada bien; las con
+    ERROR se reintentan) si es de este mismo archivo; si no, None.
+    """
+    ultima = (
+        CargaInformacion.objects
+        .filter(tipo=tipo)
+        .filter(Q(procesado=False) | Q(resultado__isnull=False))
+        .order_by('-fecha_carga', '-id')
+        .first()
+    )
+    return ultima if ultima and ultima.hash_contenido == hash_contenido else None
+
+
+def aviso_repetida(carga):
+    """Mensaje para el usuario cuando encolar devolvió una carga anterior en vez de crear otra."""
+    origen = f"la carga #{carga.pk} del {timezone.localtime(carga.fecha_carga):%d/%m/%Y %H:%M}"
+    if carga.usuario:
+        origen += f" ({carga.usuario.get_username()})"
+    if not carga.procesado:
+        return f"♻️ Este archivo es el mismo de {origen}, que todavía se está procesando: no se encoló de nuevo."
+    return f"♻️ Este archivo es el mismo de {origen}, la última de este tipo: no se volvió a procesar y se muestra su resultado."
+
+
+def encolar(request, tipo, archivo):
+    """
+    Guarda el archivo como carga pendiente y la recuerda en la sesión del usuario.
+
+    Si es el mismo archivo de la última carga del tipo (carga_previa), no se
+    guarda ni se procesa de nuevo: la sesión apunta a esa carga. Devuelve
+    (carga, creada).
+    """
+    hash_contenido = hash_archivo(archivo)
+    carga  = carga_previa(tipo, hash_contenido)
+    creada = carga is None
+    if creada:
+        carga = CargaInformacion.objects.create(
+            tipo=tipo, archivo=archivo, usuario=request.user, hash_contenido=hash_contenido,
+        )
+    request.session[f'carga_{tipo}'] = carga.pk
+    return carga, creada
+
+
+def carga_en_sesion(request, tipo):
+    """
+    Última carga encolada por el usuario para `tipo`. Una vez terminada se
+    muestra una sola vez y se olvida.
+    """
+    pk = request.session.get(f'carga_{tipo}')
+    carga = CargaInformacion.objects.filter(pk=pk).first() if pk else None
+    if carga is None or carga.procesado:
+        request.session.pop(f'carga_{tipo}', None)
+    return carga
+
+
+def tomar_siguiente(reintentar_despues=REINTENTAR_DESPUES):
+    """Reserva la carga pendiente más antigua y la devuelve, o None si no hay."""
+    limite = timezone.now() - reintentar_despues
+
+    while True:
+        with transaction.atomic():
+            carga = (
+                CargaInformacion.objects
+                .select_for_update(skip_locked=True)
+                .filter(procesado=False)
+                .filter(Q(latido__isnull=True) | Q(latido__lt=limite))
+                .order_by('fecha_carga', 'id')
+                .first()
+            )
+            if carga is None:
+                return None
+
+            ahora  = timezone.now()
+            tomada = (
+                CargaInformacion.objects
+                .filter(pk=carga.pk, procesado=False, latido=carga.latido)
+                .update(fecha_inicio=ahora, latido=ahora)
+            )
+        if tomada:
+            carga.refresh_from_db()
+            return carga
+        # Otro worker la tomó entre el SELECT y el UPDATE (backends sin FOR UPDATE)
+
+
+def guardar_avance(carga, avance):
+    """
+    Guarda el checkpoint de la carga. Se llama dentro de la transacción del
+    lote, así lote y checkpoint se confirman juntos.
+    """
+    carga.avance = avance
+    CargaInformacion.objects.filter(pk=carga.pk).update(avance=carga.avance)
+
+
+@contextmanager
+def latiendo(carga, intervalo=None):
+    """
+    Renueva carga.latido cada `intervalo` (INTERVALO_LATIDO) desde un hilo
+    con su propia conexión, mientras dura el bloque. No depende de que el
+    importador confirme lotes: cubre lectura, escritura y el análisis posterior.
+    """
+    intervalo = intervalo or INTERVALO_LATIDO
+    detener   = threading.Event()
+
+    def latir():
+        try:
+            while not detener.wait(intervalo.total_seconds()):
+                try:
+                    CargaInformacion.objects.filter(pk=carga.pk, procesado=False).update(latido=timezone.now())
+                except DatabaseError:
+                    # p.ej. SQLite bloqueada por la transacción del importador: se reintenta en el próximo latido
+                    pass
+        finally:
+            connections.close_all()     # solo las conexiones de este hilo
+
+    hilo = threading.Thread(target=latir, name=f'latido-carga-{carga.pk}', daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        detener.set()
+        hilo.join()
+
+
+def ejecutar(carga):
+    """Corre el importador de la carga y deja el resultado (o el error) guardado."""
+    procesar = import_string(PROCESADORES[carga.tipo])
+    try:
+        with latiendo(carga):
+            resultado = procesar(carga)
+    except Exception as e:
+        carga.resultado   = None
+        carga.log_errores = str(e)
+    else:
+        errores = resultado.get('errores', [])
+        carga.fecha_datos_desde = resultado.pop('fecha_desde', None)
+        carga.fecha_datos_hasta = resultado.pop('fecha_hasta', None)
+        carga.resultado   = {**resultado, 'errores': errores[:50]}
+        carga.log_errores = '\n'.join(errores) or None
+
+    carga.procesado = True
+    carga.fecha_fin = timezone.now()
+    carga.save(update_fields=[
+        'resultado', 'log_errores', 'procesado', 'fecha_fin', 'fecha_datos_desde', 'fecha_datos_hasta',
+    ])
+    return carga
+
+
+def drenar(reintentar_despues=REINTENTAR_DESPUES):
+    """Procesa cargas hasta vaciar la cola. Devuelve cuántas procesó."""
+    procesadas = 0
+    while (carga := tomar_siguiente(reintentar_despues)) is not None:
+        ejecutar(carga)
+        procesadas += 1
+    return procesadas
+
+
+def estado_carga(carga):
+    """Representación JSON del estado de una carga (para el polling de los templates)."""
+    datos = {
+        'id'         : carga.pk,
+        'tipo'       : carga.tipo,
+        'estado'     : carga.estado,
+        'fecha_carga': carga.fecha_carga.isoformat(),
+        'mensaje'    : None,
+        'errores'    : [],
+    }
+    if carga.estado == 'COMPLETADO':
+        datos['mensaje'] = carga.resultado.get('mensaje')
+        datos['errores'] = carga.resultado.get('errores', [])[:5]
+    elif carga.estado == 'ERROR':
+        datos['mensaje'] = carga.log_errores
+    elif carga.estado == 'PROCESANDO' and carga.avance:
+        datos['mensaje'] = f"{carga.avance.get('dias', 0)} días-persona guardados"
+    return datos
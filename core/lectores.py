@@ -0,0 +1,496 @@
+"""
+Lector columnar de reportes GREX (xlsx y CSV).
+
+openpyxl arma un objeto por celda (coordenada, estilo, tipo) aunque el
+importador solo use unas pocas columnas. Acá la hoja se lee en streaming
+directo desde su XML, en bloques de filas completas que parsea de una vez el
+parser C de ElementTree (con iterparse, el costo de un evento Python por
+elemento se comía la ganancia). Solo se convierten las celdas de las
+columnas pedidas y cada fila sale como una tupla de valores tipados (texto,
+int/float, bool, datetime u hora según el formato de la celda).
+
+El encabezado se ubica solo (primera fila que tiene todas las columnas
+requeridas) o en una fila fija. Un CSV se lee con la misma interfaz; sus
+valores llegan como texto.
+
+    with abrir_tabla(archivo, requeridas=['RUT', 'FECHA']) as tabla:
+        for n_fila, (rut, fecha) in tabla.filas(['RUT', 'FECHA']):
+            ...
+"""
+import codecs
+import csv
+import io
+import posixpath
+import re
+import zipfile
+from datetime import datetime, timedelta
+from collections import deque
+from itertools import chain
+from xml.etree.ElementTree import fromstring, iterparse
+
+
+FILAS_BUSQUEDA_ENCABEZADO = 100
+
+SEPARADORES_CSV = ',;\t|'
+
+# numFmtId predefinidos de Excel que son fechas u horas
+FORMATOS_FECHA_EXCEL = (
+    set(range(14, 23)) | set(range(27, 37)) | set(range(45, 48)) | set(range(50, 59))
+)
+
+EPOCA_1900 = datetime(1899, 12, 30)
+EPOCA_1904 = datetime(1904, 1, 1)
+
+# Bytes de XML descomprimido que se parsean de una vez (cortados en filas
+# completas). Mientras se busca el encabezado se lee de a poco: esas filas
+# se parsean completas.
+TAMANO_BLOQUE            = 1 << 20
+TAMANO_BLOQUE_ENCABEZADO = 1 << 14
+
+_LETRAS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+_RAIZ_HOJA  = re.compile(rb'<((?:[\w.-]+:)?worksheet)\b[^>]*>')
+_SHEET_DATA = re.compile(rb'<((?:[\w.-]+:)?)sheetData\b[^>]*?(/?)>')
+
+_LITERALES_FORMATO = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.|_.|\*.')
+
+
+class EncabezadoNoEncontrado(ValueError):
+    """Ninguna fila de la zona de búsqueda tiene todas las columnas requeridas."""
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        super().__init__(f"No se encontraron las columnas: {', '.join(faltantes)}")
+
+
+# ─────────────────────────────────────────────
+# Tabla
+# ─────────────────────────────────────────────
+
+class Tabla:
+    """Hoja (o CSV) abierta con el encabezado ya ubicado."""
+
+    def __init__(self, hoja, fila_encabezado, encabezado, pendiente=None):
+        self._hoja           = hoja
+        self._pendiente      = pendiente            # fila ya leída al buscar el encabezado
+        self.fila_encabezado = fila_encabezado     # número de fila (1 = primera)
+        self.encabezado      = encabezado          # {NOMBRE EN MAYÚSCULAS: índice de columna (0 = A)}
+
+    def __contains__(self, nombre):
+        return nombre in self.encabezado
+
+    def filas(self, columnas):
+        """
+        Itera (n_fila, valores) desde la fila siguiente al encabezado.
+
+        columnas: nombres del encabezado o índices (0 = primera columna).
+                  Un nombre que no está en el archivo entrega siempre None.
+        Las filas vacías intermedias se entregan con todos sus valores en None.
+        """
+        indices = {}
+        for pos, col in enumerate(columnas):
+            idx = col if isinstance(col, int) else self.encabezado.get(col)
+            if idx is not None:
+                indices.setdefault(idx, []).append(pos)
+
+        vacia    = (None,) * len(columnas)
+        anterior = self.fila_encabezado
+        leidas = self._hoja.recorrer(indices)
+        if self._pendiente:
+            n_fila, celdas = self._pendiente
+            self._pendiente = None
+            leidas = chain([(n_fila, {i: v for i, v in celdas.items() if i in indices})], leidas)
+
+        for n_fila, celdas in leidas:
+            for hueco in range(anterior + 1, n_fila):
+                yield hueco, vacia
+            anterior = n_fila
+
+            valores = [None] * len(columnas)
+            for idx, valor in celdas.items():
+                for pos in indices[idx]:
+                    valores[pos] = valor
+            yield n_fila, tuple(valores)
+
+    def close(self):
+        self._hoja.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def abrir_tabla(archivo, requeridas=(), fila_encabezado=None, filas_busqueda=FILAS_BUSQUEDA_ENCABEZADO):
+    """
+    Abre un xlsx (hoja activa) o un CSV y ubica el encabezado.
+
+    requeridas     : nombres (en mayúsculas) que debe tener la fila de
+                     encabezado; se busca en las primeras `filas_busqueda` filas.
+    fila_encabezado: fila fija del encabezado (1 = primera). Por defecto 1 si
+                     no hay requeridas.
+    Lanza EncabezadoNoEncontrado si ninguna fila tiene todas las requeridas.
+    """
+    inicio = archivo.read(4)
+    archivo.seek(0)
+    hoja = _HojaXlsx(archivo) if inicio == b'PK\x03\x04' else _HojaCsv(archivo)
+
+    try:
+        requeridas = [r.upper() for r in requeridas]
+        if fila_encabezado is None and not requeridas:
+            fila_encabezado = 1
+
+        mejor = None                    # (coincidencias, faltantes) de la fila más parecida
+        for n_fila, celdas in hoja.encabezados(requeridas):
+            if fila_encabezado is not None and n_fila < fila_encabezado:
+                continue
+            encabezado = {}
+            for idx in sorted(celdas):
+                if celdas[idx] is not None:
+                    nombre = str(celdas[idx]).strip().upper()
+                    if nombre:
+                        encabezado[nombre] = idx             # gana la última, como antes
+            if fila_encabezado is not None:
+                pendiente = None
+                if n_fila > fila_encabezado:
+                    # La fila fija venía vacía: la leída es la primera de datos
+                    pendiente, encabezado, n_fila = (n_fila, celdas), {}, fila_encabezado
+                faltantes = [r for r in requeridas if r not in encabezado]
+                if faltantes:
+                    raise EncabezadoNoEncontrado(faltantes)
+                return Tabla(hoja, n_fila, encabezado, pendiente)
+
+            faltantes = [r for r in requeridas if r not in encabezado]
+            if not faltantes:
+                return Tabla(hoja, n_fila, encabezado)
+            if mejor is None or len(requeridas) - len(faltantes) > mejor[0]:
+                mejor = (len(requeridas) - len(faltantes), faltantes)
+            if n_fila >= filas_busqueda:
+                break
+
+        if fila_encabezado is not None and not requeridas:
+            return Tabla(hoja, fila_encabezado, {})
+        raise EncabezadoNoEncontrado(mejor[1] if mejor else requeridas)
+    except BaseException:
+        hoja.close()
+        raise
+
+
+# ─────────────────────────────────────────────
+# xlsx
+# ─────────────────────────────────────────────
+
+def _es_formato_fecha(codigo):
+    """True si un formato numérico personalizado muestra fecha u hora."""
+    codigo = _LITERALES_FORMATO.sub('', codigo)
+    return bool(re.search(r'[dmyhs]', codigo, re.IGNORECASE))
+
+
+def _desde_serial(valor, epoca):
+    """Número de serie de Excel a datetime (u hora si es menor que un día), como openpyxl."""
+    dias, fraccion = divmod(valor, 1)
+    delta = timedelta(milliseconds=round(fraccion * 86_400_000))
+    if 0 <= valor < 1 and delta.days == 0:
+        return (datetime.min + delta).time()
+    if 0 < valor < 60 and epoca is EPOCA_1900:
+        dias += 1                       # Excel cuenta el inexistente 29-02-1900
+    return epoca + timedelta(days=dias) + delta
+
+
+def _letras_columna(idx):
+    """0 -> 'A', 27 -> 'AB'."""
+    letras = ''
+    idx += 1
+    while idx:
+        idx, resto = divmod(idx - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+_indices_columna = {}
+
+
+def _indice_columna(letras):
+    """'A' -> 0, 'AB' -> 27."""
+    idx = _indices_columna.get(letras)
+    if idx is None:
+        idx = 0
+        for c in letras:
+            idx = idx * 26 + ord(c) - 64
+        idx = _indices_columna[letras] = idx - 1
+    return idx
+
+
+class _HojaXlsx:
+    """Hoja activa de un xlsx leída en streaming desde su XML."""
+
+    def __init__(self, archivo):
+        self._zip = zipfile.ZipFile(archivo)
+
+        libro    = fromstring(self._zip.read('xl/workbook.xml'))
+        self._ns = libro.tag[:libro.tag.index('}') + 1] if libro.tag.startswith('{') else ''
+        rels     = {
+            r.get('Id'): (r.get('Type', '').rsplit('/', 1)[-1], r.get('Target'))
+            for r in fromstring(self._zip.read('xl/_rels/workbook.xml.rels'))
+        }
+
+        def ruta(destino):
+            if destino.startswith('/'):
+                return destino.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', destino))
+
+        propiedades = libro.find('{*}workbookPr')
+        fecha_1904  = propiedades is not None and propiedades.get('date1904') in ('1', 'true')
+        self._epoca = EPOCA_1904 if fecha_1904 else EPOCA_1900
+
+        vista  = libro.find('{*}bookViews/{*}workbookView')
+        activa = int(vista.get('activeTab', 0)) if vista is not None else 0
+        hojas  = libro.findall('{*}sheets/{*}sheet')
+        hoja   = hojas[activa if activa < len(hojas) else 0]
+        rid    = next(v for k, v in hoja.attrib.items() if k.endswith('}id'))
+        self._ruta_hoja = ruta(rels[rid][1])
+
+        destinos = {tipo: ruta(destino) for tipo, destino in rels.values()}
+        self._compartidos = self._leer_compartidos(destinos.get('sharedStrings'))
+        self._estilos_fecha = self._leer_estilos_fecha(destinos.get('styles'))
+        self._hoja    = None            # XML de la hoja (se abre al leer la primera fila)
+        self._prefijo = b''
+        self._resto   = b''             # bytes leídos que todavía no cierran una fila
+        self._filas   = deque()         # filas <row> ya parseadas y no entregadas
+        self._n_fila  = 0
+
+    def _leer_compartidos(self, ruta):
+        if not ruta or ruta not in self._zip.namelist():
+            return []
+        ns = self._ns
+        compartidos = []
+        with self._zip.open(ruta) as f:
+            for _, elem in iterparse(f):
+                if elem.tag != ns + 'si':
+                    continue
+                t = elem.find(ns + 't')
+                if t is not None:
+                    compartidos.append(t.text or '')
+                else:
+                    # Texto enriquecido: se concatenan los tramos <r> (sin la fonética <rPh>)
+                    compartidos.append(''.join(r.findtext(ns + 't') or '' for r in elem.findall(ns + 'r')))
+                elem.clear()
+        return compartidos
+
+    def _leer_estilos_fecha(self, ruta):
+        """Índices (como texto, igual que el atributo s) de los estilos con formato de fecha."""
+        if not ruta or ruta not in self._zip.namelist():
+            return frozenset()
+        estilos = fromstring(self._zip.read(ruta))
+        fechas  = set(FORMATOS_FECHA_EXCEL)
+        for fmt in estilos.findall('{*}numFmts/{*}numFmt'):
+            if _es_formato_fecha(fmt.get('formatCode', '')):
+                fechas.add(int(fmt.get('numFmtId')))
+        return frozenset(
+            str(i) for i, xf in enumerate(estilos.findall('{*}cellXfs/{*}xf'))
+            if int(xf.get('numFmtId', 0)) in fechas
+        )
+
+    def encabezados(self, requeridas):
+        """Filas completas ({índice: valor}) para buscar el encabezado."""
+        return self.recorrer(None)
+
+    def _abrir_hoja(self):
+        """Abre el XML de la hoja y ubica <sheetData> (y su prefijo, si lo tiene)."""
+        self._hoja = self._zip.open(self._ruta_hoja)
+        self._fin  = True
+        inicio = b''
+        while True:
+            datos   = self._hoja.read(TAMANO_BLOQUE)
+            inicio += datos
+            raiz    = _RAIZ_HOJA.search(inicio)
+            datos_h = _SHEET_DATA.search(inicio)
+            if (raiz and datos_h) or not datos:
+                break
+        if not (raiz and datos_h) or datos_h.group(2):       # sin filas (<sheetData/>)
+            return
+
+        self._prefijo  = datos_h.group(1)
+        self._apertura = raiz.group(0) + b'<' + self._prefijo + b'sheetData>'
+        self._cierre   = b'</' + self._prefijo + b'sheetData></' + raiz.group(1) + b'>'
+        self._fin_fila = b'</' + self._prefijo + b'row>'
+        self._resto    = inicio[datos_h.end():]
+        self._fin      = False
+
+    def _leer_bytes(self, tamano):
+        """Siguiente tramo de filas completas del XML (cortado en el último </row>), o None."""
+        if self._hoja is None:
+            self._abrir_hoja()
+        while not self._fin:
+            datos = self._hoja.read(tamano)
+            self._resto += datos
+            if not datos:
+                self._fin = True
+            corte = self._resto.rfind(self._fin_fila)
+            if corte >= 0:
+                corte += len(self._fin_fila)
+                tramo, self._resto = self._resto[:corte], self._resto[corte:]
+                return tramo
+        return None
+
+    def _parsear(self, tramo):
+        return fromstring(self._apertura + tramo + self._cierre).find('{*}sheetData')
+
+    def _selector(self, indices):
+        """
+        Regex que extrae del XML solo las celdas de `indices`, o None si el
+        archivo no usa la forma habitual <c r="A1" ...> (sin prefijo).
+        """
+        if self._prefijo:
+            return None
+        letras = b'|'.join(sorted(_letras_columna(i).encode() for i in indices))
+        return re.compile(rb'<c r="(?:' + letras + rb')[0-9]+"[^>]*?(?:/>|>.*?</c>)', re.DOTALL)
+
+    def _convertidor(self):
+        compartidos = self._compartidos
+        fechas      = self._estilos_fecha
+        epoca       = self._epoca
+        t_v         = self._ns + 'v'
+
+        def convertir(c):
+            tipo = c.get('t')
+            if tipo == 'inlineStr':
+                return ''.join(c.itertext())
+            v = c.findtext(t_v)
+            if not v:
+                return None             # vacía o fórmula sin valor calculado
+            if tipo == 's':
+                return compartidos[int(v)]
+            if tipo in ('str', 'e'):
+                return v
+            if tipo == 'b':
+                return v == '1'
+            if tipo == 'd':
+                return datetime.fromisoformat(v)
+            valor = int(v) if v.lstrip('-').isdigit() else float(v)
+            if c.get('s') in fechas:
+                return _desde_serial(valor, epoca)
+            return valor
+
+        return convertir
+
+    def recorrer(self, indices):
+        """
+        Itera (n_fila, {índice: valor}) retomando donde quedó la lectura anterior.
+        indices: columnas a convertir (None = todas).
+
+        Con columnas pedidas, cada tramo del XML pasa primero por una regex
+        que deja solo esas celdas, y el parser C arma elementos solo para
+        ellas. Si en el tramo hay celdas con otra forma (sin r, atributos en
+        otro orden) se parsea completo.
+        """
+        convertir = self._convertidor()
+        selector  = self._selector(indices) if indices else None
+
+        while True:
+            if self._filas:
+                yield from self._filas_completas(self._filas, indices, convertir)
+                self._filas.clear()
+                continue
+
+            tramo = self._leer_bytes(TAMANO_BLOQUE if indices else TAMANO_BLOQUE_ENCABEZADO)
+            if tramo is None:
+                return
+            celdas_c = tramo.count(b'<c ') + tramo.count(b'<c>') + tramo.count(b'<c/>')
+            if selector is None or tramo.count(b'<c r="') != celdas_c:
+                self._filas.extend(self._parsear(tramo))
+                continue
+
+            # Camino rápido: solo las celdas pedidas; la fila sale de la referencia
+            n_fila, celdas = None, None
+            for c in self._parsear(b''.join(selector.findall(tramo))):
+                ref = c.get('r')
+                num = ref.lstrip(_LETRAS)
+                if num != n_fila:
+                    if celdas is not None:
+                        yield self._n_fila, celdas
+                    n_fila, celdas = num, {}
+                    self._n_fila   = int(num)
+                celdas[_indice_columna(ref[:-len(num)])] = convertir(c)
+            if celdas is not None:
+                yield self._n_fila, celdas
+
+    def _filas_completas(self, filas, indices, convertir):
+        """(n_fila, {índice: valor}) de elementos <row> ya parseados."""
+        while filas:
+            fila   = filas.popleft()
+            r      = fila.get('r')
+            n_fila = self._n_fila = int(r) if r else self._n_fila + 1
+            celdas = {}
+            col    = -1
+            for c in fila:
+                ref = c.get('r')
+                col = _indice_columna(ref.rstrip('0123456789')) if ref else col + 1
+                if indices is None or col in indices:
+                    celdas[col] = convertir(c)
+            yield n_fila, celdas
+
+    def close(self):
+        if self._hoja is not None:
+            self._hoja.close()
+        self._zip.close()
+
+
+# ─────────────────────────────────────────────
+# CSV
+# ─────────────────────────────────────────────
+
+class _HojaCsv:
+    """CSV leído en streaming; el separador se detecta sobre la fila de encabezado."""
+
+    def __init__(self, archivo):
+        muestra = archivo.read(64 * 1024)
+        archivo.seek(0)
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(muestra)   # tolera un carácter cortado al final
+            encoding = 'utf-8-sig'
+        except UnicodeDecodeError:
+            encoding = 'latin-1'                                       # exports GREX
+
+        self._texto   = io.TextIOWrapper(archivo, encoding=encoding, newline='')
+        self._lineas  = iter(self._texto)
+        self._leidas  = []              # líneas leídas durante la búsqueda del encabezado
+        self._lector  = None
+        self._n_fila  = 0
+
+    def encabezados(self, requeridas):
+        """Filas candidatas a encabezado: las que contienen (como texto) todas las requeridas."""
+        for linea in self._lineas:
+            self._leidas.append(linea)
+            n_fila = len(self._leidas)
+            texto  = linea.upper()
+            if not all(r in texto for r in requeridas):
+                continue
+            try:
+                separador = csv.Sniffer().sniff(linea, delimiters=SEPARADORES_CSV).delimiter
+            except csv.Error:
+                separador = ','
+            valores = next(csv.reader([linea], delimiter=separador), [])
+
+            self._separador = separador
+            self._n_fila    = n_fila
+            yield n_fila, {i: v for i, v in enumerate(valores)}
+
+    def recorrer(self, indices):
+        if self._lector is None:
+            restantes    = chain(self._leidas[self._n_fila:], self._lineas)
+            self._lector = csv.reader(restantes, delimiter=self._separador)
+            self._leidas = []
+
+        for valores in self._lector:
+            self._n_fila += 1
+            if not any(valores):
+                continue
+            yield self._n_fila, {
+                i: v for i, v in enumerate(valores)
+                if v != '' and (indices is None or i in indices)
+            }
+
+    def close(self):
+        self._texto.detach()
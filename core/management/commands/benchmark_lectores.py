@@ -0,0 +1,108 @@
+import csv
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import openpyxl
+from django.core.management.base import BaseCommand, CommandError
+
+from core.lectores import abrir_tabla
+
+
+COLUMNAS = 25
+
+
+def generar_reporte(n_filas, seed=0):
+    """
+    Reporte sintético con el layout de GREX: 9 filas de metadata, encabezado
+    y `n_filas` filas de 25 columnas (texto, números, fechas y horas).
+    Devuelve (xlsx, csv) como bytes.
+    """
+    rnd     = random.Random(seed)
+    headers = ['RUT', 'NOMBRES', 'FECHA', 'HORA', 'MOVIMIENTO'] + [f'COL{i}' for i in range(5, COLUMNAS)]
+    wb      = openpyxl.Workbook(write_only=True)
+    ws      = wb.create_sheet()
+    texto   = io.StringIO()
+    salida  = csv.writer(texto, delimiter=';')
+
+    for _ in range(9):
+        ws.append(['Reporte de Estadía'])
+        salida.writerow(['Reporte de Estadía'] + [''] * (COLUMNAS - 1))
+    ws.append(headers)
+    salida.writerow(headers)
+
+    base = date(2025, 1, 1)
+    for i in range(n_filas):
+        fecha = datetime.combine(base + timedelta(days=rnd.randint(0, 90)), datetime.min.time())
+        hora  = (datetime.min + timedelta(seconds=rnd.randint(0, 86_399))).time()
+        fila  = [
+            f"{10_000_000 + i % 5000}-{i % 10}", f"NOMBRE{i % 5000}", fecha, hora,
+            rnd.choice(['Entrada', 'Salida']),
+        ] + [rnd.choice(['A', 'B', 'C', rnd.randint(0, 999)]) for _ in range(5, COLUMNAS)]
+        ws.append(fila)
+        salida.writerow([f"{fecha:%d-%m-%Y}" if isinstance(v, datetime) else v for v in fila])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue(), texto.getvalue().encode('latin-1')
+
+
+def _openpyxl_celdas(contenido, columnas):
+    """Ruta anterior de los importadores: celdas completas y row[idx].value."""
+    wb = openpyxl.load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+    ws = wb.active
+    headers = {str(c.value or '').strip().upper(): i for i, c in enumerate(ws[10])}
+    idx     = [headers[c] for c in columnas]
+    filas   = [tuple(row[i].value for i in idx) for row in ws.iter_rows(min_row=11, values_only=False)]
+    wb.close()
+    return filas
+
+
+def _openpyxl_valores(contenido, columnas):
+    wb = openpyxl.load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+    ws = wb.active
+    headers = {str(v or '').strip().upper(): i for i, v in enumerate(next(ws.iter_rows(min_row=10, max_row=10, values_only=True)))}
+    idx     = [headers[c] for c in columnas]
+    filas   = [tuple(row[i] for i in idx) for row in ws.iter_rows(min_row=11, values_only=True)]
+    wb.close()
+    return filas
+
+
+def _lector(contenido, columnas):
+    with abrir_tabla(io.BytesIO(contenido), requeridas=columnas) as tabla:
+        return [valores for _, valores in tabla.filas(columnas)]
+
+
+class Command(BaseCommand):
+    help = 'Mide filas/seg del lector columnar de core.lectores contra openpyxl (solo lectura, sin BD).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=60_000)
+        parser.add_argument(
+            '--columnas', default='RUT,FECHA,HORA,MOVIMIENTO',
+            help='Columnas a leer, separadas por coma (el reporte tiene 25).',
+        )
+
+    def _medir(self, etiqueta, fn, contenido, columnas, n):
+        t0    = time.perf_counter()
+        filas = fn(contenido, columnas)
+        dt    = time.perf_counter() - t0
+        self.stdout.write(f"  {etiqueta:<26} {dt:8.2f}s  {n / dt:10.0f} filas/s")
+        return dt, filas
+
+    def handle(self, *args, **opts):
+        n        = opts['filas']
+        columnas = [c.strip().upper() for c in opts['columnas'].split(',')]
+
+        self.stdout.write(f"Generando reporte sintético ({n} filas x {COLUMNAS} columnas)...")
+        xlsx, texto = generar_reporte(n)
+
+        antes, esperadas = self._medir('openpyxl (celdas)', _openpyxl_celdas, xlsx, columnas, n)
+        self._medir('openpyxl (values_only)', _openpyxl_valores, xlsx, columnas, n)
+        despues, leidas = self._medir('core.lectores xlsx', _lector, xlsx, columnas, n)
+        self._medir('core.lectores csv', _lector, texto, columnas, n)
+
+        if leidas != esperadas:
+            raise CommandError('El lector entregó valores distintos a openpyxl')
+        self.stdout.write(self.style.SUCCESS(f"Mismos valores que openpyxl. Speedup xlsx: x{antes / despues:.1f}"))
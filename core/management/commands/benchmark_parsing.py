@@ -0,0 +1,98 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+
+from django.core.management.base import BaseCommand
+
+from core import parsing
+
+
+# ─────────────────────────────────────────────
+# Referencia: los helpers que estaban copiados en cada services.py
+# ─────────────────────────────────────────────
+
+def _limpiar_rut_anterior(rut_raw):
+    if not rut_raw:
+        return None
+    rut = str(rut_raw).replace('.', '').strip().upper()
+    return rut if rut not in ('', 'NONE', 'NAN') else None
+
+
+def _parse_fecha_anterior(valor):
+    if not valor:
+        return None
+    if isinstance(valor, (date, datetime)):
+        return valor.date() if isinstance(valor, datetime) else valor
+    s = str(valor).strip()
+    if s in ('', 'None', 'nan'):
+        return None
+    for fmt in ('%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_hora_anterior(valor):
+    if not valor:
+        return None
+    if isinstance(valor, dtime):
+        return valor
+    if isinstance(valor, datetime):
+        return valor.time()
+    s = str(valor).strip()
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.strptime(s, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def generar_celdas(n, seed=0):
+    """Celdas de texto como las de un Reporte de Estadía: pocas fechas y RUTs, muchas repeticiones."""
+    rnd    = random.Random(seed)
+    base   = date(2025, 1, 1)
+    ruts   = [f"{rnd.randint(5, 25)}.{rnd.randint(100, 999)}.{rnd.randint(100, 999)}-{rnd.choice('0123456789K')}" for _ in range(5000)]
+    fechas = [(base + timedelta(days=rnd.randint(0, 90))).strftime('%d-%m-%Y') for _ in range(n)]
+    horas  = [f"{rnd.choice([7, 8, 13, 14, 17, 18])}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}".zfill(8) for _ in range(n)]
+    return [rnd.choice(ruts) for _ in range(n)], fechas, horas
+
+
+class Command(BaseCommand):
+    help = 'Mide el costo por celda de core.parsing contra los helpers anteriores (strptime por celda).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--celdas', type=int, default=500_000)
+
+    def _medir(self, fn, valores):
+        t0 = time.perf_counter()
+        for v in valores:
+            fn(v)
+        return (time.perf_counter() - t0) / len(valores) * 1e9
+
+    def handle(self, *args, **opts):
+        n = opts['celdas']
+        ruts, fechas, horas = generar_celdas(n)
+
+        casos = [
+            ('RUT',   _limpiar_rut_anterior, parsing.limpiar_rut, parsing._rut_texto,   ruts),
+            ('fecha', _parse_fecha_anterior, parsing.parse_fecha, parsing._fecha_texto, fechas),
+            ('hora',  _parse_hora_anterior,  parsing.parse_hora,  parsing._hora_texto,  horas),
+        ]
+        self.stdout.write(f"{n} celdas por columna (ns/celda)")
+        self.stdout.write(f"  {'':<6} {'anterior':>10} {'sin caché':>10} {'con caché':>10} {'speedup':>8}")
+        for nombre, anterior, nuevo, memo, valores in casos:
+            if [anterior(v) for v in valores[:10_000]] != [nuevo(v) for v in valores[:10_000]]:
+                self.stderr.write(f"  {nombre}: resultados distintos a la referencia")
+
+            antes = self._medir(anterior, valores)
+            memo.cache_clear()
+            sin_cache = self._medir(lambda v: memo.__wrapped__(str(v)), valores)
+            memo.cache_clear()
+            despues = self._medir(nuevo, valores)
+            self.stdout.write(
+                f"  {nombre:<6} {antes:10.0f} {sin_cache:10.0f} {despues:10.0f} {antes / despues:7.1f}x"
+            )
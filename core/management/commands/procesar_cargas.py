@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.cargas import REINTENTAR_DESPUES, drenar
+
+
+class Command(BaseCommand):
+    help = 'Procesa las cargas GREX pendientes (CargaInformacion). Se pueden correr varios en paralelo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help='No terminar al vaciar la cola: seguir consultando cada --intervalo segundos',
+        )
+        parser.add_argument('--intervalo', type=int, default=5)
+        parser.add_argument(
+            '--reintentar-despues', type=int,
+            default=int(REINTENTAR_DESPUES.total_seconds() // 60),
+            help='Minutos sin latido del worker tras los cuales una carga tomada se vuelve a procesar',
+        )
+
+    def handle(self, *args, **opts):
+        reintentar = timedelta(minutes=opts['reintentar_despues'])
+
+        while True:
+            procesadas = drenar(reintentar)
+            if procesadas:
+                self.stdout.write(self.style.SUCCESS(f"✅ Cargas procesadas: {procesadas}"))
+            if not opts['continuo']:
+                break
+            time.sleep(opts['intervalo'])
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_cargainformacion_cola'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cargainformacion',
+            name='fecha_datos_desde',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cargainformacion',
+            name='fecha_datos_hasta',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cargainformacion',
+            name='hash_contenido',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
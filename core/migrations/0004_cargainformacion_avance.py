@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_cargainformacion_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cargainformacion',
+            name='avance',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
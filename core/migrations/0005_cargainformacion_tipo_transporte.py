@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_cargainformacion_avance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cargainformacion',
+            name='tipo',
+            field=models.CharField(choices=[('DOTACION', 'Archivo de Fichas (Dotación)'), ('ASISTENCIA', 'Archivo de Asistencia (Estadía)'), ('TRANSPORTE', 'Archivo de Transporte (GREX)')], max_length=20),
+        ),
+    ]
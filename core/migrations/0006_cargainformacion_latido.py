@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_cargainformacion_tipo_transporte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cargainformacion',
+            name='latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
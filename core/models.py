@@ -4,6 +4,7 @@ class CargaInformacion(models.Model):
     TIPOS_ARCHIVO = [
         ('DOTACION', 'Archivo de Fichas (Dotación)'),
         ('ASISTENCIA', 'Archivo de Asistencia (Estadía)'),
+        ('TRANSPORTE', 'Archivo de Transporte (GREX)'),
     ]
 
     tipo = models.CharField(max_length=20, choices=TIPOS_ARCHIVO)
@@ -14,9 +15,27 @@ class CargaInformacion(models.Model):
     procesado = models.BooleanField(default=False)
     log_errores = models.TextField(blank=True, null=True)
 
+    # Cola de procesamiento (comando procesar_cargas)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)   # tomada por un worker
+    latido       = models.DateTimeField(null=True, blank=True)   # última señal de vida del worker (core.cargas)
+    fecha_fin    = models.DateTimeField(null=True, blank=True)
+    resultado    = models.JSONField(null=True, blank=True)       # resumen devuelto por el importador
+    avance       = models.JSONField(null=True, blank=True)       # checkpoint del último lote confirmado
+
+    # Huella del archivo (core.cargas.encolar): un archivo idéntico no se vuelve a procesar
+    hash_contenido    = models.CharField(max_length=64, blank=True, default='', db_index=True)   # SHA-256
+    fecha_datos_desde = models.DateField(null=True, blank=True)   # rango de fechas de los datos (Estadía)
+    fecha_datos_hasta = models.DateField(null=True, blank=True)
+
+    @property
+    def estado(self):
+        if not self.procesado:
+            return 'PROCESANDO' if self.fecha_inicio else 'PENDIENTE'
+        return 'COMPLETADO' if self.resultado is not None else 'ERROR'
+
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.fecha_carga.strftime('%d/%m/%Y')}"
 
     class Meta:
         verbose_name = "Carga de Información"
-        verbose_name_plural = "Cargas de Información"
\ No newline at end of file
+        verbose_name_plural = "Cargas de Información"
@@ -0,0 +1,91 @@
+"""
+Parsers compartidos de los importadores: RUT, fecha y hora.
+
+En los reportes GREX el mismo texto se repite miles de veces (todas las
+filas de un día traen la misma fecha, cada persona su RUT), así que la
+conversión de texto está memoizada: un valor repetido cuesta una búsqueda
+en el caché. Las fechas dd-mm-yyyy y horas HH:MM[:SS] (los formatos de
+GREX) se arman cortando el texto; los demás formatos pasan por strptime.
+"""
+from datetime import date, datetime, time
+from functools import lru_cache
+
+
+FORMATOS_FECHA = ('%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d')
+FORMATOS_HORA  = ('%H:%M:%S', '%H:%M')
+
+# Tamaño de los cachés: holgado para un reporte grande, acotado para un worker que no se reinicia
+MAX_CACHE = 100_000
+
+
+def limpiar_rut(valor):
+    """RUT sin puntos y en mayúsculas, o None si viene vacío."""
+    if not valor:
+        return None
+    return _rut_texto(str(valor))
+
+
+@lru_cache(maxsize=MAX_CACHE)
+def _rut_texto(texto):
+    rut = texto.replace('.', '').strip().upper()
+    return rut if rut not in ('', 'NONE', 'NAN') else None
+
+
+def parse_fecha(valor):
+    """date desde una celda (date, datetime o texto en FORMATOS_FECHA); None si no se puede."""
+    if not valor:
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return _fecha_texto(str(valor))
+
+
+@lru_cache(maxsize=MAX_CACHE)
+def _fecha_texto(texto):
+    s = texto.strip()
+    # Camino rápido dd-mm-yyyy
+    if len(s) == 10 and s[2] == '-' and s[5] == '-':
+        dia, mes, anio = s[:2], s[3:5], s[6:]
+        if dia.isdigit() and mes.isdigit() and anio.isdigit():
+            try:
+                return date(int(anio), int(mes), int(dia))
+            except ValueError:
+                return None
+    for fmt in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_hora(valor):
+    """time desde una celda (time, datetime o texto en FORMATOS_HORA); None si no se puede."""
+    if not valor:
+        return None
+    if isinstance(valor, time):
+        return valor
+    if isinstance(valor, datetime):
+        return valor.time()
+    return _hora_texto(str(valor))
+
+
+@lru_cache(maxsize=MAX_CACHE)
+def _hora_texto(texto):
+    s = texto.strip()
+    # Camino rápido HH:MM:SS / HH:MM
+    if len(s) in (5, 8) and s[2] == ':' and (len(s) == 5 or s[5] == ':'):
+        partes = (s[:2], s[3:5], s[6:8] or '0')
+        if all(p.isdigit() for p in partes):
+            try:
+                return time(*map(int, partes))
+            except ValueError:
+                return None
+    for fmt in FORMATOS_HORA:
+        try:
+            return datetime.strptime(s, fmt).time()
+        except ValueError:
+            continue
+    return None
@@ -1,3 +1,345 @@
-from django.test import TestCase
+import tempfile
+import time
+from datetime import date, datetime, time as hora, timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from openpyxl import Workbook, load_workbook
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models.constants import OnConflict
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from asistencia.models import Marcaje, RegistroAsistencia
+from dotacion.models import Colaborador
+
+from .bulk import _texto_copy, copiar_objetos, insertar_filas, upsert_con_copy, usa_copy
+from .cargas import (
+    PROCESADORES, aviso_repetida, drenar, ejecutar, encolar, estado_carga, latiendo, tomar_siguiente,
+)
+from .lectores import EncabezadoNoEncontrado, abrir_tabla
+from .models import CargaInformacion
+from .parsing import _fecha_texto, limpiar_rut, parse_fecha, parse_hora
+
+
+def nueva_carga(tipo='DOTACION', **campos):
+    return CargaInformacion.objects.create(tipo=tipo, archivo=f'cargas/{tipo.lower()}.xlsx', **campos)
+
+
+def procesador_ok(carga):
+    return {'mensaje': 'ok', 'errores': ['Fila 3: sin RUT']}
+
+
+def procesador_con_error(carga):
+    raise ValueError('El archivo no tiene la columna obligatoria')
+
+
+class ColaCargasTests(TestCase):
+
+    def test_toma_la_mas_antigua_una_sola_vez(self):
+        primera, segunda = nueva_carga(), nueva_carga()
+        self.assertEqual(tomar_siguiente(), primera)
+        self.assertEqual(tomar_siguiente(), segunda)
+        self.assertIsNone(tomar_siguiente())
+
+        primera.refresh_from_db()
+        self.assertIsNotNone(primera.latido)
+        self.assertEqual(primera.estado, 'PROCESANDO')
+
+    def test_no_retoma_una_carga_con_latido(self):
+        # Tomada hace una hora, pero su worker sigue latiendo
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        nueva_carga(fecha_inicio=hace_una_hora, latido=timezone.now() - timedelta(minutes=1))
+        self.assertIsNone(tomar_siguiente())
+
+    def test_retoma_una_carga_sin_latido(self):
+        carga = nueva_carga(fecha_inicio=timezone.now() - timedelta(hours=1), latido=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tomar_siguiente(), carga)
+
+    @mock.patch.dict(PROCESADORES, {'DOTACION': 'core.tests.procesador_ok', 'ASISTENCIA': 'core.tests.procesador_con_error'})
+    def test_drenar_y_estado(self):
+        ok, con_error = nueva_carga('DOTACION'), nueva_carga('ASISTENCIA')
+        self.assertEqual(estado_carga(ok)['estado'], 'PENDIENTE')
+        self.assertEqual(drenar(), 2)
+
+        ok.refresh_from_db()
+        con_error.refresh_from_db()
+        self.assertEqual(
+            {k: v for k, v in estado_carga(ok).items() if k in ('estado', 'mensaje', 'errores')},
+            {'estado': 'COMPLETADO', 'mensaje': 'ok', 'errores': ['Fila 3: sin RUT']},
+        )
+        self.assertEqual(ok.log_errores, 'Fila 3: sin RUT')
+        self.assertEqual(estado_carga(con_error)['estado'], 'ERROR')
+        self.assertIn('columna obligatoria', estado_carga(con_error)['mensaje'])
+
+    def test_estado_con_avance(self):
+        carga = nueva_carga('ASISTENCIA', fecha_inicio=timezone.now(), avance={'dias': 3000})
+        self.assertEqual(estado_carga(carga)['mensaje'], '3000 días-persona guardados')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@mock.patch.dict(PROCESADORES, {'DOTACION': 'core.tests.procesador_ok'})
+class DeduplicacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('rrhh', password='x')
+
+    def _subir(self, contenido, tipo='DOTACION'):
+        request         = RequestFactory().post('/')
+        request.user    = self.usuario
+        request.session = {}
+        carga, creada = encolar(request, tipo, SimpleUploadedFile('fichas.xlsx', contenido))
+        self.assertEqual(request.session[f'carga_{tipo}'], carga.pk)
+        return carga, creada
+
+    def test_mismo_archivo_que_la_ultima_no_se_reprocesa(self):
+        primera, _ = self._subir(b'foto A')
+        drenar()
+        carga, creada = self._subir(b'foto A')
+        self.assertFalse(creada)
+        self.assertEqual(carga, primera)
+        self.assertIn(f'#{primera.pk}', aviso_repetida(carga))
+
+    def test_mismo_archivo_en_cola(self):
+        primera, _ = self._subir(b'foto A')
+        carga, creada = self._subir(b'foto A')
+        self.assertEqual((carga, creada), (primera, False))
+        self.assertIn('todavía se está procesando', aviso_repetida(carga))
+
+    def test_volver_a_una_foto_anterior_se_procesa(self):
+        a, _ = self._subir(b'foto A')
+        drenar()
+        self._subir(b'foto B')
+        drenar()
+        carga, creada = self._subir(b'foto A')
+        self.assertTrue(creada)
+        self.assertNotEqual(carga, a)
+
+    def test_se_reintenta_tras_error_y_por_tipo(self):
+        fallida, _ = self._subir(b'foto A')
+        CargaInformacion.objects.filter(pk=fallida.pk).update(procesado=True, log_errores='x')
+        self.assertTrue(self._subir(b'foto A')[1])
+        self.assertTrue(self._subir(b'foto A', tipo='ASISTENCIA')[1])
+
+
+def procesador_lento(carga):
+    """Como Fichas: no llama a guardar_avance. A mitad de camino, otro worker busca trabajo."""
+    time.sleep(0.3)
+    return {'mensaje': 'ok', 'retomada_por_otro': tomar_siguiente(timedelta(milliseconds=200)) is not None}
+
+
+class LatidoTests(TransactionTestCase):
+    """El hilo del latido escribe con su propia conexión: necesita datos confirmados."""
+
+    def test_latido_se_renueva_mientras_procesa(self):
+        carga   = nueva_carga()
+        tomada  = tomar_siguiente()
+        inicial = tomada.latido
+
+        with latiendo(tomada, intervalo=timedelta(milliseconds=50)):
+            time.sleep(0.3)
+
+        carga.refresh_from_db()
+        self.assertGreater(carga.latido, inicial)
+        self.assertEqual(carga.fecha_inicio, inicial)
+
+    @mock.patch.dict(PROCESADORES, {'DOTACION': 'core.tests.procesador_lento'})
+    @mock.patch('core.cargas.INTERVALO_LATIDO', timedelta(milliseconds=50))
+    def test_otro_worker_no_toma_una_carga_en_curso(self):
+        nueva_carga()
+        carga = ejecutar(tomar_siguiente())
+        self.assertEqual(carga.estado, 'COMPLETADO')
+        self.assertFalse(carga.resultado['retomada_por_otro'])
+
+
+def libro_xlsx(filas, formatos=None):
+    """xlsx en memoria con `filas`; formatos: {columna (letra): number_format}."""
+    libro = Workbook()
+    hoja  = libro.active
+    for fila in filas:
+        hoja.append(fila)
+    for letra, formato in (formatos or {}).items():
+        for celda in hoja[letra]:
+            celda.number_format = formato
+    archivo = BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+class LectorTablasTests(TestCase):
+
+    ENCABEZADO = ['RUT', 'NOMBRE', 'FECHA', 'HORA', 'MONTO', 'ACTIVO']
+    FILAS = [
+        ['REPORTE DE PRUEBA'],
+        [],
+        ENCABEZADO,
+        ['1-9', 'ANA', datetime(2025, 3, 3), hora(8, 30), 1500, True],
+        ['2-7', 'LUIS', datetime(2025, 3, 4, 22, 15), hora(17, 0, 5), 12.5, False],
+        [],
+        ['3-5', None, None, None, -3, None],
+    ]
+
+    def test_xlsx_tipado(self):
+        with abrir_tabla(libro_xlsx(self.FILAS), requeridas=['rut', 'FECHA']) as tabla:
+            self.assertEqual(tabla.fila_encabezado, 3)
+            self.assertIn('MONTO', tabla)
+            filas = list(tabla.filas(['RUT', 'FECHA', 'HORA', 'MONTO', 'ACTIVO', 'NO EXISTE', 1]))
+        self.assertEqual(filas, [
+            (4, ('1-9', datetime(2025, 3, 3), hora(8, 30), 1500, True, None, 'ANA')),
+            (5, ('2-7', datetime(2025, 3, 4, 22, 15), hora(17, 0, 5), 12.5, False, None, 'LUIS')),
+            (6, (None,) * 7),
+            (7, ('3-5', None, None, -3, None, None, None)),
+        ])
+
+    def test_igual_que_openpyxl_en_varios_bloques(self):
+        filas = [self.ENCABEZADO] + [
+            [f'{n}-K', f'PERSONA {n}', datetime(2025, 1, 1) + timedelta(days=n), hora(n % 24, n % 60), n * 1.5, n % 2 == 0]
+            for n in range(1, 400)
+        ]
+        archivo = libro_xlsx(filas)
+        hoja    = load_workbook(archivo, read_only=True).active
+        esperado = [tuple(c.value for c in fila) for fila in hoja.iter_rows(min_row=2)]
+        archivo.seek(0)
+
+        # Bloques chicos: las filas quedan cortadas entre lecturas del XML
+        with mock.patch('core.lectores.TAMANO_BLOQUE', 2048), abrir_tabla(archivo, requeridas=['RUT']) as tabla:
+            leidas = [valores for _, valores in tabla.filas(self.ENCABEZADO)]
+        self.assertEqual(leidas, esperado)
+
+    def test_formato_fecha_personalizado(self):
+        filas = [['FECHA', 'SERIAL'], [45719, 45719]]
+        with abrir_tabla(libro_xlsx(filas, formatos={'A': 'dd"/"mm"/"yyyy'})) as tabla:
+            self.assertEqual(list(tabla.filas(['FECHA', 'SERIAL'])), [(2, (datetime(2025, 3, 3), 45719))])
+
+    def test_csv(self):
+        texto = 'Reporte;Marzo\r\nRUT;NOMBRE;ÁREA\r\n1-9;ANA;PACKING\r\n\r\n2-7;;CAMPO\r\n'
+        for encoding in ('latin-1', 'utf-8-sig'):
+            with abrir_tabla(BytesIO(texto.encode(encoding)), requeridas=['RUT', 'ÁREA']) as tabla:
+                self.assertEqual(tabla.fila_encabezado, 2)
+                self.assertEqual(
+                    list(tabla.filas(['RUT', 'NOMBRE', 'ÁREA'])),
+                    [(3, ('1-9', 'ANA', 'PACKING')), (4, (None, None, None)), (5, ('2-7', None, 'CAMPO'))],
+                )
+
+    def test_encabezado_fijo_y_faltante(self):
+        with abrir_tabla(libro_xlsx(self.FILAS), fila_encabezado=3) as tabla:
+            self.assertEqual(next(tabla.filas([0]))[1], ('1-9',))
+
+        with self.assertRaises(EncabezadoNoEncontrado) as error:
+            abrir_tabla(libro_xlsx(self.FILAS), requeridas=['RUT', 'TURNO', 'SECCION'])
+        self.assertEqual(error.exception.faltantes, ['TURNO', 'SECCION'])
+
+
+class ParsingTests(TestCase):
+
+    def test_limpiar_rut(self):
+        casos = {'12.345.678-k': '12345678-K', ' 1-9 ': '1-9', 12345678: '12345678', 'nan': None, '': None, None: None}
+        for valor, esperado in casos.items():
+            self.assertEqual(limpiar_rut(valor), esperado, valor)
+
+    def test_parse_fecha(self):
+        casos = [
+            ('03-03-2025', date(2025, 3, 3)),
+            (' 03/03/2025 ', date(2025, 3, 3)),
+            ('2025-03-03', date(2025, 3, 3)),
+            ('31-02-2025', None),                   # camino rápido con fecha imposible
+            ('3-3-2025', date(2025, 3, 3)),         # strptime acepta sin ceros
+            ('marzo', None),
+            (datetime(2025, 3, 3, 8, 0), date(2025, 3, 3)),
+            (date(2025, 3, 3), date(2025, 3, 3)),
+            (None, None),
+        ]
+        for valor, esperado in casos:
+            self.assertEqual(parse_fecha(valor), esperado, valor)
+
+    def test_parse_hora(self):
+        casos = [
+            ('08:30', hora(8, 30)),
+            ('08:30:15', hora(8, 30, 15)),
+            ('8:30', hora(8, 30)),
+            ('24:00', None),
+            ('08h30', None),
+            (hora(8, 30), hora(8, 30)),
+            (datetime(2025, 3, 3, 22, 15), hora(22, 15)),
+            ('', None),
+        ]
+        for valor, esperado in casos:
+            self.assertEqual(parse_hora(valor), esperado, valor)
+
+    def test_texto_repetido_sale_del_cache(self):
+        parse_fecha('17-03-2025')
+        aciertos = _fecha_texto.cache_info().hits
+        parse_fecha('17-03-2025')
+        self.assertEqual(_fecha_texto.cache_info().hits, aciertos + 1)
+
+
+class BulkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for rut in ('1-9', '2-7'):
+            Colaborador.objects.create(rut=rut, nombre_completo=f'PERSONA {rut}')
+
+    def test_insertar_filas_por_lotes(self):
+        filas = [('1-9', '2025-03-03', f'08:{m:02d}:00', 'Entrada', None) for m in range(5)]
+        with mock.patch('core.bulk.BATCH_SIZE', 2), CaptureQueriesContext(connection) as consultas:
+            n = insertar_filas(Marcaje, ['colaborador', 'fecha', 'hora', 'tipo_movimiento', 'dispositivo'], filas)
+        self.assertEqual(n, 5)
+        self.assertEqual(len([c for c in consultas.captured_queries if c['sql'].startswith('INSERT')]), 3)
+        self.assertEqual(
+            list(Marcaje.objects.order_by('hora').values_list('hora', flat=True)),
+            [hora(8, m) for m in range(5)],
+        )
+
+    def test_insertar_filas_con_conflictos(self):
+        campos = ['colaborador', 'fecha', 'hora_entrada']
+        insertar_filas(RegistroAsistencia, campos, [('1-9', '2025-03-03', '08:00:00')])
+
+        insertar_filas(
+            RegistroAsistencia, campos, [('1-9', '2025-03-03', '09:00:00'), ('2-7', '2025-03-03', '07:00:00')],
+            on_conflict=OnConflict.IGNORE,
+        )
+        self.assertEqual(RegistroAsistencia.objects.get(colaborador_id='1-9').hora_entrada, hora(8, 0))
+
+        insertar_filas(
+            RegistroAsistencia, campos, [('1-9', '2025-03-03', '09:00:00')],
+            on_conflict=OnConflict.UPDATE, unicos=['colaborador', 'fecha'], actualizar=['hora_entrada'],
+        )
+        self.assertEqual(RegistroAsistencia.objects.get(colaborador_id='1-9').hora_entrada, hora(9, 0))
+        self.assertEqual(RegistroAsistencia.objects.count(), 2)
+
+    def test_texto_copy(self):
+        self.assertEqual(_texto_copy(None), '\\N')
+        self.assertEqual(_texto_copy('a\tb\nc\\d\r'), 'a\\tb\\nc\\\\d\\r')
+        self.assertEqual(_texto_copy(date(2025, 3, 3)), '2025-03-03')
+
+    def test_copy_en_postgres(self):
+        if not usa_copy():
+            self.skipTest('COPY es solo de Postgres')
+        copiar_objetos([
+            Marcaje(colaborador_id='1-9', fecha=date(2025, 3, 3), hora=hora(8, 0), dispositivo='RELOJ\t1\\N'),
+            Marcaje(colaborador_id='2-7', fecha=date(2025, 3, 3), hora=hora(8, 5)),
+        ])
+        self.assertEqual(
+            sorted(Marcaje.objects.values_list('colaborador_id', 'dispositivo')),
+            [('1-9', 'RELOJ\t1\\N'), ('2-7', None)],
+        )
+
+        antes = timezone.now()
+        upsert_con_copy(
+            [
+                Colaborador(rut='1-9', nombre_completo='ANA\nSOTO', area='PACKING'),
+                Colaborador(rut='3-5', nombre_completo='NUEVA'),
+            ],
+            ['rut'], ['nombre_completo', 'area', 'updated_at'],
+        )
+        ana = Colaborador.objects.get(rut='1-9')
+        self.assertEqual((ana.nombre_completo, ana.area), ('ANA\nSOTO', 'PACKING'))
+        self.assertGreaterEqual(ana.updated_at, antes)
+        self.assertEqual(Colaborador.objects.count(), 3)
@@ -1,8 +1,21 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+
+from .cargas import estado_carga
+from .models import CargaInformacion
 
 
 @login_required
 def dashboard(request):
     """Vista principal del sistema. Solo navegación y bienvenida."""
-    return render(request, 'core/dashboard.html')
\ No newline at end of file
+    return render(request, 'core/dashboard.html')
+
+
+@login_required
+def api_estado_carga(request, pk):
+    """Estado de una carga GREX en cola (lo consultan los templates por polling)."""
+    carga = get_object_or_404(CargaInformacion, pk=pk)
+    if carga.usuario_id != request.user.id and not request.user.is_staff:
+        return JsonResponse({'error': '403'}, status=403)
+    return JsonResponse(estado_carga(carga))
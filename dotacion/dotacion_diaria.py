@@ -0,0 +1,236 @@
+"""
+Mantenimiento de la tabla de hechos DotacionDiaria.
+
+Cada ficha aporta a su grupo (área, centro de costo, tipo de contrato) solo
+desde su fecha de ingreso en adelante, así que un cambio en una ficha se
+resuelve recalculando su grupo desde el ingreso (el anterior y el nuevo, si
+cambió). Los grupos afectados se acumulan durante la transacción y se
+recalculan una sola vez al confirmar (marcar_afectados).
+
+La tabla llega hasta el último día en que alguien la escribió. Los días
+nuevos los agregan las importaciones (al confirmar) y el comando nocturno
+`reconstruir_dotacion_diaria --extender` (build.sh lo corre en cada
+despliegue, y con la tabla vacía hace el backfill completo). La lectura
+(kpis) nunca escribe: los días que la tabla todavía no cubre los calcula en
+memoria con totales_por_dia.
+
+El recálculo de un grupo es vectorizado: con los ingresos y términos como
+ordinales, vigentes(d) = #(ingreso <= d) - #(término < d) para todos los días
+de una vez: O((fichas + días) log fichas) en vez de O(días × fichas).
+"""
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Min, Q
+
+from core.bulk import copiar_objetos, usa_copy
+
+from .models import Colaborador, DotacionDiaria
+
+
+BATCH_SIZE = 1000
+
+CAMPOS_GRUPO    = ['area', 'centro_costo', 'tipo_contrato']
+CAMPOS_DOTACION = CAMPOS_GRUPO + ['fecha_ingreso', 'fecha_termino_contrato']
+
+SIN_TERMINO = date.max.toordinal() + 1
+
+
+# ─────────────────────────────────────────────
+# Grupos afectados por un cambio
+# ─────────────────────────────────────────────
+
+def grupo_de(valores):
+    """(área, centro_costo, tipo_contrato) de un dict de valores, sin nulos."""
+    return tuple(valores.get(c) or '' for c in CAMPOS_GRUPO)
+
+
+def afectados(nuevos, anteriores=None):
+    """
+    {grupo: desde} que hay que recalcular cuando una ficha pasa de
+    `anteriores` a `nuevos` (dicts con CAMPOS_DOTACION; None si no existe).
+    """
+    grupos = {}
+    for valores in (anteriores, nuevos):
+        if valores and valores.get('fecha_ingreso'):
+            g = grupo_de(valores)
+            grupos[g] = min(grupos.get(g, valores['fecha_ingreso']), valores['fecha_ingreso'])
+    return grupos
+
+
+_pendientes = threading.local()
+
+
+def marcar_afectados(grupos):
+    """Agenda el recálculo de `grupos` ({grupo: desde}) al confirmar la transacción."""
+    if not grupos:
+        return
+    pendientes = getattr(_pendientes, 'grupos', None)
+    if pendientes is None:
+        pendientes = _pendientes.grupos = {}
+    for g, desde in grupos.items():
+        pendientes[g] = min(pendientes.get(g, desde), desde)
+    # Se registra en cada llamada: si una transacción anterior hizo rollback su
+    # callback no corrió, y los grupos que dejó se aprovechan en este.
+    transaction.on_commit(_recalcular_pendientes)
+
+
+def _recalcular_pendientes():
+    grupos = getattr(_pendientes, 'grupos', None)
+    if not grupos:
+        return
+    from .kpis import invalidar_kpis    # kpis importa este módulo
+
+    _pendientes.grupos = {}
+    # Primero los días que faltan hasta hoy para todos los grupos; luego los grupos tocados
+    asegurar_cobertura(date.today())
+    recalcular(grupos)
+    # Después del recálculo: un snapshot armado antes quedaría con datos viejos
+    invalidar_kpis()
+
+
+# ─────────────────────────────────────────────
+# Recálculo
+# ─────────────────────────────────────────────
+
+def _conteos(ingresos, terminos, desde, hasta):
+    """(vigentes, ingresos, finiquitos) por día entre desde y hasta (ordinales)."""
+    ingresos = np.asarray(ingresos, dtype=np.int64)
+    terminos = np.asarray(terminos, dtype=np.int64)
+    dias     = np.arange(desde, hasta + 1, dtype=np.int64)
+
+    # Un término anterior al ingreso nunca cuenta como activo ni como finiquito
+    validas  = terminos >= ingresos
+    ing_ok   = np.sort(ingresos[validas])
+    ter_ok   = terminos[validas]
+    ter_ok   = np.sort(ter_ok[ter_ok != SIN_TERMINO])
+
+    vigentes   = np.searchsorted(ing_ok, dias, side='right') - np.searchsorted(ter_ok, dias, side='left')
+    en_rango   = (ingresos >= desde) & (ingresos <= hasta)
+    nuevos     = np.bincount(ingresos[en_rango] - desde, minlength=len(dias))
+    en_rango   = (ter_ok >= desde) & (ter_ok <= hasta)
+    finiquitos = np.bincount(ter_ok[en_rango] - desde, minlength=len(dias))
+    return vigentes, nuevos, finiquitos
+
+
+def _filas_grupo(grupo, ingresos, terminos, desde, hasta):
+    """Instancias DotacionDiaria de un grupo entre desde y hasta (ordinales)."""
+    vigentes, nuevos, finiquitos = _conteos(ingresos, terminos, desde, hasta)
+
+    area, centro_costo, tipo_contrato = grupo
+    return [
+        DotacionDiaria(
+            fecha         = date.fromordinal(desde + int(i)),
+            area          = area,
+            centro_costo  = centro_costo,
+            tipo_contrato = tipo_contrato,
+            vigentes      = int(vigentes[i]),
+            ingresos      = int(nuevos[i]),
+            finiquitos    = int(finiquitos[i]),
+        )
+        for i in np.flatnonzero(vigentes | nuevos | finiquitos)
+    ]
+
+
+def _fichas_activas(desde, hasta, campos):
+    """Fichas que pueden aportar entre desde y hasta: las terminadas antes no cuentan."""
+    return (
+        Colaborador.objects
+        .filter(fecha_ingreso__isnull=False, fecha_ingreso__lte=hasta)
+        .filter(Q(fecha_termino_contrato__isnull=True) | Q(fecha_termino_contrato__gte=desde))
+        .values_list(*campos)
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def recalcular(grupos=None, desde=None, hasta=None):
+    """
+    Reescribe DotacionDiaria.
+
+    grupos: {grupo: desde} a recalcular; None = todos los grupos desde `desde`
+            (o desde el primer ingreso si tampoco se indica).
+    hasta : último día; por defecto hoy o el último día ya calculado.
+    Devuelve la cantidad de filas escritas.
+    """
+    if grupos is None:
+        desde = desde or Colaborador.objects.aggregate(m=Min('fecha_ingreso'))['m']
+        if desde is None:
+            DotacionDiaria.objects.all().delete()
+            return 0
+        desde_min = desde
+    else:
+        desde_min = min(grupos.values())
+
+    ultimo = DotacionDiaria.objects.aggregate(m=Max('fecha'))['m']
+    hasta  = hasta or max(date.today(), ultimo or date.min)
+    if desde_min > hasta:
+        return 0
+
+    fichas = defaultdict(lambda: ([], []))
+    for area, cc, tipo, ingreso, termino in _fichas_activas(desde_min, hasta, CAMPOS_DOTACION):
+        g = (area or '', cc or '', tipo or '')
+        if grupos is not None and g not in grupos:
+            continue
+        fichas[g][0].append(ingreso.toordinal())
+        fichas[g][1].append(termino.toordinal() if termino else SIN_TERMINO)
+
+    filas = []
+    for g in (fichas if grupos is None else grupos):
+        inicio_g = desde_min if grupos is None else grupos[g]
+        if g in fichas and inicio_g <= hasta:
+            filas += _filas_grupo(g, *fichas[g], inicio_g.toordinal(), hasta.toordinal())
+
+    with transaction.atomic():
+        if grupos is None:
+            DotacionDiaria.objects.filter(fecha__gte=desde_min, fecha__lte=hasta).delete()
+        else:
+            for (area, cc, tipo), inicio_g in grupos.items():
+                DotacionDiaria.objects.filter(
+                    area=area, centro_costo=cc, tipo_contrato=tipo,
+                    fecha__gte=inicio_g, fecha__lte=hasta,
+                ).delete()
+        if usa_copy():
+            copiar_objetos(filas)
+        else:
+            DotacionDiaria.objects.bulk_create(filas, batch_size=BATCH_SIZE)
+    return len(filas)
+
+
+def asegurar_cobertura(hasta):
+    """
+    Extiende la tabla hasta `hasta` (p.ej. al cambiar el día): los días nuevos
+    se calculan para todos los grupos a partir del último día ya calculado.
+    Devuelve la cantidad de filas escritas.
+    """
+    ultimo = DotacionDiaria.objects.aggregate(m=Max('fecha'))['m']
+    if ultimo is not None and ultimo >= hasta:
+        return 0
+    desde = ultimo + timedelta(days=1) if ultimo else None
+    try:
+        return recalcular(desde=desde, hasta=hasta)
+    except IntegrityError:
+        return 0                    # otro proceso la extendió al mismo tiempo
+
+
+def totales_por_dia(desde, hasta):
+    """
+    {fecha: (vigentes, ingresos)} sumando todos los grupos, calculado desde las
+    fichas sin escribir la tabla (los días que DotacionDiaria aún no cubre).
+    Solo trae los días con algún valor distinto de cero, igual que la tabla.
+    """
+    if desde > hasta:
+        return {}
+    ingresos, terminos = [], []
+    for ingreso, termino in _fichas_activas(desde, hasta, ['fecha_ingreso', 'fecha_termino_contrato']):
+        ingresos.append(ingreso.toordinal())
+        terminos.append(termino.toordinal() if termino else SIN_TERMINO)
+
+    desde = desde.toordinal()
+    vigentes, nuevos, finiquitos = _conteos(ingresos, terminos, desde, hasta.toordinal())
+    return {
+        date.fromordinal(desde + int(i)): (int(vigentes[i]), int(nuevos[i]))
+        for i in np.flatnonzero(vigentes | nuevos | finiquitos)
+    }
@@ -0,0 +1,296 @@
+"""
+Cálculos vectorizados para los KPIs de dotación (api_kpis).
+
+La curva de dotación activa y las contrataciones se leen de la tabla de
+hechos DotacionDiaria (dotacion_diaria.py), en los puntos de corte de la
+granularidad pedida. Los días posteriores al último que tiene la tabla (o
+todos, si nunca se pobló) se calculan en memoria desde las fichas.
+
+Los histogramas de edad y permanencia se resuelven en la BD: cada tramo se
+traduce a un rango de fechas calculado en Python (con las mismas reglas que
+Colaborador.edad / meses_permanencia), así el SQL solo compara fechas y
+funciona igual en SQLite y Postgres.
+
+El dashboard completo (calcular_kpis) se guarda como snapshot en el caché
+'kpis', con una clave que incluye un contador de versión de los datos: cada
+importación de fichas o cambio de estado lo incrementa y los snapshots
+anteriores quedan inalcanzables hasta que expiran.
+"""
+import time
+from datetime import date, timedelta
+
+from django.core.cache import caches
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+
+from .dotacion_diaria import totales_por_dia
+from .models import Colaborador, DotacionDiaria
+
+
+GRANULARIDADES = ('dia', 'semana', 'mes')
+
+FORMATO_ETIQUETA = {
+    'dia'   : '%d/%m/%Y',
+    'semana': '%d/%m/%Y',
+    'mes'   : '%m/%Y',
+}
+
+
+def periodo_de(fecha, granularidad):
+    """Inicio del día / semana (lunes) / mes al que pertenece `fecha`, como Trunc*."""
+    if granularidad == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def puntos_de_corte(inicio, fin, granularidad='semana'):
+    """Fechas en que se mide la curva entre inicio y fin (inclusive)."""
+    if granularidad == 'dia':
+        punto, paso = inicio, timedelta(days=1)
+    elif granularidad == 'semana':
+        punto, paso = inicio - timedelta(days=inicio.weekday()), timedelta(weeks=1)
+    else:
+        punto, paso = date(inicio.year, inicio.month, 1), None
+
+    puntos = []
+    while punto <= fin:
+        puntos.append(punto)
+        if paso:
+            punto += paso
+        else:
+            punto = date(punto.year + punto.month // 12, punto.month % 12 + 1, 1)
+    return puntos
+
+
+# ─────────────────────────────────────────────
+# Histogramas en la BD
+# ─────────────────────────────────────────────
+
+RANGOS_EDAD = [('18-25', 18, 25), ('26-35', 26, 35), ('36-45', 36, 45), ('46-55', 46, 55), ('56+', 56, None)]
+
+RANGOS_PERMANENCIA = [
+    ('< 3 meses', None, 3), ('3-6 meses', 3, 6), ('6-12 meses', 6, 12),
+    ('1-2 años', 12, 24), ('2-5 años', 24, 60), ('5+ años', 60, None),
+]
+
+
+def _nacido_hasta(hoy, edad):
+    """Última fecha de nacimiento con la que hoy se tienen `edad` años cumplidos."""
+    try:
+        return hoy.replace(year=hoy.year - edad)
+    except ValueError:              # 29 de febrero en año no bisiesto
+        return date(hoy.year - edad, 2, 28)
+
+
+def _inicio_mes_atras(hoy, meses):
+    """Primer día del mes que está `meses` meses antes del mes de hoy."""
+    indice = hoy.year * 12 + hoy.month - 1 - meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def histograma_edad(qs, hoy):
+    """{rango: cantidad} para el gráfico de rango etario, en un solo query."""
+    filtros = {}
+    for etiqueta, desde, hasta in RANGOS_EDAD:
+        q = Q(fecha_nacimiento__lte=_nacido_hasta(hoy, desde))
+        if hasta is not None:
+            q &= Q(fecha_nacimiento__gt=_nacido_hasta(hoy, hasta + 1))
+        filtros[etiqueta] = q
+    return _contar_tramos(qs.filter(fecha_nacimiento__isnull=False), filtros)
+
+
+def histograma_permanencia(qs, hoy):
+    """
+    {rango: cantidad} de meses de permanencia (colaboradores vigentes: se
+    mide contra hoy, por mes calendario como Colaborador.meses_permanencia).
+    """
+    filtros = {}
+    for etiqueta, desde, hasta in RANGOS_PERMANENCIA:
+        q = Q()
+        if desde is not None:       # meses >= desde
+            q &= Q(fecha_ingreso__lt=_inicio_mes_atras(hoy, desde - 1))
+        if hasta is not None:       # meses < hasta
+            q &= Q(fecha_ingreso__gte=_inicio_mes_atras(hoy, hasta - 1))
+        filtros[etiqueta] = q
+    return _contar_tramos(qs.filter(fecha_ingreso__isnull=False), filtros)
+
+
+def _contar_tramos(qs, filtros):
+    # Count(filter=...) se compila a FILTER (WHERE ...) en Postgres y a CASE WHEN en SQLite
+    conteos = qs.aggregate(**{
+        f't{i}': Count('pk', filter=q) for i, q in enumerate(filtros.values())
+    })
+    return {etiqueta: conteos[f't{i}'] for i, etiqueta in enumerate(filtros)}
+
+
+# ─────────────────────────────────────────────
+# Dashboard completo
+# ─────────────────────────────────────────────
+
+def calcular_kpis(inicio, fin, granularidad='semana', hoy=None):
+    """
+    Datos de todos los gráficos del dashboard de dotación (respuesta de
+    api_kpis). Solo lee: el rango se corta en hoy y DotacionDiaria la
+    mantienen las importaciones y el comando nocturno; lo que la tabla aún no
+    cubre se calcula en memoria.
+    """
+    hoy      = hoy or date.today()
+    fin      = min(fin, hoy)
+    vigentes = Colaborador.objects.filter(estado='VIGENTE', fecha_ingreso__lte=fin)
+
+    total_vigentes  = vigentes.count()
+    total_historico = Colaborador.objects.count()
+    sin_contacto    = vigentes.filter(
+        Q(email__isnull=True) | Q(email='') |
+        Q(telefono__isnull=True) | Q(telefono='')
+    ).count()
+
+    # 1. Dotación activa por día / semana / mes (tabla de hechos DotacionDiaria)
+    puntos  = puntos_de_corte(inicio, fin, granularidad)
+    formato = FORMATO_ETIQUETA[granularidad]
+    por_dia = dict(
+        DotacionDiaria.objects
+        .filter(fecha__range=[puntos[0], puntos[-1]] if puntos else [fin, inicio])
+        .values('fecha').annotate(total=Sum('vigentes'))
+        .values_list('fecha', 'total')
+    )
+
+    # Días que la tabla todavía no tiene: sin backfill, o después del último --extender
+    ultimo = DotacionDiaria.objects.aggregate(m=Max('fecha'))['m']
+    desde  = min(puntos[0], inicio) if puntos else inicio
+    if ultimo is not None:
+        desde = max(desde, ultimo + timedelta(days=1))
+    en_memoria = totales_por_dia(desde, fin)
+    por_dia.update({f: vigentes for f, (vigentes, _) in en_memoria.items()})
+
+    dotacion_labels = [p.strftime(formato) for p in puntos]
+    dotacion_values = [por_dia.get(p, 0) for p in puntos]
+
+    # 2. Contrataciones por día / semana / mes
+    trunc = {'dia': TruncDay, 'semana': TruncWeek, 'mes': TruncMonth}[granularidad]
+    contrataciones = dict(
+        DotacionDiaria.objects
+        .filter(ingresos__gt=0, fecha__range=[inicio, fin])
+        .annotate(periodo=trunc('fecha'))
+        .values('periodo').annotate(total=Sum('ingresos'))
+        .values_list('periodo', 'total')
+    )
+    for f, (_, ingresos) in en_memoria.items():
+        if ingresos and inicio <= f:
+            periodo = periodo_de(f, granularidad)
+            contrataciones[periodo] = contrataciones.get(periodo, 0) + ingresos
+    contrataciones_labels = [p.strftime(formato) for p in sorted(contrataciones)]
+    contrataciones_values = [contrataciones[p] for p in sorted(contrataciones)]
+
+    # 3. Rango etario
+    rangos = histograma_edad(vigentes, hoy)
+
+    # 4. Nivel educacional
+    escolaridad_data = list(
+        vigentes.exclude(escolaridad__isnull=True).exclude(escolaridad='')
+        .values('escolaridad').annotate(total=Count('rut')).order_by('-total')
+    )
+
+    # 5. Nacionalidades
+    nacionalidad_data = list(
+        vigentes.exclude(nacionalidad__isnull=True).exclude(nacionalidad='')
+        .values('nacionalidad').annotate(total=Count('rut')).order_by('-total')[:8]
+    )
+
+    # 6. Comunas
+    comuna_data = list(
+        vigentes.exclude(comuna__isnull=True).exclude(comuna='')
+        .values('comuna').annotate(total=Count('rut')).order_by('-total')[:12]
+    )
+
+    # 7. Género
+    sexo_data = list(
+        vigentes.exclude(sexo__isnull=True).exclude(sexo='')
+        .values('sexo').annotate(total=Count('rut')).order_by('-total')
+    )
+
+    # 8. Permanencia
+    rangos_perm = histograma_permanencia(vigentes, hoy)
+
+    # 9. Tipo contrato
+    planta_data = list(
+        vigentes.exclude(tipo_contrato__isnull=True).exclude(tipo_contrato='')
+        .values('tipo_contrato').annotate(total=Count('rut')).order_by('-total')
+    )
+
+    return {
+        'kpi_vigentes'    : total_vigentes,
+        'kpi_historico'   : total_historico,
+        'kpi_sin_contacto': sin_contacto,
+        'granularidad'    : granularidad,
+        'dotacion'        : {'labels': dotacion_labels,        'values': dotacion_values},
+        'contrataciones'  : {'labels': contrataciones_labels,  'values': contrataciones_values},
+        'edad'            : {'labels': list(rangos.keys()),     'values': list(rangos.values())},
+        'escolaridad'     : {'labels': [d['escolaridad']   for d in escolaridad_data],  'values': [d['total'] for d in escolaridad_data]},
+        'nacionalidad'    : {'labels': [d['nacionalidad']  for d in nacionalidad_data], 'values': [d['total'] for d in nacionalidad_data]},
+        'comuna'          : {'labels': [d['comuna']        for d in comuna_data],       'values': [d['total'] for d in comuna_data]},
+        'sexo'            : {'labels': [d['sexo']          for d in sexo_data],         'values': [d['total'] for d in sexo_data]},
+        'permanencia'     : {'labels': list(rangos_perm.keys()), 'values': list(rangos_perm.values())},
+        'tipo_contrato'   : {'labels': [d['tipo_contrato'] for d in planta_data],       'values': [d['total'] for d in planta_data]},
+    }
+
+
+# ─────────────────────────────────────────────
+# Snapshots en caché
+# ─────────────────────────────────────────────
+
+CLAVE_VERSION = 'dotacion:kpis:version'
+
+
+def _cache():
+    return caches['kpis']
+
+
+def version_datos():
+    """Versión actual de los datos de dotación (se crea si el caché no la tiene)."""
+    cache = _cache()
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Arranca en un valor nuevo: si la clave fue desalojada no se reusan snapshots viejos
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def invalidar_kpis():
+    """Incrementa la versión de los datos: los snapshots existentes dejan de usarse."""
+    try:
+        _cache().incr(CLAVE_VERSION)
+    except ValueError:              # la clave no existe todavía
+        version_datos()
+    except DatabaseError:
+        pass
+
+
+def invalidar_kpis_al_confirmar():
+    """invalidar_kpis una vez confirmada la transacción en curso (o de inmediato si no hay)."""
+    transaction.on_commit(invalidar_kpis)
+
+
+def clave_snapshot(version, inicio, fin, granularidad, hoy):
+    # `hoy` entra en la clave: edad y permanencia se miden contra la fecha actual
+    return f"dotacion:kpis:{version}:{inicio:%Y%m%d}:{fin:%Y%m%d}:{granularidad}:{hoy:%Y%m%d}"
+
+
+def obtener_kpis(inicio, fin, granularidad='semana'):
+    """calcular_kpis desde el snapshot en caché, calculándolo si no existe."""
+    hoy = date.today()
+    try:
+        cache = _cache()
+        clave = clave_snapshot(version_datos(), inicio, fin, granularidad, hoy)
+        datos = cache.get(clave)
+    except DatabaseError:           # tabla de caché sin crear: se calcula sin snapshot
+        return calcular_kpis(inicio, fin, granularidad, hoy)
+
+    if datos is None:
+        datos = calcular_kpis(inicio, fin, granularidad, hoy)
+        cache.set(clave, datos)
+    return datos
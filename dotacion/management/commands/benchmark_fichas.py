@@ -0,0 +1,96 @@
+import io
+import random
+import time
+from datetime import date, timedelta
+
+import openpyxl
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dotacion.models import Colaborador
+from dotacion.services import BATCH_SIZE, _leer_fichas, abrir_reporte_fichas, procesar_fichas
+
+
+HEADERS = [
+    'RUT', 'CÓDIGO FICHA', 'NOMBRES', 'PRIMER APELLIDO', 'SEGUNDO APELLIDO',
+    'CARGO', 'CENTRO COSTO', 'ÁREA', 'SECCIÓN', 'TURNO', 'TIPO CONTRATO',
+    'ESTADO FICHA', 'ESTADO CIVIL', 'FECHA INGRESO', 'FECHA TÉRMINO CONTRATO',
+    'FECHA NACIMIENTO', 'SEXO', 'NACIONALIDAD', 'COMUNA', 'CIUDAD',
+    'DIRECCIÓN', 'ESCOLARIDAD', 'EMAIL', 'TELÉFONO', 'ESTADO RECOMENDABLE',
+]
+
+
+def generar_reporte_fichas(n_filas, seed=0):
+    """Arma en memoria un Reporte de Fichas sintético con el layout de GREX."""
+    rnd = random.Random(seed)
+    wb  = openpyxl.Workbook(write_only=True)
+    ws  = wb.create_sheet()
+
+    for _ in range(9):
+        ws.append(['Reporte de Fichas'])
+    ws.append(HEADERS)
+
+    base = date(2015, 1, 1)
+    for i in range(n_filas):
+        ingreso = base + timedelta(days=rnd.randint(0, 3500))
+        ws.append([
+            f"{10_000_000 + i}-{rnd.randint(0, 9)}", str(i),
+            f"NOMBRE{i}", 'PEREZ', 'SOTO',
+            rnd.choice(['OPERARIO', 'SUPERVISOR', 'ADMINISTRATIVO']),
+            rnd.choice(['CC01', 'CC02', 'CC03']),
+            rnd.choice(['PRODUCCION', 'CALIDAD', 'BODEGA']),
+            'LINEA 1', rnd.choice(['TURNO 1', 'TURNO 2', 'TURNO NOCHE']),
+            rnd.choice(['PLANTA', 'PLAZO FIJO', 'TEMPORADA']),
+            rnd.choice(['Vigente', 'Finiquitado']), 'SOLTERO',
+            ingreso.strftime('%d-%m-%Y'), '',
+            (ingreso - timedelta(days=365 * rnd.randint(18, 60))).strftime('%d-%m-%Y'),
+            rnd.choice(['MASCULINO', 'FEMENINO']), 'CHILENA', 'CURICO', 'CURICO',
+            'CALLE 123', 'MEDIA COMPLETA', f"p{i}@mail.cl", '912345678', '',
+        ])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _procesar_fila_a_fila(archivo_file):
+    """Ruta anterior: un update_or_create por fila (referencia del benchmark)."""
+    with abrir_reporte_fichas(archivo_file) as tabla, transaction.atomic():
+        for _, rut, defaults in _leer_fichas(tabla):
+            if rut:
+                Colaborador.objects.update_or_create(rut=rut, defaults=defaults)
+
+
+class Command(BaseCommand):
+    help = 'Mide filas/seg de procesar_fichas (fila a fila vs. por lotes). No deja datos en la BD.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def _medir(self, etiqueta, fn, contenido, n):
+        resultados = []
+        with transaction.atomic():
+            for pasada in ('inserción', 'actualización'):
+                t0 = time.perf_counter()
+                fn(io.BytesIO(contenido))
+                dt = time.perf_counter() - t0
+                resultados.append(dt)
+                self.stdout.write(f"  {etiqueta:<12} {pasada:<14} {dt:8.2f}s  {n / dt:10.0f} filas/s")
+            transaction.set_rollback(True)
+        return resultados
+
+    def handle(self, *args, **opts):
+        n          = opts['filas']
+        batch_size = opts['batch_size']
+
+        self.stdout.write(f"Generando Reporte de Fichas sintético ({n} filas)...")
+        contenido = generar_reporte_fichas(n)
+
+        antes   = self._medir('fila a fila', _procesar_fila_a_fila, contenido, n)
+        despues = self._medir(
+            'por lotes', lambda f: procesar_fichas(f, batch_size=batch_size), contenido, n
+        )
+
+        for pasada, a, d in zip(('inserción', 'actualización'), antes, despues):
+            self.stdout.write(self.style.SUCCESS(f"Speedup {pasada}: x{a / d:.1f}"))
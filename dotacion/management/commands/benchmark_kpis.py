@@ -0,0 +1,91 @@
+import random
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from dotacion.kpis import GRANULARIDADES, puntos_de_corte
+
+
+def _dotacion_activa_bucle(fichas, puntos):
+    """Cálculo anterior de api_kpis: un sum() sobre todas las fichas por punto."""
+    return [
+        sum(
+            1 for ingreso, termino in fichas
+            if ingreso <= punto and (termino is None or termino >= punto)
+        )
+        for punto in puntos
+    ]
+
+
+def _dotacion_activa_searchsorted(ingresos, terminos, puntos):
+    """
+    Personas activas en cada fecha de `puntos`, con dos búsquedas binarias:
+    activos(t) = #(ingreso <= t) - #(término < t) (criterio de DotacionDiaria).
+
+    ingresos / terminos: secuencias paralelas de fechas (termino puede ser None).
+    """
+    if not puntos:
+        return []
+
+    # Se trabaja con ordinales (int64): convertir date -> datetime64 es mucho más lento
+    SIN_TERMINO = date.max.toordinal() + 1
+    n        = len(ingresos)
+    ingresos = np.fromiter((d.toordinal() for d in ingresos), dtype=np.int64, count=n)
+    terminos = np.fromiter(
+        (t.toordinal() if t is not None else SIN_TERMINO for t in terminos), dtype=np.int64, count=n
+    )
+    puntos   = np.fromiter((p.toordinal() for p in puntos), dtype=np.int64, count=len(puntos))
+
+    # Un término anterior al ingreso nunca cuenta como activo: se descarta la ficha
+    validas  = terminos >= ingresos
+    ingresos = np.sort(ingresos[validas])
+    terminos = terminos[validas]
+    terminos = np.sort(terminos[terminos != SIN_TERMINO])
+
+    activos = (
+        np.searchsorted(ingresos, puntos, side='right')
+        - np.searchsorted(terminos, puntos, side='left')
+    )
+    return activos.tolist()
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark de la curva de dotación activa (bucle anterior vs. searchsorted). No usa la BD.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fichas', type=int, default=20_000)
+        parser.add_argument('--anios', type=int, default=5)
+        parser.add_argument('--granularidad', choices=GRANULARIDADES, default='semana')
+
+    def handle(self, *args, **opts):
+        rnd    = random.Random(0)
+        fin    = date.today()
+        inicio = fin - timedelta(days=365 * opts['anios'])
+
+        fichas = []
+        for _ in range(opts['fichas']):
+            ingreso = inicio - timedelta(days=365) + timedelta(days=rnd.randint(0, 365 * (opts['anios'] + 1)))
+            termino = ingreso + timedelta(days=rnd.randint(30, 1500)) if rnd.random() < 0.6 else None
+            fichas.append((ingreso, termino))
+
+        puntos = puntos_de_corte(inicio, fin, opts['granularidad'])
+        self.stdout.write(f"{len(fichas)} fichas × {len(puntos)} puntos ({opts['granularidad']})")
+
+        t0 = time.perf_counter()
+        antes = _dotacion_activa_bucle(fichas, puntos)
+        t_antes = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        ingresos, terminos = zip(*fichas)
+        despues = _dotacion_activa_searchsorted(ingresos, terminos, puntos)
+        t_despues = time.perf_counter() - t0
+
+        if antes != despues:
+            self.stderr.write(self.style.ERROR('❌ Los resultados no coinciden'))
+            return
+
+        self.stdout.write(f"  bucle         {t_antes * 1000:10.1f} ms")
+        self.stdout.write(f"  searchsorted  {t_despues * 1000:10.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: x{t_antes / t_despues:.0f} (resultados idénticos)"))
@@ -0,0 +1,32 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from dotacion.kpis import GRANULARIDADES, obtener_kpis
+
+
+class Command(BaseCommand):
+    help = 'Deja en caché los KPIs de dotación de los rangos más usados (año en curso y últimos 30 días).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--granularidad', choices=GRANULARIDADES, action='append',
+            help='Granularidades a precalcular (repetible). Por defecto: todas.',
+        )
+
+    def handle(self, *args, **opts):
+        hoy    = date.today()
+        rangos = {
+            'año en curso'   : (date(hoy.year, 1, 1), hoy),
+            'últimos 30 días': (hoy - timedelta(days=30), hoy),
+        }
+
+        for nombre, (inicio, fin) in rangos.items():
+            for granularidad in opts['granularidad'] or GRANULARIDADES:
+                t0 = time.perf_counter()
+                obtener_kpis(inicio, fin, granularidad)
+                self.stdout.write(
+                    f"  {nombre:<16} {granularidad:<7} {time.perf_counter() - t0:6.2f}s"
+                )
+        self.stdout.write(self.style.SUCCESS('Snapshots de KPIs listos.'))
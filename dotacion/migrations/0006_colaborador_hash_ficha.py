@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dotacion', '0005_personabloqueada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='colaborador',
+            name='hash_ficha',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True),
+        ),
+    ]
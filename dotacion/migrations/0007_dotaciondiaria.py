@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dotacion', '0006_colaborador_hash_ficha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DotacionDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('area', models.CharField(blank=True, default='', max_length=100)),
+                ('centro_costo', models.CharField(blank=True, default='', max_length=100)),
+                ('tipo_contrato', models.CharField(blank=True, default='', max_length=50)),
+                ('vigentes', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.PositiveIntegerField(default=0)),
+                ('finiquitos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Dotación Diaria',
+                'verbose_name_plural': 'Dotación Diaria',
+                'unique_together': {('fecha', 'area', 'centro_costo', 'tipo_contrato')},
+            },
+        ),
+    ]
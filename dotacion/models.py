@@ -1,3 +1,4 @@
+import hashlib
 from django.db import models
 from datetime import date
 from django.contrib.auth.models import User
@@ -10,6 +11,15 @@ class Colaborador(models.Model):
         ('BLOQUEADO',   'Bloqueado'),
     ]
 
+    # Campos que vienen del Reporte de Fichas de GREX (base del hash_ficha)
+    CAMPOS_FICHA = [
+        'nombre_completo', 'codigo_ficha', 'cargo', 'centro_costo', 'area',
+        'seccion', 'turno', 'tipo_contrato', 'estado_ficha', 'estado_civil',
+        'fecha_ingreso', 'fecha_termino_contrato', 'fecha_nacimiento', 'sexo',
+        'nacionalidad', 'comuna', 'ciudad', 'direccion', 'escolaridad', 'email',
+        'telefono', 'es_recomendable', 'estado',
+    ]
+
     # Identificación
     rut             = models.CharField(max_length=20, primary_key=True, unique=True, verbose_name="RUT")
     nombre_completo = models.CharField(max_length=255)
@@ -50,6 +60,9 @@ class Colaborador(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Huella de los CAMPOS_FICHA: la importación solo reescribe si cambia
+    hash_ficha = models.CharField(max_length=40, null=True, blank=True, editable=False)
+
     # ── Compatibilidad con código existente ──────────────
     @property
     def activo(self):
@@ -70,6 +83,20 @@ class Colaborador(models.Model):
         delta = (fin.year - self.fecha_ingreso.year) * 12 + (fin.month - self.fecha_ingreso.month)
         return max(delta, 0)
 
+    @staticmethod
+    def normalizar_valor_ficha(valor):
+        return '' if valor is None else str(valor)
+
+    def calcular_hash_ficha(self):
+        partes = [self.normalizar_valor_ficha(getattr(self, c)) for c in self.CAMPOS_FICHA]
+        return hashlib.sha1('\x1f'.join(partes).encode('utf-8')).hexdigest()
+
+    def save(self, *args, **kwargs):
+        self.hash_ficha = self.calcular_hash_ficha()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'hash_ficha'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.nombre_completo} ({self.rut})"
 
@@ -137,4 +164,27 @@ class PersonaBloqueada(models.Model):
     class Meta:
         ordering            = ['-fecha_bloqueo']
         verbose_name        = "Persona Bloqueada"
-        verbose_name_plural = "Lista de Bloqueados"
\ No newline at end of file
+        verbose_name_plural = "Lista de Bloqueados"
+
+class DotacionDiaria(models.Model):
+    """
+    Tabla de hechos: una fila por día × área × centro de costo × tipo de
+    contrato. La mantiene dotacion.dotacion_diaria; no se edita a mano.
+    Solo se guardan las combinaciones con algún conteo distinto de cero.
+    """
+    fecha         = models.DateField()
+    area          = models.CharField(max_length=100, blank=True, default='')
+    centro_costo  = models.CharField(max_length=100, blank=True, default='')
+    tipo_contrato = models.CharField(max_length=50,  blank=True, default='')
+
+    vigentes      = models.PositiveIntegerField(default=0)   # ingreso <= fecha <= término
+    ingresos      = models.PositiveIntegerField(default=0)   # fecha_ingreso == fecha
+    finiquitos    = models.PositiveIntegerField(default=0)   # fecha_termino_contrato == fecha
+
+    def __str__(self):
+        return f"{self.fecha} | {self.area} | {self.centro_costo} | {self.tipo_contrato}: {self.vigentes}"
+
+    class Meta:
+        unique_together     = [('fecha', 'area', 'centro_costo', 'tipo_contrato')]
+        verbose_name        = "Dotación Diaria"
+        verbose_name_plural = "Dotación Diaria"
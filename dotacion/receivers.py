@@ -2,7 +2,11 @@
 Receptores internos de dotación.
 Las apps externas deben conectarse en su propio apps.py.
 """
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from .dotacion_diaria import CAMPOS_DOTACION, afectados, marcar_afectados
+from .kpis import invalidar_kpis_al_confirmar
+from .models import Colaborador, HistorialEstado
 from .signals import (
     colaborador_bloqueado,
     colaborador_desbloqueado,
@@ -27,4 +31,43 @@ def log_desbloqueo(sender, colaborador, motivo, cambiado_por, **kwargs):
 
 @receiver(colaborador_finiquitado)
 def log_finiquito(sender, colaborador, motivo, cambiado_por, **kwargs):
-    pass
\ No newline at end of file
+    pass
+
+
+@receiver([post_save, post_delete], sender=Colaborador)
+@receiver([post_save, post_delete], sender=HistorialEstado)
+def invalidar_snapshots_kpis(sender, **kwargs):
+    """Cambios de fichas o de estado dejan obsoletos los KPIs en caché."""
+    invalidar_kpis_al_confirmar()
+
+
+@receiver(pre_save, sender=Colaborador)
+def recordar_dotacion_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda grupo e ingreso previos: si cambian, también hay que recalcular el grupo anterior."""
+    if raw:
+        return
+    instance._dotacion_anterior = (
+        Colaborador.objects.filter(pk=instance.pk).values(*CAMPOS_DOTACION).first()
+    )
+
+
+@receiver(post_save, sender=Colaborador)
+def actualizar_dotacion_diaria(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    nuevos = {c: getattr(instance, c) for c in CAMPOS_DOTACION}
+    marcar_afectados(afectados(nuevos, getattr(instance, '_dotacion_anterior', None)))
+
+
+@receiver(post_delete, sender=Colaborador)
+def quitar_de_dotacion_diaria(sender, instance, **kwargs):
+    marcar_afectados(afectados({c: getattr(instance, c) for c in CAMPOS_DOTACION}))
+
+
+@receiver(post_save, sender=HistorialEstado)
+def dotacion_diaria_por_cambio_estado(sender, instance, created, raw=False, **kwargs):
+    """Un cambio de estado suele venir con fecha de término: se recalcula el grupo."""
+    if raw or not created:
+        return
+    colaborador = instance.colaborador
+    marcar_afectados(afectados({c: getattr(colaborador, c) for c in CAMPOS_DOTACION}))
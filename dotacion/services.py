@@ -5,12 +5,20 @@ Estructura del archivo:
 - Filas 0-8: Metadata y encabezados del reporte (se ignoran)
 - Fila 9  : Headers de columnas (RUT, NOMBRES, ÁREA, etc.)
 - Fila 10+: Datos de colaboradores
+El encabezado se ubica solo (primera fila con RUT, NOMBRES y PRIMER
+APELLIDO), así que también se acepta el reporte exportado a CSV.
 """
-import openpyxl
-from datetime import datetime, date
-from django.db import transaction
+from django.db import connection, transaction
+from django.utils import timezone
 
+from core.bulk import upsert_con_copy, usa_copy
+from core.lectores import EncabezadoNoEncontrado, abrir_tabla
+from core.parsing import limpiar_rut, parse_fecha
+
+from .dotacion_diaria import CAMPOS_DOTACION, afectados, marcar_afectados
+from .kpis import invalidar_kpis_al_confirmar
 from .models import Colaborador
+from .signals import colaborador_creado, colaborador_actualizado
 
 
 # ─────────────────────────────────────────────
@@ -23,143 +31,318 @@ def _limpiar_str(valor):
     return str(valor).strip()
 
 
-def _limpiar_rut(rut_raw):
-    if not rut_raw:
-        return None
-    rut = str(rut_raw).replace('.', '').strip().upper()
-    return rut if rut not in ('', 'NONE', 'NAN') else None
+# ─────────────────────────────────────────────
+# Escritura por lotes
+# ─────────────────────────────────────────────
+
+BATCH_SIZE = 1000
+BATCH_SIZE_COPY = 10_000     # Postgres (COPY)
+
+CAMPOS_FICHA = Colaborador.CAMPOS_FICHA
+
 
+def _hashes_existentes(ruts, batch_size):
+    """
+    {rut: hash_ficha} de los RUTs que ya existen, con un SELECT por lote
+    (evita el límite de parámetros de SQLite).
+    """
+    ruts   = list(ruts)
+    hashes = {}
+    for i in range(0, len(ruts), batch_size):
+        hashes.update(
+            Colaborador.objects
+            .filter(rut__in=ruts[i:i + batch_size])
+            .values_list('rut', 'hash_ficha')
+        )
+    return hashes
+
+
+def _campos_modificados(ruts, nuevos_valores):
+    """
+    Compara contra la BD. Devuelve ({rut: [campos que cambian]},
+    {rut: valores previos}).
+    """
+    normalizar = Colaborador.normalizar_valor_ficha
+    cambios    = {}
+    previos    = {}
+    for previo in Colaborador.objects.filter(rut__in=list(ruts)).values('rut', *CAMPOS_FICHA):
+        nuevo = nuevos_valores[previo['rut']]
+        cambios[previo['rut']] = [
+            c for c in CAMPOS_FICHA
+            if normalizar(previo[c]) != normalizar(nuevo[c])
+        ]
+        previos[previo['rut']] = previo
+    return cambios, previos
+
+
+def _guardar_lote(objs, existentes, batch_size):
+    """
+    Escribe un lote de instancias Colaborador (con hash_ficha ya calculado).
 
-def _parse_fecha(valor):
-    if not valor:
-        return None
-    if isinstance(valor, (date, datetime)):
-        return valor.date() if isinstance(valor, datetime) else valor
-    s = str(valor).strip()
-    if s in ('', '00-00-0000', '00/00/0000', 'None', 'nan'):
-        return None
-    for fmt in ('%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d'):
+    En Postgres va por COPY a una tabla temporal + INSERT ... ON CONFLICT;
+    con otro backend con ON CONFLICT, un único upsert del ORM; si no, se
+    separan nuevos (bulk_create) y existentes (bulk_update).
+    """
+    campos = CAMPOS_FICHA + ['hash_ficha', 'updated_at']
+
+    if usa_copy():
+        upsert_con_copy(objs, ['rut'], campos)
+        return
+
+    if connection.features.supports_update_conflicts_with_target:
+        Colaborador.objects.bulk_create(
+            objs,
+            batch_size       = batch_size,
+            update_conflicts = True,
+            unique_fields    = ['rut'],
+            update_fields    = campos,
+        )
+        return
+
+    nuevos     = [o for o in objs if o.rut not in existentes]
+    actualizar = [o for o in objs if o.rut in existentes]
+    Colaborador.objects.bulk_create(nuevos, batch_size=batch_size)
+    for o in actualizar:
+        o.updated_at = timezone.now()
+    Colaborador.objects.bulk_update(actualizar, campos, batch_size=batch_size)
+
+
+def _guardar_lote_por_fila(lote, errores):
+    """
+    Fallback cuando el lote completo falla: se reintenta fila a fila para
+    aislar las que tienen error. Devuelve el set de RUTs que fallaron.
+    """
+    fallidos = set()
+    for rut, (row_num, defaults) in lote.items():
         try:
-            return datetime.strptime(s, fmt).date()
-        except ValueError:
+            with transaction.atomic():
+                Colaborador.objects.update_or_create(rut=rut, defaults=defaults)
+        except Exception as e:
+            errores.append(f"Fila {row_num}: {rut} → {str(e)}")
+            fallidos.add(rut)
+    return fallidos
+
+
+def _acumular_grupos(destino, grupos):
+    """Une {grupo: desde} de DotacionDiaria quedándose con la fecha más antigua."""
+    for g, desde in grupos.items():
+        destino[g] = min(destino.get(g, desde), desde)
+
+
+def _emitir_senales(creados_objs, actualizados_objs):
+    for obj in creados_objs:
+        colaborador_creado.send(sender=Colaborador, colaborador=obj)
+    for obj, campos in actualizados_objs:
+        colaborador_actualizado.send(
+            sender=Colaborador, colaborador=obj, campos_modificados=campos
+        )
+
+
+# ─────────────────────────────────────────────
+# Lectura del archivo
+# ─────────────────────────────────────────────
+
+COLUMNAS_OBLIGATORIAS = ['RUT', 'NOMBRES', 'PRIMER APELLIDO']
+
+COLUMNAS_FICHAS = COLUMNAS_OBLIGATORIAS + [
+    'SEGUNDO APELLIDO', 'ESTADO FICHA', 'ESTADO RECOMENDABLE', 'CÓDIGO FICHA',
+    'CARGO', 'CENTRO COSTO', 'ÁREA', 'SECCIÓN', 'TURNO', 'TIPO CONTRATO',
+    'ESTADO CIVIL', 'FECHA INGRESO', 'FECHA TÉRMINO CONTRATO', 'FECHA NACIMIENTO',
+    'SEXO', 'NACIONALIDAD', 'COMUNA', 'CIUDAD', 'DIRECCIÓN', 'ESCOLARIDAD',
+    'EMAIL', 'TELÉFONO',
+]
+
+
+def abrir_reporte_fichas(archivo_file):
+    """Tabla del Reporte de Fichas (core.lectores), con el encabezado ya ubicado."""
+    try:
+        return abrir_tabla(archivo_file, requeridas=COLUMNAS_OBLIGATORIAS)
+    except EncabezadoNoEncontrado as e:
+        raise ValueError(
+            f"El archivo no tiene la columna obligatoria '{e.faltantes[0]}'. "
+            "Verifica que sea el Reporte de Fichas correcto."
+        )
+
+
+def _leer_fichas(tabla):
+    """
+    Recorre el reporte y entrega (row_num, rut, defaults) por cada fila con RUT.
+    Las filas sin RUT se entregan como (row_num, None, None).
+    """
+    for row_num, valores in tabla.filas(COLUMNAS_FICHAS):
+        col = dict(zip(COLUMNAS_FICHAS, valores)).get
+        rut = limpiar_rut(col('RUT'))
+
+        if not rut:
+            yield row_num, None, None
             continue
-    return None
+
+        nombres  = _limpiar_str(col('NOMBRES'))
+        paterno  = _limpiar_str(col('PRIMER APELLIDO'))
+        materno  = _limpiar_str(col('SEGUNDO APELLIDO'))
+        nombre_completo = f"{nombres} {paterno} {materno}".strip()
+
+        estado_ficha = _limpiar_str(col('ESTADO FICHA'))
+        estado_lower = estado_ficha.lower()
+        if estado_lower == 'vigente':
+            estado = 'VIGENTE'
+        elif estado_lower in ('finiquitado', 'finiquito'):
+            estado = 'FINIQUITADO'
+        else:
+            estado = 'FINIQUITADO'   # cualquier otro estado de GREX = inactivo
+
+        estado_rec = _limpiar_str(col('ESTADO RECOMENDABLE')).upper()
+        es_recomendable = estado_rec != 'NO RECOMENDABLE'
+
+        codigo_ficha = col('CÓDIGO FICHA')
+
+        defaults = {
+            'nombre_completo'       : nombre_completo,
+            'codigo_ficha'          : str(codigo_ficha) if codigo_ficha is not None else None,
+            'cargo'                 : _limpiar_str(col('CARGO')) or None,
+            'centro_costo'          : _limpiar_str(col('CENTRO COSTO')) or None,
+            'area'                  : _limpiar_str(col('ÁREA')) or None,
+            'seccion'               : _limpiar_str(col('SECCIÓN')) or None,
+            'turno'                 : _limpiar_str(col('TURNO')) or None,
+            'tipo_contrato'         : _limpiar_str(col('TIPO CONTRATO')) or None,
+            'estado_ficha'          : estado_ficha or None,
+            'estado_civil'          : _limpiar_str(col('ESTADO CIVIL')) or None,
+            'fecha_ingreso'         : parse_fecha(col('FECHA INGRESO')),
+            'fecha_termino_contrato': parse_fecha(col('FECHA TÉRMINO CONTRATO')),
+            'fecha_nacimiento'      : parse_fecha(col('FECHA NACIMIENTO')),
+            'sexo'                  : _limpiar_str(col('SEXO')) or None,
+            'nacionalidad'          : _limpiar_str(col('NACIONALIDAD')) or None,
+            'comuna'                : _limpiar_str(col('COMUNA')) or None,
+            'ciudad'                : _limpiar_str(col('CIUDAD')) or None,
+            'direccion'             : _limpiar_str(col('DIRECCIÓN')) or None,
+            'escolaridad'           : _limpiar_str(col('ESCOLARIDAD')) or None,
+            'email'                 : _limpiar_str(col('EMAIL')) or None,
+            'telefono'              : _limpiar_str(col('TELÉFONO')) or None,
+            'es_recomendable'       : es_recomendable,
+            'estado'                : estado,
+        }
+        yield row_num, rut, defaults
 
 
 # ─────────────────────────────────────────────
 # Función principal
 # ─────────────────────────────────────────────
 
-def procesar_fichas(archivo_file):
+def procesar_fichas(archivo_file, batch_size=None):
     """
     Lee el Reporte de Fichas y hace upsert en Colaborador.
 
+    Las filas se acumulan en memoria (una por RUT, gana la última) y se
+    escriben por lotes de `batch_size` (BATCH_SIZE, o BATCH_SIZE_COPY en
+    Postgres): un SELECT para saber qué RUTs ya existen y un upsert masivo
+    por lote, en vez de dos queries por fila.
+
+    Solo se escriben los colaboradores nuevos o cuyo hash_ficha cambió; al
+    confirmar la transacción se emiten colaborador_creado y
+    colaborador_actualizado (con los campos_modificados reales).
+
     Returns:
-        dict con claves: creados, actualizados, omitidos, errores (lista)
+        dict con claves: creados, actualizados, sin_cambios, omitidos,
+        errores (lista)
     """
-    wb = openpyxl.load_workbook(archivo_file, read_only=True, data_only=True)
-    ws = wb.active
-
-    HEADER_ROW = 10
-    DATA_START  = 11
-
-    # Mapear headers por nombre
-    headers = {}
-    for col_idx, cell in enumerate(ws[HEADER_ROW], start=1):
-        val = _limpiar_str(cell.value).upper()
-        if val:
-            headers[val] = col_idx
-
-    # Verificación mínima
-    for campo in ['RUT', 'NOMBRES', 'PRIMER APELLIDO']:
-        if campo not in headers:
-            raise ValueError(
-                f"El archivo no tiene la columna obligatoria '{campo}'. "
-                "Verifica que sea el Reporte de Fichas correcto."
-            )
-
-    def col(row, nombre):
-        idx = headers.get(nombre)
-        if idx is None:
-            return None
-        return row[idx - 1].value
+    batch_size = batch_size or (BATCH_SIZE_COPY if usa_copy() else BATCH_SIZE)
+    tabla = abrir_reporte_fichas(archivo_file)
 
     creados     = 0
     actualizados = 0
+    sin_cambios = 0
     omitidos    = 0
     errores     = []
 
-    with transaction.atomic():
-        for row_num, row in enumerate(
-            ws.iter_rows(min_row=DATA_START, values_only=False), start=DATA_START
-        ):
-            rut = _limpiar_rut(row[headers['RUT'] - 1].value)
-
+    fichas     = {}
+    repeticiones = {}
+    try:
+        for row_num, rut, defaults in _leer_fichas(tabla):
             if not rut:
                 omitidos += 1
                 continue
+            fichas[rut]       = (row_num, defaults)
+            repeticiones[rut] = repeticiones.get(rut, 0) + 1
+    finally:
+        tabla.close()
 
-            nombres  = _limpiar_str(col(row, 'NOMBRES'))
-            paterno  = _limpiar_str(col(row, 'PRIMER APELLIDO'))
-            materno  = _limpiar_str(col(row, 'SEGUNDO APELLIDO'))
-            nombre_completo = f"{nombres} {paterno} {materno}".strip()
+    creados_objs = []
+    actualizados_objs = []
+    grupos_dotacion = {}
 
-            estado_ficha = _limpiar_str(col(row, 'ESTADO FICHA'))
-            estado_lower = estado_ficha.lower()
-            if estado_lower == 'vigente':
-                estado = 'VIGENTE'
-            elif estado_lower in ('finiquitado', 'finiquito'):
-                estado = 'FINIQUITADO'
-            else:
-                estado = 'FINIQUITADO'   # cualquier otro estado de GREX = inactivo
+    ruts = list(fichas)
+    with transaction.atomic():
+        for i in range(0, len(ruts), batch_size):
+            lote    = {rut: fichas[rut] for rut in ruts[i:i + batch_size]}
+            previos = _hashes_existentes(lote.keys(), batch_size)
+
+            objs = {}
+            for rut, (_, defaults) in lote.items():
+                obj = Colaborador(rut=rut, **defaults)
+                obj.hash_ficha = obj.calcular_hash_ficha()
+                if rut in previos and previos[rut] == obj.hash_ficha:
+                    sin_cambios += repeticiones[rut]
+                    continue
+                objs[rut] = obj
 
-            estado_rec = _limpiar_str(col(row, 'ESTADO RECOMENDABLE')).upper()
-            es_recomendable = estado_rec != 'NO RECOMENDABLE'
+            modificados, anteriores = _campos_modificados(
+                [rut for rut in objs if rut in previos],
+                {rut: lote[rut][1] for rut in objs},
+            )
 
+            fallidos = set()
             try:
-                defaults = {
-                    'nombre_completo'       : nombre_completo,
-                    'codigo_ficha'          : col(row, 'CÓDIGO FICHA'),
-                    'cargo'                 : _limpiar_str(col(row, 'CARGO')) or None,
-                    'centro_costo'          : _limpiar_str(col(row, 'CENTRO COSTO')) or None,
-                    'area'                  : _limpiar_str(col(row, 'ÁREA')) or None,
-                    'seccion'               : _limpiar_str(col(row, 'SECCIÓN')) or None,
-                    'turno'                 : _limpiar_str(col(row, 'TURNO')) or None,
-                    'tipo_contrato'         : _limpiar_str(col(row, 'TIPO CONTRATO')) or None,
-                    'estado_ficha'          : estado_ficha or None,
-                    'estado_civil'          : _limpiar_str(col(row, 'ESTADO CIVIL')) or None,
-                    'fecha_ingreso'         : _parse_fecha(col(row, 'FECHA INGRESO')),
-                    'fecha_termino_contrato': _parse_fecha(col(row, 'FECHA TÉRMINO CONTRATO')),
-                    'fecha_nacimiento'      : _parse_fecha(col(row, 'FECHA NACIMIENTO')),
-                    'sexo'                  : _limpiar_str(col(row, 'SEXO')) or None,
-                    'nacionalidad'          : _limpiar_str(col(row, 'NACIONALIDAD')) or None,
-                    'comuna'                : _limpiar_str(col(row, 'COMUNA')) or None,
-                    'ciudad'                : _limpiar_str(col(row, 'CIUDAD')) or None,
-                    'direccion'             : _limpiar_str(col(row, 'DIRECCIÓN')) or None,
-                    'escolaridad'           : _limpiar_str(col(row, 'ESCOLARIDAD')) or None,
-                    'email'                 : _limpiar_str(col(row, 'EMAIL')) or None,
-                    'telefono'              : _limpiar_str(col(row, 'TELÉFONO')) or None,
-                    'es_recomendable'       : es_recomendable,
-                    'estado'     : estado,
-                    'estado_ficha': estado_ficha or None,
-                }
-                obj, created = Colaborador.objects.update_or_create(
-                    rut=rut,
-                    defaults=defaults,
+                with transaction.atomic():
+                    _guardar_lote(list(objs.values()), previos.keys(), batch_size)
+            except Exception:
+                fallidos = _guardar_lote_por_fila(
+                    {rut: lote[rut] for rut in objs}, errores
                 )
-                if created:
-                    creados += 1
-                else:
-                    actualizados += 1
 
-            except Exception as e:
-                errores.append(f"Fila {row_num}: {rut} → {str(e)}")
+            # Mismos conteos que el upsert fila a fila: un RUT repetido en
+            # el archivo cuenta como creado la primera vez y luego actualizado.
+            for rut, obj in objs.items():
+                if rut in fallidos:
+                    continue
+                n = repeticiones[rut]
+                if rut in previos:
+                    actualizados += n
+                    # hash_ficha nulo (fichas anteriores al hash): puede no haber cambios reales
+                    if modificados[rut]:
+                        actualizados_objs.append((obj, modificados[rut]))
+                    if set(CAMPOS_DOTACION).intersection(modificados[rut]):
+                        _acumular_grupos(grupos_dotacion, afectados(lote[rut][1], anteriores[rut]))
+                else:
+                    creados      += 1
+                    actualizados += n - 1
+                    creados_objs.append(obj)
+                    _acumular_grupos(grupos_dotacion, afectados(lote[rut][1]))
 
-    wb.close()
+        transaction.on_commit(
+            lambda: _emitir_senales(creados_objs, actualizados_objs)
+        )
+        # bulk_create no dispara post_save: se invalidan los KPIs y se agenda
+        # el recálculo de DotacionDiaria explícitamente
+        invalidar_kpis_al_confirmar()
+        marcar_afectados(grupos_dotacion)
 
     return {
         'creados'     : creados,
         'actualizados': actualizados,
+        'sin_cambios' : sin_cambios,
         'omitidos'    : omitidos,
         'errores'     : errores,
-    }
\ No newline at end of file
+    }
+
+
+def procesar_carga(carga):
+    """Punto de entrada de la cola (core.cargas) para cargas tipo DOTACION."""
+    with carga.archivo.open('rb') as archivo:
+        resultado = procesar_fichas(archivo)
+    resultado['mensaje'] = (
+        f"Nuevos: {resultado['creados']} | "
+        f"Actualizados: {resultado['actualizados']} | "
+        f"Sin cambios: {resultado['sin_cambios']} | "
+        f"Omitidos: {resultado['omitidos']}"
+    )
+    return resultado
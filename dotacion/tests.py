@@ -1,3 +1,370 @@
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from openpyxl import Workbook
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .dotacion_diaria import CAMPOS_DOTACION, afectados, marcar_afectados, recalcular
+from .kpis import (
+    GRANULARIDADES, RANGOS_EDAD, RANGOS_PERMANENCIA, calcular_kpis, histograma_edad, histograma_permanencia,
+    obtener_kpis, puntos_de_corte,
+)
+from .models import Colaborador, DotacionDiaria
+from .services import procesar_fichas
+from .signals import colaborador_actualizado
+
+
+HOY = date.today()
+
+
+def ficha(rut, ingreso, termino=None, area='PACKING', **campos):
+    return Colaborador.objects.create(
+        rut=rut, nombre_completo=f'PERSONA {rut}', area=area, centro_costo='CC1', tipo_contrato='PLANTA',
+        fecha_ingreso=ingreso, fecha_termino_contrato=termino, **campos,
+    )
+
+
+ENCABEZADO_FICHAS = [
+    'RUT', 'NOMBRES', 'PRIMER APELLIDO', 'SEGUNDO APELLIDO', 'ESTADO FICHA', 'CARGO', 'CENTRO COSTO',
+    'ÁREA', 'TURNO', 'TIPO CONTRATO', 'FECHA INGRESO', 'FECHA TÉRMINO CONTRATO', 'FECHA NACIMIENTO',
+]
+
+
+def reporte_fichas(filas):
+    """Reporte de Fichas en memoria: 9 filas de metadata, el encabezado y una fila por dict."""
+    libro = Workbook()
+    hoja  = libro.active
+    hoja.append(['REPORTE DE FICHAS'])
+    for _ in range(8):
+        hoja.append([])
+    hoja.append(ENCABEZADO_FICHAS)
+    for fila in filas:
+        valores = {'NOMBRES': 'ANA', 'PRIMER APELLIDO': 'SOTO', 'ESTADO FICHA': 'Vigente', 'ÁREA': 'PACKING', **fila}
+        hoja.append([valores.get(c) for c in ENCABEZADO_FICHAS])
+    archivo = BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+class ProcesarFichasTests(TestCase):
+
+    def test_upsert_por_lotes(self):
+        filas = [{'RUT': f'{n}.000.000-{n}', 'FECHA INGRESO': '01-03-2024'} for n in range(1, 6)]
+        filas += [
+            {'RUT': None},                                                   # sin RUT: omitida
+            {'RUT': '1000000-1', 'CARGO': 'OPERARIO', 'ESTADO FICHA': 'Finiquitado'},   # repetido: gana la última
+        ]
+        resultado = procesar_fichas(reporte_fichas(filas), batch_size=2)
+
+        self.assertEqual(
+            {k: resultado[k] for k in ('creados', 'actualizados', 'omitidos')},
+            {'creados': 5, 'actualizados': 1, 'omitidos': 1},
+        )
+        self.assertEqual(resultado['errores'], [])
+        repetido = Colaborador.objects.get(rut='1000000-1')
+        self.assertEqual((repetido.cargo, repetido.estado), ('OPERARIO', 'FINIQUITADO'))
+        self.assertEqual(Colaborador.objects.get(rut='2000000-2').fecha_ingreso, date(2024, 3, 1))
+
+    def test_actualiza_fichas_existentes(self):
+        Colaborador.objects.create(rut='1-9', nombre_completo='ANTIGUO', cargo='OPERARIO')
+        resultado = procesar_fichas(reporte_fichas([{'RUT': '1-9', 'CARGO': 'SUPERVISOR'}, {'RUT': '2-7'}]))
+        self.assertEqual((resultado['creados'], resultado['actualizados']), (1, 1))
+        self.assertEqual(
+            Colaborador.objects.values_list('nombre_completo', 'cargo').get(rut='1-9'), ('ANA SOTO', 'SUPERVISOR'),
+        )
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        def consultas(n, desde):
+            filas = [{'RUT': f'{i}-K'} for i in range(desde, desde + n)]
+            with CaptureQueriesContext(connection) as capturadas:
+                procesar_fichas(reporte_fichas(filas))
+            return len(capturadas)
+
+        # Pocas filas: SQLite parte el INSERT según su límite de parámetros
+        self.assertEqual(consultas(5, 0), consultas(30, 100))
+
+
+class DeteccionCambiosFichasTests(TestCase):
+
+    FILAS = [
+        {'RUT': '1-9', 'CARGO': 'OPERARIO', 'FECHA INGRESO': '01-03-2024'},
+        {'RUT': '2-7', 'CARGO': 'OPERARIO', 'FECHA INGRESO': '01-03-2024'},
+    ]
+
+    def setUp(self):
+        procesar_fichas(reporte_fichas(self.FILAS))
+        self.antes = timezone.make_aware(datetime(2024, 1, 1))
+        Colaborador.objects.update(updated_at=self.antes)
+        self.senales = []
+        colaborador_actualizado.connect(self._recibir)
+        self.addCleanup(colaborador_actualizado.disconnect, self._recibir)
+
+    def _recibir(self, sender, colaborador, campos_modificados, **kwargs):
+        self.senales.append((colaborador.rut, campos_modificados))
+
+    def test_fichas_sin_cambios_no_se_reescriben(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = procesar_fichas(reporte_fichas(self.FILAS))
+        self.assertEqual((resultado['actualizados'], resultado['sin_cambios']), (0, 2))
+        self.assertEqual(set(Colaborador.objects.values_list('updated_at', flat=True)), {self.antes})
+        self.assertEqual(self.senales, [])
+
+    def test_campos_modificados_reales(self):
+        filas = [self.FILAS[0], {**self.FILAS[1], 'CARGO': 'SUPERVISOR', 'TURNO': 'TURNO NOCHE'}]
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = procesar_fichas(reporte_fichas(filas))
+        self.assertEqual((resultado['actualizados'], resultado['sin_cambios']), (1, 1))
+        self.assertEqual(self.senales, [('2-7', ['cargo', 'turno'])])
+        self.assertEqual(Colaborador.objects.get(rut='1-9').updated_at, self.antes)
+        self.assertGreater(Colaborador.objects.get(rut='2-7').updated_at, self.antes)
+
+    def test_ficha_sin_hash_se_reescribe_sin_senal(self):
+        # Fichas de antes del hash: se escriben una vez, pero sin campos que avisar
+        Colaborador.objects.update(hash_ficha=None)
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = procesar_fichas(reporte_fichas(self.FILAS))
+        self.assertEqual(resultado['actualizados'], 2)
+        self.assertEqual(self.senales, [])
+        self.assertFalse(Colaborador.objects.filter(hash_ficha__isnull=True).exists())
+
+
+class HistogramasTests(TestCase):
+    """Los tramos en SQL dan lo mismo que agrupar Colaborador.edad / meses_permanencia en Python."""
+
+    def _esperado(self, valores, rangos, hasta_inclusive):
+        conteo = {}
+        for etiqueta, desde, hasta in rangos:
+            conteo[etiqueta] = sum(
+                1 for v in valores
+                if v is not None and (desde is None or v >= desde)
+                and (hasta is None or (v <= hasta if hasta_inclusive else v < hasta))
+            )
+        return conteo
+
+    def test_edad_en_los_bordes(self):
+        n = 0
+        for anios in (17, 18, 25, 26, 35, 36, 45, 46, 55, 56, 70):
+            try:
+                cumple = HOY.replace(year=HOY.year - anios)
+            except ValueError:                  # hoy es 29 de febrero
+                cumple = date(HOY.year - anios, 2, 28)
+            for corrimiento in (-1, 0, 1):      # cumple ayer, hoy o mañana
+                n += 1
+                ficha(f'{n}-E', HOY, fecha_nacimiento=cumple + timedelta(days=corrimiento))
+        ficha('0-E', HOY)                       # sin fecha de nacimiento
+
+        qs = Colaborador.objects.all()
+        self.assertEqual(
+            histograma_edad(qs, HOY),
+            self._esperado([c.edad for c in qs], RANGOS_EDAD, hasta_inclusive=True),
+        )
+
+    def test_permanencia_en_los_bordes(self):
+        n = 0
+        for meses in (0, 2, 3, 5, 6, 11, 12, 23, 24, 59, 60, 61):
+            indice = HOY.year * 12 + HOY.month - 1 - meses
+            inicio_mes = date(indice // 12, indice % 12 + 1, 1)
+            for dia in (inicio_mes, inicio_mes - timedelta(days=1), inicio_mes + timedelta(days=27)):
+                n += 1
+                ficha(f'{n}-P', dia, estado='VIGENTE')
+
+        qs = Colaborador.objects.all()
+        self.assertEqual(
+            histograma_permanencia(qs, HOY),
+            self._esperado([c.meses_permanencia for c in qs], RANGOS_PERMANENCIA, hasta_inclusive=False),
+        )
+
+    def test_un_query_por_histograma(self):
+        with self.assertNumQueries(2):
+            histograma_edad(Colaborador.objects.all(), HOY)
+            histograma_permanencia(Colaborador.objects.all(), HOY)
+
+
+class SnapshotKpisTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        ficha('1-9', HOY - timedelta(days=40))
+
+    def _obtener(self):
+        with mock.patch('dotacion.kpis.calcular_kpis', wraps=calcular_kpis) as calculo:
+            datos = obtener_kpis(HOY - timedelta(days=30), HOY, 'semana')
+        return datos, calculo.call_count
+
+    def test_segunda_lectura_sale_del_cache(self):
+        primera, calculos = self._obtener()
+        self.assertEqual(calculos, 1)
+        segunda, calculos = self._obtener()
+        self.assertEqual((segunda, calculos), (primera, 0))
+
+    def test_cambio_de_ficha_invalida(self):
+        antes, _ = self._obtener()
+        with self.captureOnCommitCallbacks(execute=True):
+            ficha('2-7', HOY - timedelta(days=10))
+        despues, calculos = self._obtener()
+        self.assertEqual(calculos, 1)
+        self.assertEqual(despues['kpi_vigentes'], antes['kpi_vigentes'] + 1)
+
+    def test_importacion_invalida(self):
+        self._obtener()
+        with self.captureOnCommitCallbacks(execute=True):
+            procesar_fichas(reporte_fichas([{'RUT': '3-5', 'FECHA INGRESO': '01-03-2024'}]))
+        self.assertEqual(self._obtener()[1], 1)
+
+
+def filas_dotacion():
+    return list(
+        DotacionDiaria.objects.order_by('fecha', 'area', 'centro_costo', 'tipo_contrato')
+        .values_list('fecha', 'area', 'centro_costo', 'tipo_contrato', 'vigentes', 'ingresos', 'finiquitos')
+    )
+
+
+class DotacionDiariaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # En TestCase los on_commit no corren: la tabla se arma a mano en cada test
+        ficha('1-9', HOY - timedelta(days=40))
+        ficha('2-7', HOY - timedelta(days=30), termino=HOY - timedelta(days=10))
+        ficha('3-5', HOY - timedelta(days=20), area='CAMPO')
+
+    def test_conteos(self):
+        recalcular()
+        packing = dict(
+            DotacionDiaria.objects.filter(area='PACKING').values_list('fecha', 'vigentes')
+        )
+        self.assertEqual(packing[HOY - timedelta(days=35)], 1)
+        self.assertEqual(packing[HOY - timedelta(days=10)], 2)     # el día del término aún cuenta
+        self.assertEqual(packing[HOY - timedelta(days=9)], 1)
+        self.assertEqual(max(packing), HOY)
+        self.assertEqual(
+            DotacionDiaria.objects.get(area='PACKING', fecha=HOY - timedelta(days=10)).finiquitos, 1,
+        )
+
+    def test_recalculo_por_grupo_igual_al_completo(self):
+        recalcular()
+        # La ficha 2-7 se cambia de área y de ingreso: se recalculan el grupo viejo y el nuevo
+        antes   = Colaborador.objects.filter(rut='2-7').values(*CAMPOS_DOTACION).get()
+        despues = {**antes, 'area': 'CAMPO', 'fecha_ingreso': HOY - timedelta(days=25)}
+        Colaborador.objects.filter(rut='2-7').update(area='CAMPO', fecha_ingreso=despues['fecha_ingreso'])
+
+        recalcular(afectados(despues, antes))
+        incremental = filas_dotacion()
+        recalcular()
+        self.assertEqual(incremental, filas_dotacion())
+
+    def test_guardar_ficha_recalcula_al_confirmar(self):
+        recalcular()
+        colaborador = Colaborador.objects.get(rut='3-5')
+        colaborador.area = 'PACKING'
+        with self.captureOnCommitCallbacks(execute=True):
+            colaborador.save()
+        incremental = filas_dotacion()
+        recalcular()
+        self.assertEqual(incremental, filas_dotacion())
+
+    def test_importacion_extiende_hasta_hoy(self):
+        recalcular(hasta=HOY - timedelta(days=5))
+        with self.captureOnCommitCallbacks(execute=True):
+            marcar_afectados({('CAMPO', 'CC1', 'PLANTA'): HOY - timedelta(days=20)})
+        self.assertEqual(
+            set(DotacionDiaria.objects.filter(fecha=HOY).values_list('area', flat=True)), {'PACKING', 'CAMPO'},
+        )
+
+    def test_extender_con_tabla_vacia_hace_el_backfill(self):
+        call_command('reconstruir_dotacion_diaria', '--extender', stdout=StringIO())
+        extendida = filas_dotacion()
+        recalcular()
+        self.assertTrue(extendida)
+        self.assertEqual(extendida, filas_dotacion())
+
+    def test_extender_nocturno(self):
+        recalcular(hasta=HOY - timedelta(days=5))
+        call_command('reconstruir_dotacion_diaria', '--extender', stdout=StringIO())
+        extendida = filas_dotacion()
+        recalcular()
+        self.assertEqual(extendida, filas_dotacion())
+
+
+class CalcularKpisTests(TestCase):
+
+    def _fichas(self):
+        ficha('1-9', HOY - timedelta(days=40))
+        ficha('2-7', HOY - timedelta(days=3))
+
+    def test_lectura_no_escribe(self):
+        self._fichas()
+        # Tabla vacía: la request no la reconstruye
+        with CaptureQueriesContext(connection) as consultas:
+            calcular_kpis(HOY - timedelta(days=60), HOY, 'dia', hoy=HOY)
+        self.assertFalse(DotacionDiaria.objects.exists())
+        self.assertFalse([
+            c for c in consultas.captured_queries if c['sql'].lstrip().upper().startswith(('INSERT', 'DELETE', 'UPDATE'))
+        ])
+
+    def _curvas(self, inicio, granularidad):
+        datos = calcular_kpis(inicio, HOY, granularidad, hoy=HOY)
+        return datos['dotacion'], datos['contrataciones']
+
+    def test_sin_backfill_se_calcula_en_memoria(self):
+        self._fichas()
+        ficha('3-5', HOY - timedelta(days=90), termino=HOY - timedelta(days=14), area='CAMPO')
+        inicio = HOY - timedelta(days=120)
+        for granularidad in GRANULARIDADES:
+            en_memoria = self._curvas(inicio, granularidad)
+            self.assertFalse(DotacionDiaria.objects.exists())
+            recalcular()
+            self.assertEqual(en_memoria, self._curvas(inicio, granularidad))
+            self.assertEqual(sum(en_memoria[1]['values']), 3)
+            DotacionDiaria.objects.all().delete()
+
+    def test_dias_sin_extender_se_calculan_en_memoria(self):
+        self._fichas()
+        ficha('3-5', HOY - timedelta(days=8), termino=HOY - timedelta(days=2))
+        recalcular(hasta=HOY - timedelta(days=10))
+        inicio  = HOY - timedelta(days=60)
+        parcial = self._curvas(inicio, 'dia')
+        recalcular()
+        self.assertEqual(parcial, self._curvas(inicio, 'dia'))
+        self.assertEqual(parcial[0]['values'][-1], 2)
+
+    def test_fin_futuro_se_corta_en_hoy(self):
+        self._fichas()
+        recalcular()
+        datos = calcular_kpis(HOY - timedelta(days=5), HOY + timedelta(days=30), 'dia', hoy=HOY)
+        self.assertEqual(datos['dotacion']['labels'][-1], HOY.strftime('%d/%m/%Y'))
+        self.assertEqual(datos['dotacion']['values'][-1], 2)
+        self.assertEqual(DotacionDiaria.objects.filter(fecha__gt=HOY).count(), 0)
+
+    def test_curva_semanal_igual_al_bucle_anterior(self):
+        self._fichas()
+        ficha('3-5', HOY - timedelta(days=90), termino=HOY - timedelta(days=14))
+        ficha('4-3', HOY - timedelta(days=20), termino=HOY - timedelta(days=30))   # término antes del ingreso
+        recalcular()
+        inicio = HOY - timedelta(days=120)
+        datos  = calcular_kpis(inicio, HOY, 'semana', hoy=HOY)
+
+        puntos = puntos_de_corte(inicio, HOY, 'semana')
+        fichas = Colaborador.objects.values_list('fecha_ingreso', 'fecha_termino_contrato')
+        # Cálculo anterior de api_kpis, sin las fichas con término antes del ingreso
+        validas = [(i, t) for i, t in fichas if t is None or t >= i]
+        bucle   = [sum(1 for i, t in validas if i <= p and (t is None or t >= p)) for p in puntos]
+        self.assertEqual(datos['dotacion']['values'], bucle)
+        self.assertEqual(datos['dotacion']['labels'], [p.strftime('%d/%m/%Y') for p in puntos])
 
-# Create your tests here.
+    def test_puntos_de_corte(self):
+        self.assertEqual(
+            puntos_de_corte(date(2025, 3, 5), date(2025, 3, 20), 'semana'),
+            [date(2025, 3, 3), date(2025, 3, 10), date(2025, 3, 17)],
+        )
+        self.assertEqual(
+            puntos_de_corte(date(2024, 11, 15), date(2025, 2, 1), 'mes'),
+            [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)],
+        )
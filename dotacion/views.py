@@ -2,12 +2,12 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
-from django.db.models import Count, Q
-from django.db.models.functions import TruncWeek
-from datetime import date, timedelta
+from django.db.models import Q
+from datetime import date
 from .forms import CargaFichasForm
+from .kpis import GRANULARIDADES, obtener_kpis
 from .models import Colaborador
-from .services import procesar_fichas
+from core.cargas import aviso_repetida, carga_en_sesion, encolar
 
 
 @login_required
@@ -15,23 +15,11 @@ def index(request):
     if request.method == 'POST':
         form = CargaFichasForm(request.POST, request.FILES)
         if form.is_valid():
-            try:
-                resultado = procesar_fichas(request.FILES['archivo'])
-                messages.success(
-                    request,
-                    f"✅ Carga completa. "
-                    f"Nuevos: {resultado['creados']} | "
-                    f"Actualizados: {resultado['actualizados']} | "
-                    f"Omitidos: {resultado['omitidos']}"
-                )
-                if resultado['errores']:
-                    messages.warning(request, f"⚠️ {len(resultado['errores'])} filas con error.")
-                    for err in resultado['errores'][:5]:
-                        messages.warning(request, err)
-            except ValueError as e:
-                messages.error(request, f"❌ {str(e)}")
-            except Exception as e:
-                messages.error(request, f"❌ Error inesperado: {str(e)}")
+            carga, creada = encolar(request, 'DOTACION', request.FILES['archivo'])
+            if creada:
+                messages.info(request, "📥 Archivo recibido. Se está procesando en segundo plano.")
+            else:
+                messages.info(request, aviso_repetida(carga))
             return redirect('dotacion_index')
     else:
         form = CargaFichasForm()
@@ -39,6 +27,7 @@ def index(request):
     hoy = date.today()
     return render(request, 'dotacion/index.html', {
         'form'                : form,
+        'carga'               : carga_en_sesion(request, 'DOTACION'),
         'fecha_inicio_default': date(hoy.year, 1, 1).strftime('%Y-%m-%d'),
         'fecha_fin_default'   : hoy.strftime('%Y-%m-%d'),
     })
@@ -58,113 +47,11 @@ def api_kpis(request):
         inicio = date(hoy.year, 1, 1)
         fin    = hoy
 
-    vigentes = Colaborador.objects.filter(estado='VIGENTE', fecha_ingreso__lte=fin)
-
-    total_vigentes  = vigentes.count()
-    total_historico = Colaborador.objects.count()
-    sin_contacto    = vigentes.filter(
-        Q(email__isnull=True) | Q(email='') |
-        Q(telefono__isnull=True) | Q(telefono='')
-    ).count()
-
-    # 1. Dotación activa por semana
-    todos = list(
-        Colaborador.objects
-        .filter(fecha_ingreso__isnull=False, fecha_ingreso__lte=fin)
-        .values('fecha_ingreso', 'fecha_termino_contrato')
-    )
-    semana = inicio - timedelta(days=inicio.weekday())
-    dotacion_labels, dotacion_values = [], []
-    while semana <= fin:
-        count = sum(
-            1 for c in todos
-            if c['fecha_ingreso'] <= semana
-            and (c['fecha_termino_contrato'] is None or c['fecha_termino_contrato'] >= semana)
-        )
-        dotacion_labels.append(semana.strftime('%d/%m/%Y'))
-        dotacion_values.append(count)
-        semana += timedelta(weeks=1)
-
-    # 2. Contrataciones por semana
-    contrataciones_raw = (
-        Colaborador.objects
-        .filter(fecha_ingreso__isnull=False, fecha_ingreso__range=[inicio, fin])
-        .annotate(semana=TruncWeek('fecha_ingreso'))
-        .values('semana').annotate(total=Count('rut')).order_by('semana')
-    )
-    contrataciones_labels = [r['semana'].strftime('%d/%m/%Y') for r in contrataciones_raw]
-    contrataciones_values = [r['total'] for r in contrataciones_raw]
-
-    # 3. Rango etario
-    rangos = {'18-25': 0, '26-35': 0, '36-45': 0, '46-55': 0, '56+': 0}
-    for c in vigentes.filter(fecha_nacimiento__isnull=False):
-        edad = c.edad
-        if edad is None: continue
-        if   18 <= edad <= 25: rangos['18-25'] += 1
-        elif 26 <= edad <= 35: rangos['26-35'] += 1
-        elif 36 <= edad <= 45: rangos['36-45'] += 1
-        elif 46 <= edad <= 55: rangos['46-55'] += 1
-        elif edad >= 56:       rangos['56+']   += 1
-
-    # 4. Nivel educacional
-    escolaridad_data = list(
-        vigentes.exclude(escolaridad__isnull=True).exclude(escolaridad='')
-        .values('escolaridad').annotate(total=Count('rut')).order_by('-total')
-    )
-
-    # 5. Nacionalidades
-    nacionalidad_data = list(
-        vigentes.exclude(nacionalidad__isnull=True).exclude(nacionalidad='')
-        .values('nacionalidad').annotate(total=Count('rut')).order_by('-total')[:8]
-    )
-
-    # 6. Comunas
-    comuna_data = list(
-        vigentes.exclude(comuna__isnull=True).exclude(comuna='')
-        .values('comuna').annotate(total=Count('rut')).order_by('-total')[:12]
-    )
-
-    # 7. Género
-    sexo_data = list(
-        vigentes.exclude(sexo__isnull=True).exclude(sexo='')
-        .values('sexo').annotate(total=Count('rut')).order_by('-total')
-    )
+    granularidad = request.GET.get('granularidad', 'semana')
+    if granularidad not in GRANULARIDADES:
+        granularidad = 'semana'
 
-    # 8. Permanencia
-    rangos_perm = {
-        '< 3 meses': 0, '3-6 meses': 0, '6-12 meses': 0,
-        '1-2 años': 0, '2-5 años': 0, '5+ años': 0
-    }
-    for c in vigentes.filter(fecha_ingreso__isnull=False):
-        m = c.meses_permanencia
-        if m is None: continue
-        if   m < 3:  rangos_perm['< 3 meses']  += 1
-        elif m < 6:  rangos_perm['3-6 meses']   += 1
-        elif m < 12: rangos_perm['6-12 meses']  += 1
-        elif m < 24: rangos_perm['1-2 años']     += 1
-        elif m < 60: rangos_perm['2-5 años']     += 1
-        else:        rangos_perm['5+ años']      += 1
-
-    # 9. Tipo contrato
-    planta_data = list(
-        vigentes.exclude(tipo_contrato__isnull=True).exclude(tipo_contrato='')
-        .values('tipo_contrato').annotate(total=Count('rut')).order_by('-total')
-    )
-
-    return JsonResponse({
-        'kpi_vigentes'    : total_vigentes,
-        'kpi_historico'   : total_historico,
-        'kpi_sin_contacto': sin_contacto,
-        'dotacion'        : {'labels': dotacion_labels,        'values': dotacion_values},
-        'contrataciones'  : {'labels': contrataciones_labels,  'values': contrataciones_values},
-        'edad'            : {'labels': list(rangos.keys()),     'values': list(rangos.values())},
-        'escolaridad'     : {'labels': [d['escolaridad']   for d in escolaridad_data],  'values': [d['total'] for d in escolaridad_data]},
-        'nacionalidad'    : {'labels': [d['nacionalidad']  for d in nacionalidad_data], 'values': [d['total'] for d in nacionalidad_data]},
-        'comuna'          : {'labels': [d['comuna']        for d in comuna_data],       'values': [d['total'] for d in comuna_data]},
-        'sexo'            : {'labels': [d['sexo']          for d in sexo_data],         'values': [d['total'] for d in sexo_data]},
-        'permanencia'     : {'labels': list(rangos_perm.keys()), 'values': list(rangos_perm.values())},
-        'tipo_contrato'   : {'labels': [d['tipo_contrato'] for d in planta_data],       'values': [d['total'] for d in planta_data]},
-    })
+    return JsonResponse(obtener_kpis(inicio, fin, granularidad))
 
 
 @login_required
@@ -298,7 +185,7 @@ def carga_masiva_bloqueados(request):
         return redirect('dotacion_bloqueados')
 
     from .models import PersonaBloqueada
-    import openpyxl
+    from core.lectores import abrir_tabla
 
     archivo = request.FILES.get('archivo_masivo')
     if not archivo:
@@ -306,12 +193,11 @@ def carga_masiva_bloqueados(request):
         return redirect('dotacion_bloqueados')
 
     try:
-        wb      = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
-        ws      = wb.active
+        tabla   = abrir_tabla(archivo)          # encabezado en la fila 1; columnas por posición
         creados = omitidos = 0
         errores = []
 
-        for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+        for row_num, row in tabla.filas([0, 1, 2]):
             if not any(row):
                 continue
 
@@ -348,7 +234,7 @@ def carga_masiva_bloqueados(request):
             )
             creados += 1
 
-        wb.close()
+        tabla.close()
         messages.success(request, f'✅ Registrados: {creados} | Omitidos: {omitidos}')
         if errores:
             messages.warning(request, '⚠️ Primeras omisiones:')
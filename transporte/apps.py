@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TransporteConfig(AppConfig):
     name = 'transporte'
+
+    def ready(self):
+        import transporte.receivers  # noqa — registra los receptores
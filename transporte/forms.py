@@ -144,4 +144,24 @@ class RutaForm(EstiloFormMixin, forms.ModelForm):
         widgets = {
             'origen': forms.TextInput(attrs={'placeholder': 'Ej: Planta Aurora'}),
             'destino': forms.TextInput(attrs={'placeholder': 'Ej: Plaza de Armas'}),
-        }
\ No newline at end of file
+        }
+# --- 6. CARGA DE LA PLANILLA GREX (RegistroTransporteExcel) ---
+class CargaTransporteExcelForm(forms.Form):
+    archivo = forms.FileField(
+        label='Planilla de Transporte GREX (.xlsx)',
+        widget=forms.FileInput(attrs={
+            'accept': '.xlsx',
+            'class': 'block w-full text-sm text-slate-500 file:mr-4 file:py-2 file:px-4 '
+                     'file:rounded-lg file:border-0 file:font-semibold '
+                     'file:bg-blue-50 file:text-blue-700 hover:file:bg-blue-100',
+        })
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data.get('archivo')
+        if archivo:
+            if not archivo.name.endswith('.xlsx'):
+                raise forms.ValidationError('Solo se aceptan archivos .xlsx')
+            if archivo.size > 10 * 1024 * 1024:
+                raise forms.ValidationError('El archivo no puede superar los 10 MB.')
+        return archivo
@@ -0,0 +1,116 @@
+"""
+Limpieza vectorizada de las planillas de transporte (histórico y GREX).
+
+Cada función recibe una columna completa (pd.Series) y devuelve otra
+alineada por índice: los mismos criterios sirven para cargar_historico y
+para el importador de RegistroTransporteExcel.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# Estandarización de rutas, en orden: (contiene alguno de, y además contiene, ruta final).
+# Gana la primera regla que calza; si ninguna calza queda el nombre limpio.
+REGLAS_RUTA = [
+    (('CURICO',),             '1',      'CURICO 1'),
+    (('CURICO',),             '2',      'CURICO 2'),
+    (('CURICO',),             '3',      'CURICO 3'),
+    (('CURICO',),             None,     'CURICO 1'),
+    (('TENO',),               'CENTRO', 'TENO 1'),
+    (('TENO',),               '2',      'TENO 2'),
+    (('TENO',),               None,     'TENO 1'),
+    (('MONTANA', 'MONTAÑA'),  '2',      'LA MONTAÑA 2'),
+    (('MONTANA', 'MONTAÑA'),  None,     'LA MONTAÑA 1'),
+    (('MOLINA',),             None,     'MOLINA'),
+    (('MORZA',),              None,     'MORZA'),
+    (('RAUCO',),              None,     'RAUCO'),
+    (('CHEPICA',),            None,     'CHEPICA'),
+]
+SIN_TILDES = str.maketrans('ÁÉÍÓÚ', 'AEIOU')
+
+# Tipo de vehículo según el texto de la planilla: (texto, tipo); BUS si no calza ninguno
+TIPOS_VEHICULO = [('MINIBUS', 'MINIBUS'), ('VAN', 'VAN')]
+TIPO_POR_DEFECTO = 'BUS'
+
+
+def contiene(textos, fragmento):
+    return textos.str.contains(fragmento, regex=False, na=False)
+
+
+def primera_regla(reglas, defecto):
+    """Valor de la primera (condición, valor) que calza en cada fila; `defecto` donde ninguna."""
+    resultado = defecto
+    for condicion, valor in reversed(reglas):
+        resultado = resultado.mask(condicion, valor)
+    return resultado
+
+
+def normalizar_rutas(columna):
+    """Nombres de ruta estandarizados (REGLAS_RUTA); NA donde la celda viene vacía."""
+    nombres = columna.astype('string').str.upper().str.strip().str.translate(SIN_TILDES)
+    nombres = nombres.mask(nombres == '')
+    reglas = []
+    for claves, ademas, final in REGLAS_RUTA:
+        condicion = contiene(nombres, claves[0])
+        for clave in claves[1:]:
+            condicion |= contiene(nombres, clave)
+        if ademas:
+            condicion &= contiene(nombres, ademas)
+        reglas.append((condicion, final))
+    return primera_regla(reglas, nombres)
+
+
+def tipos_vehiculo(columna):
+    """BUS, MINIBUS o VAN según el texto de cada celda (TIPOS_VEHICULO)."""
+    tipos = columna.astype('string').str.upper()
+    return primera_regla(
+        [(contiene(tipos, texto), tipo) for texto, tipo in TIPOS_VEHICULO],
+        pd.Series(TIPO_POR_DEFECTO, index=tipos.index),
+    )
+
+
+def textos(columna):
+    """Texto en mayúsculas con los espacios repetidos colapsados; NA si viene vacío."""
+    texto = columna.astype('string').str.upper().str.replace(r'\s+', ' ', regex=True).str.strip()
+    return texto.mask(texto == '')
+
+
+def _a_fecha(valor):
+    """datetime tal cual; el resto (texto dd-mm-aaaa, etc.) con pd.to_datetime(dayfirst=True). NaT si no se puede."""
+    if isinstance(valor, datetime):
+        return valor
+    try:
+        return pd.to_datetime(valor, dayfirst=True)
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT
+
+
+def dias(columna):
+    """Día (datetime64 a medianoche) de cada celda de fecha; NaT donde no se puede leer."""
+    # Cada fecha distinta se convierte una sola vez
+    codigos, unicas = pd.factorize(columna)
+    convertidas = pd.DatetimeIndex([_a_fecha(v) for v in unicas] + [pd.NaT])    # código -1 (vacío) → NaT
+    return pd.Series(convertidas[codigos], index=columna.index).dt.normalize()
+
+
+def _enteros(valores):
+    """int64 truncado; 0 donde no hay número."""
+    return valores.replace([np.inf, -np.inf], np.nan).fillna(0).astype('int64')
+
+
+def montos(columna):
+    """Montos como enteros: números tal cual y texto sin '$', puntos de miles ni espacios."""
+    if pd.api.types.is_numeric_dtype(columna):
+        return _enteros(pd.to_numeric(columna, errors='coerce'))
+    texto = columna.str.replace(r'[$.\s]', '', regex=True)          # NA en las celdas que no son texto
+    return _enteros(
+        pd.to_numeric(texto, errors='coerce')
+        .fillna(pd.to_numeric(columna.where(texto.isna()), errors='coerce'))
+    )
+
+
+def cantidades(columna):
+    """Cantidades enteras (pasajeros); 0 donde no hay número."""
+    return _enteros(pd.to_numeric(columna, errors='coerce'))
@@ -1,159 +1,211 @@
+"""
+Carga del histórico de viajes desde Excel (FECHA, TURNO, RUTA, TIPO, TARIFA, PAX).
+
+El archivo se lee con el lector columnar de core.lectores (xlsx o CSV) y
+las columnas se limpian completas con pandas (transporte.limpieza): nombre de ruta
+estandarizado, hora según el turno, tarifa, pasajeros y ocupación. Los viajes
+se insertan por lotes (COPY en Postgres) sin pasar por save() ni por las
+señales, así que la ocupación y la tarifa por defecto del vehículo se calculan
+acá y el resumen diario se recalcula una sola vez para el rango cargado
+(y su cobertura se extiende hasta el primer viaje).
+"""
+from time import perf_counter
+
+import numpy as np
 import pandas as pd
+from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
+
+from core.bulk import copiar_objetos, usa_copy
+from core.lectores import abrir_tabla
+from transporte.limpieza import cantidades, contiene, dias, montos, normalizar_rutas, primera_regla, tipos_vehiculo
 from transporte.models import Vehiculo, Ruta, Conductor, RegistroSalida
-from django.contrib.auth.models import User
-from datetime import datetime, time
+from transporte.resumen import asegurar_cobertura, recalcular
 
 
-class Command(BaseCommand):
-    help = 'Carga masiva con estandarización agresiva de rutas y limpieza de datos'
+BATCH_SIZE = 1000
 
-    def add_arguments(self, parser):
-        parser.add_argument('excel_file', type=str, help='Ruta del archivo Excel')
+COLUMNAS = ['FECHA', 'TURNO', 'RUTA', 'TIPO', 'TARIFA', 'PAX']
 
-    def normalizar_ruta(self, valor_celda):
-        if pd.isna(valor_celda) or str(valor_celda).strip() == '':
-            return None
+# Hora del viaje según el texto del turno (minutos desde medianoche); 08:00 si no calza ninguno
+HORAS_TURNO = [('TURNO 1', 7 * 60 + 30), ('TURNO 2', 16 * 60 + 30), ('TURNO 3', 23 * 60 + 30)]
+HORA_POR_DEFECTO = 8 * 60
 
-        nombre = str(valor_celda).upper().strip()
-        nombre = nombre.replace('Á', 'A').replace('É', 'E').replace('Í', 'I').replace('Ó', 'O').replace('Ú', 'U')
+# Vehículo genérico de cada tipo: tipo → (patente, capacidad)
+VEHICULOS_HISTORICOS = {
+    'MINIBUS': ('HIST-MINI', 25),
+    'VAN'    : ('HIST-VAN', 17),
+    'BUS'    : ('HIST-BUS', 42),
+}
 
-        if "CURICO" in nombre:
-            if "1" in nombre: return "CURICO 1"
-            if "2" in nombre: return "CURICO 2"
-            if "3" in nombre: return "CURICO 3"
-            return "CURICO 1"
 
-        if "TENO" in nombre:
-            if "CENTRO" in nombre: return "TENO 1"
-            if "2" in nombre: return "TENO 2"
-            return "TENO 1"
+def fechas_de_viaje(fechas, turnos):
+    """
+    Fecha y hora de cada viaje (aware, hora local): el día de FECHA a la hora
+    de su turno. NaT donde la fecha no se puede leer.
+    """
+    turnos  = turnos.astype('string').str.upper()
+    minutos = primera_regla(
+        [(contiene(turnos, texto), m) for texto, m in HORAS_TURNO],
+        pd.Series(HORA_POR_DEFECTO, index=turnos.index),
+    )
+    # Como timezone.make_aware: una hora repetida al atrasar el reloj es la
+    # primera (horario de verano) y una que no existe se corre una hora.
+    return (dias(fechas) + pd.to_timedelta(minutos, unit='m')).dt.tz_localize(
+        timezone.get_current_timezone(),
+        ambiguous=np.ones(len(fechas), dtype=bool),
+        nonexistent=pd.Timedelta(hours=1),
+    )
 
-        if "MONTANA" in nombre or "MONTAÑA" in nombre:
-            if "2" in nombre: return "LA MONTAÑA 2"
-            return "LA MONTAÑA 1"
 
-        if "MOLINA" in nombre: return "MOLINA"
-        if "MORZA" in nombre: return "MORZA"
-        if "RAUCO" in nombre: return "RAUCO"
-        if "CHEPICA" in nombre: return "CHEPICA"
+class Command(BaseCommand):
+    help = 'Carga masiva con estandarización agresiva de rutas y limpieza de datos'
 
-        return nombre
+    def add_arguments(self, parser):
+        parser.add_argument('excel_file', type=str, help='Ruta del archivo Excel')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Procesa e inserta dentro de una transacción que se revierte: no deja cambios',
+        )
 
+    # Una sola transacción: el --dry-run la revierte completa
+    @transaction.atomic
     def handle(self, *args, **kwargs):
         file_path = kwargs['excel_file']
-        print("--- INICIANDO CARGA CON LIMPIEZA PROFUNDA ---")
+        dry_run   = kwargs['dry_run']
+        tiempos   = {}
+        print("--- INICIANDO CARGA CON LIMPIEZA PROFUNDA ---" + (" (DRY RUN)" if dry_run else ""))
 
+        t0 = perf_counter()
         try:
-            df = pd.read_excel(file_path)
-            df.columns = df.columns.astype(str).str.upper().str.strip()
-            print(f"Columnas encontradas: {list(df.columns)}")
+            with open(file_path, 'rb') as archivo, abrir_tabla(archivo, requeridas=COLUMNAS) as tabla:
+                print(f"Columnas encontradas: {list(tabla.encabezado)}")
+                filas = list(tabla.filas(COLUMNAS))
         except Exception as e:
             print(f"❌ Error crítico leyendo el archivo: {e}")
             return
+        # Índice = número de fila en el Excel
+        df = pd.DataFrame([v for _, v in filas], index=[n for n, _ in filas], columns=COLUMNAS)
+        tiempos['Lectura'] = perf_counter() - t0
 
+        # ── Limpieza por columnas ──────────────────────────────────
+        t0 = perf_counter()
         df['FECHA'] = df['FECHA'].ffill()
         df['TURNO'] = df['TURNO'].ffill()
 
+        rutas    = normalizar_rutas(df['RUTA'])
+        fechas   = fechas_de_viaje(df['FECHA'], df['TURNO'])
+        tarifa   = montos(df['TARIFA'])
+        pax      = cantidades(df['PAX'])
+        tipos    = tipos_vehiculo(df['TIPO'])
+
+        # Filas sin ruta se saltan; las demás necesitan fecha y pasajeros válidos
+        con_ruta = rutas.notna()
+        motivos  = (
+            pd.Series(pd.NA, index=df.index, dtype='string')
+            .mask(pax < 0, 'Cantidad de pasajeros negativa')
+            .mask(fechas.isna(), 'Fecha inválida')
+        )
+        fallidas = con_ruta & motivos.notna()
+        validas  = con_ruta & ~fallidas
+        tiempos['Limpieza'] = perf_counter() - t0
+
+        # ── Catálogos (ruta, vehículo, usuario y chofer genéricos) ──
+        t0 = perf_counter()
         user_sys, _ = User.objects.get_or_create(username='sistema_carga')
         chofer_gen, _ = Conductor.objects.get_or_create(
             rut='9999999-9',
             defaults={'nombre': 'CHOFER HISTÓRICO'}
         )
-
-        cache_rutas = {}
-        cache_vehiculos = {}
-
-        registros_creados = 0
-        errores = 0
-        filas_fallidas = []
-
-        for index, row in df.iterrows():
-            try:
-                ruta_raw = row.get('RUTA')
-                ruta_final = self.normalizar_ruta(ruta_raw)
-
-                if not ruta_final:
-                    continue
-
-                fecha_excel = row['FECHA']
-                turno_str = str(row['TURNO']).upper()
-
-                hora_viaje = time(8, 0)
-                if 'TURNO 1' in turno_str:   hora_viaje = time(7, 30)
-                elif 'TURNO 2' in turno_str: hora_viaje = time(16, 30)
-                elif 'TURNO 3' in turno_str: hora_viaje = time(23, 30)
-
-                if not isinstance(fecha_excel, datetime):
-                    fecha_excel = pd.to_datetime(fecha_excel, dayfirst=True)
-
-                fecha_completa = timezone.make_aware(
-                    datetime.combine(fecha_excel.date(), hora_viaje)
-                )
-
-                try:
-                    tarifa_str = str(row['TARIFA']).replace('$', '').replace('.', '').replace(' ', '')
-                    tarifa = int(float(tarifa_str))
-                except:
-                    tarifa = 0
-
-                try:
-                    pax = int(row['PAX'])
-                except:
-                    pax = 0
-
-                tipo_str = str(row['TIPO']).upper()
-                if 'MINIBUS' in tipo_str:
-                    modelo, cap, pat = 'MINIBUS', 25, 'HIST-MINI'
-                elif 'VAN' in tipo_str:
-                    modelo, cap, pat = 'VAN', 17, 'HIST-VAN'
-                else:
-                    modelo, cap, pat = 'BUS', 42, 'HIST-BUS'
-
-                if pat not in cache_vehiculos:
-                    v, _ = Vehiculo.objects.get_or_create(
-                        patente=pat,
-                        defaults={'tipo': modelo, 'capacidad': cap}
-                    )
-                    cache_vehiculos[pat] = v
-
-                if ruta_final not in cache_rutas:
-                    r, _ = Ruta.objects.get_or_create(
-                        nombre=ruta_final,
-                        defaults={'origen': 'Planta', 'destino': ruta_final}
-                    )
-                    cache_rutas[ruta_final] = r
-
-                RegistroSalida.objects.create(
-                    fecha_registro=fecha_completa,
-                    registrado_por=user_sys,
-                    ruta=cache_rutas[ruta_final],
-                    vehiculo=cache_vehiculos[pat],
-                    conductor=chofer_gen,
-                    cantidad_pasajeros=pax,
-                    valor_viaje=tarifa
-                )
-                registros_creados += 1
-
-            except Exception as e:
-                errores += 1
-                filas_fallidas.append({
-                    'fila_excel': index + 2,
-                    'fecha'     : row.get('FECHA', '?'),
-                    'turno'     : row.get('TURNO', '?'),
-                    'ruta'      : row.get('RUTA', '?'),
-                    'tipo'      : row.get('TIPO', '?'),
-                    'tarifa'    : row.get('TARIFA', '?'),
-                    'pax'       : row.get('PAX', '?'),
-                    'motivo'    : str(e),
-                })
+        vehiculos = {}
+        for modelo in tipos[validas].unique():
+            pat, cap = VEHICULOS_HISTORICOS[modelo]
+            vehiculos[modelo], _ = Vehiculo.objects.get_or_create(
+                patente=pat,
+                defaults={'tipo': modelo, 'capacidad': cap}
+            )
+        ids_rutas = {}
+        for nombre in rutas[validas].unique():
+            r, _ = Ruta.objects.get_or_create(
+                nombre=nombre,
+                defaults={'origen': 'Planta', 'destino': nombre}
+            )
+            ids_rutas[nombre] = r.id
+        tiempos['Catálogos'] = perf_counter() - t0
+
+        # ── Ocupación y tarifa por defecto (lo que hacía save()) ────
+        t0 = perf_counter()
+        tipos     = tipos[validas]
+        pax       = pax[validas]
+        tarifa    = tarifa[validas]
+        capacidad = tipos.map({t: v.capacidad for t, v in vehiculos.items()}).astype('int64')
+        ocupacion = (pax / capacidad * 100).where(capacidad > 0, 0.0)
+        valor     = tarifa.mask(tarifa == 0, tipos.map({t: v.tarifa_base for t, v in vehiculos.items()}))
+
+        objs = [
+            RegistroSalida(
+                fecha_registro=fecha,
+                registrado_por_id=user_sys.id,
+                ruta_id=ruta_id,
+                vehiculo_id=vehiculo_id,
+                conductor_id=chofer_gen.id,
+                cantidad_pasajeros=n_pax,
+                valor_viaje=monto,
+                ocupacion_porcentaje=ocup,
+            )
+            for fecha, ruta_id, vehiculo_id, n_pax, monto, ocup in zip(
+                fechas[validas].dt.to_pydatetime(),
+                rutas[validas].map(ids_rutas).tolist(),
+                tipos.map({t: v.id for t, v in vehiculos.items()}).tolist(),
+                pax.tolist(),
+                valor.tolist(),
+                ocupacion.tolist(),
+            )
+        ]
+        if usa_copy():
+            copiar_objetos(objs)
+        else:
+            RegistroSalida.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+        tiempos['Inserción'] = perf_counter() - t0
+
+        # ── Resumen diario del rango cargado (bulk_create no dispara señales) ──
+        t0 = perf_counter()
+        if objs:
+            dias = fechas[validas].dt.date
+            recalcular(dias.min(), dias.max())
+            # El histórico suele ser anterior a la cobertura: que llegue hasta el primer viaje
+            asegurar_cobertura()
+        tiempos['Resumen diario'] = perf_counter() - t0
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+        filas_fallidas = [
+            {
+                'fila_excel': index,
+                'fecha'     : row['FECHA'],
+                'turno'     : row['TURNO'],
+                'ruta'      : row['RUTA'],
+                'tipo'      : row['TIPO'],
+                'tarifa'    : row['TARIFA'],
+                'pax'       : row['PAX'],
+                'motivo'    : motivo,
+            }
+            for (index, row), motivo in zip(df[fallidas].iterrows(), motivos[fallidas])
+        ]
 
         # ── Resumen final ──────────────────────────────────────────
         print(f"\n{'='*55}")
-        print(f"✅ PROCESO TERMINADO")
-        print(f"   Registros importados : {registros_creados}")
-        print(f"   Filas con error      : {errores}")
+        print(f"✅ PROCESO TERMINADO" + (" (DRY RUN: no se guardó nada)" if dry_run else ""))
+        print(f"   Registros importados : {len(objs)}")
+        print(f"   Filas con error      : {len(filas_fallidas)}")
+
+        print(f"\n⏱  Tiempos por fase:")
+        for fase, segundos in tiempos.items():
+            print(f"   {fase:<20} : {segundos:6.2f}s")
+        print(f"   {'Total':<20} : {sum(tiempos.values()):6.2f}s")
 
         if filas_fallidas:
             print(f"\n{'─'*55}")
@@ -169,4 +221,4 @@ class Command(BaseCommand):
                 print(f"    PAX    : {f['pax']}")
                 print(f"    MOTIVO : {f['motivo']}")
 
-        print(f"\n{'='*55}")
\ No newline at end of file
+        print(f"\n{'='*55}")
@@ -0,0 +1,36 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transporte.resumen import asegurar_cobertura, recalcular
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla de hechos ResumenDiarioTransporte desde los RegistroSalida (completa o desde una fecha).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='YYYY-MM-DD. Por defecto, el primer viaje registrado.')
+        parser.add_argument(
+            '--si-falta', action='store_true',
+            help='Solo resumir los días anteriores a la cobertura (build.sh); no recalcula lo ya cubierto',
+        )
+
+    def handle(self, *args, **opts):
+        desde = None
+        if opts['desde']:
+            try:
+                desde = datetime.strptime(opts['desde'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--desde debe tener formato YYYY-MM-DD')
+
+        t0 = time.perf_counter()
+        if opts['si_falta']:
+            if desde:
+                raise CommandError('--si-falta no admite --desde')
+            filas = asegurar_cobertura()
+        else:
+            filas = recalcular(desde=desde)
+        self.stdout.write(self.style.SUCCESS(
+            f"ResumenDiarioTransporte: {filas} filas escritas en {time.perf_counter() - t0:.2f}s"
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 00:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transporte', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioTransporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_vehiculo', models.CharField(max_length=20)),
+                ('tipo_movimiento', models.CharField(max_length=10)),
+                ('viajes', models.PositiveIntegerField(default=0)),
+                ('costo', models.BigIntegerField(default=0)),
+                ('pasajeros', models.PositiveIntegerField(default=0)),
+                ('capacidad', models.PositiveIntegerField(default=0)),
+                ('suma_ocupacion', models.FloatField(default=0)),
+                ('ruta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='transporte.ruta')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Transporte',
+                'verbose_name_plural': 'Resumen Diario de Transporte',
+                'unique_together': {('fecha', 'ruta', 'tipo_vehiculo', 'tipo_movimiento')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 00:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transporte', '0002_resumendiariotransporte'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registrosalida',
+            index=models.Index(fields=['fecha_registro', 'id'], name='registro_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transporte', '0003_registrosalida_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registrotransporteexcel',
+            name='viajes',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioTransporteExcel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('sector', models.CharField(max_length=100)),
+                ('turno', models.CharField(blank=True, max_length=50, null=True)),
+                ('viajes', models.PositiveIntegerField(default=0)),
+                ('costo', models.BigIntegerField(default=0)),
+                ('pasajeros', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario GREX',
+                'verbose_name_plural': 'Resumen Diario GREX',
+                'unique_together': {('fecha', 'sector', 'turno')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transporte', '0004_resumendiariotransporteexcel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoberturaResumenTransporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.DateField()),
+            ],
+            options={
+                'verbose_name': 'Cobertura del Resumen de Transporte',
+                'verbose_name_plural': 'Cobertura del Resumen de Transporte',
+            },
+        ),
+    ]
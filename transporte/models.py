@@ -81,6 +81,49 @@ class RegistroSalida(models.Model):
     class Meta:
         # CORRECCIÓN: El '-id' fuerza el orden correcto si las fechas son idénticas
         ordering = ['-fecha_registro', '-id']
+        # Paginación por clave (core.paginacion) y filtros por rango de fechas
+        indexes = [models.Index(fields=['fecha_registro', 'id'], name='registro_fecha_id_idx')]
+
+# 4b. RESUMEN DIARIO (tabla de hechos del dashboard)
+class ResumenDiarioTransporte(models.Model):
+    """
+    Una fila por día (hora local) × ruta × tipo de vehículo × tipo de
+    movimiento. La mantiene transporte.resumen; no se edita a mano.
+    """
+    fecha           = models.DateField()
+    ruta            = models.ForeignKey(Ruta, on_delete=models.CASCADE, related_name='+')
+    tipo_vehiculo   = models.CharField(max_length=20)
+    tipo_movimiento = models.CharField(max_length=10)
+
+    viajes          = models.PositiveIntegerField(default=0)
+    costo           = models.BigIntegerField(default=0)          # suma de valor_viaje
+    pasajeros       = models.PositiveIntegerField(default=0)
+    capacidad       = models.PositiveIntegerField(default=0)     # suma de la capacidad de los vehículos
+    suma_ocupacion  = models.FloatField(default=0)               # suma de ocupacion_porcentaje (para promediar)
+
+    def __str__(self):
+        return f"{self.fecha} | {self.ruta_id} | {self.tipo_vehiculo} | {self.tipo_movimiento}: {self.viajes}"
+
+    class Meta:
+        unique_together     = [('fecha', 'ruta', 'tipo_vehiculo', 'tipo_movimiento')]
+        verbose_name        = 'Resumen Diario de Transporte'
+        verbose_name_plural = 'Resumen Diario de Transporte'
+
+
+class CoberturaResumenTransporte(models.Model):
+    """
+    Una sola fila: primer día desde el que ResumenDiarioTransporte está
+    completo. La mueve transporte.resumen.recalcular; de ahí en adelante los
+    receptores mantienen el resumen al día.
+    """
+    desde = models.DateField()
+
+    def __str__(self):
+        return f"Resumen completo desde {self.desde}"
+
+    class Meta:
+        verbose_name        = 'Cobertura del Resumen de Transporte'
+        verbose_name_plural = 'Cobertura del Resumen de Transporte'
 
 # 5. SOLICITUDES DE TRANSPORTE (Se mantiene igual)
 class SolicitudTransporte(models.Model):
@@ -125,6 +168,8 @@ class RegistroTransporteExcel(models.Model):
     tipo_maquina    = models.CharField(max_length=20)
     tarifa          = models.IntegerField(default=0)
     n_pasajeros     = models.IntegerField(default=0)
+    # Servicios del archivo con esta misma clave; tarifa y n_pasajeros son sus sumas
+    viajes          = models.PositiveIntegerField(default=1)
     fecha_carga     = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -134,4 +179,23 @@ class RegistroTransporteExcel(models.Model):
         unique_together = [('fecha', 'turno', 'sector', 'tipo_maquina')]
 
     def __str__(self):
-        return f"{self.fecha} | {self.turno} | {self.sector} | {self.tipo_maquina}"
\ No newline at end of file
+        return f"{self.fecha} | {self.turno} | {self.sector} | {self.tipo_maquina}"
+
+# 6b. RESUMEN DIARIO GREX (lo reescribe transporte.resumen_excel al importar)
+class ResumenDiarioTransporteExcel(models.Model):
+    """Una fila por día × sector × turno de RegistroTransporteExcel (sumando los tipos de máquina)."""
+    fecha     = models.DateField()
+    sector    = models.CharField(max_length=100)
+    turno     = models.CharField(max_length=50, blank=True, null=True)
+
+    viajes    = models.PositiveIntegerField(default=0)
+    costo     = models.BigIntegerField(default=0)          # suma de tarifa
+    pasajeros = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fecha} | {self.sector} | {self.turno}: {self.viajes}"
+
+    class Meta:
+        unique_together     = [('fecha', 'sector', 'turno')]
+        verbose_name        = 'Resumen Diario GREX'
+        verbose_name_plural = 'Resumen Diario GREX'
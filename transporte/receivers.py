@@ -0,0 +1,53 @@
+"""
+Receptores internos de transporte: mantienen ResumenDiarioTransporte.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import RegistroSalida, Vehiculo
+from .resumen import dia_local, marcar_dias
+
+
+@receiver(pre_save, sender=RegistroSalida)
+def recordar_dia_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda el día previo del viaje: si cambia la fecha, también hay que recalcular ese día."""
+    if raw or instance.pk is None:
+        return
+    anterior = RegistroSalida.objects.filter(pk=instance.pk).values_list('fecha_registro', flat=True).first()
+    instance._dia_anterior = dia_local(anterior) if anterior else None
+
+
+@receiver(post_save, sender=RegistroSalida)
+def actualizar_resumen(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    marcar_dias({dia_local(instance.fecha_registro), getattr(instance, '_dia_anterior', None)})
+
+
+@receiver(post_delete, sender=RegistroSalida)
+def quitar_de_resumen(sender, instance, **kwargs):
+    marcar_dias({dia_local(instance.fecha_registro)})
+
+
+@receiver(pre_save, sender=Vehiculo)
+def recordar_vehiculo_anterior(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._resumen_anterior = (
+        Vehiculo.objects.filter(pk=instance.pk).values_list('tipo', 'capacidad').first()
+    )
+
+
+@receiver(post_save, sender=Vehiculo)
+def resumen_por_cambio_vehiculo(sender, instance, raw=False, **kwargs):
+    """El resumen agrupa por tipo y suma capacidades: si cambian, se recalculan los días del vehículo."""
+    anterior = getattr(instance, '_resumen_anterior', None)
+    if raw or anterior is None or anterior == (instance.tipo, instance.capacidad):
+        return
+    fechas = (
+        RegistroSalida.objects
+        .filter(vehiculo=instance)
+        .values_list('fecha_registro', flat=True)
+        .order_by()
+        .iterator()
+    )
+    marcar_dias({dia_local(f) for f in fechas})
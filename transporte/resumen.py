@@ -0,0 +1,259 @@
+"""
+Mantenimiento de la tabla de hechos ResumenDiarioTransporte.
+
+Cada viaje aporta a su día (hora local), ruta, tipo de vehículo y tipo de
+movimiento, así que un cambio se resuelve recalculando los días que toca.
+Los días se acumulan durante la transacción y se recalculan una sola vez al
+confirmar (marcar_dias), igual que dotacion.dotacion_diaria: una carga masiva
+dentro de una transacción recalcula su rango una vez y no por viaje.
+
+Un día sin filas puede ser un día sin viajes o uno que nunca se resumió
+(por ejemplo, anterior a la migración). CoberturaResumenTransporte guarda
+desde qué día el resumen está completo; quien lo lea para un rango que
+empieza antes debe contar sobre RegistroSalida (resumen_completo). El
+despliegue y la carga del histórico la llevan hasta el primer viaje
+(asegurar_cobertura), y contar_viajes solo cuenta filas para lo que quede
+fuera.
+
+totales_dashboard lee la tabla ya agregada por semana, tipo de vehículo y
+ruta en una sola consulta: GROUPING SETS en Postgres y, en otros motores, un
+GROUP BY (semana, tipo, ruta) que se reduce en Python.
+"""
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from core.bulk import copiar_objetos, usa_copy
+
+from .models import CoberturaResumenTransporte, RegistroSalida, ResumenDiarioTransporte, Ruta
+
+
+BATCH_SIZE = 1000
+
+
+# ─────────────────────────────────────────────
+# Días
+# ─────────────────────────────────────────────
+
+def dia_local(fecha_registro):
+    """Día (hora local) al que aporta un viaje; el mismo criterio que fecha_registro__date."""
+    return timezone.localdate(fecha_registro)
+
+
+def limites_dias(desde, hasta):
+    """
+    (inicio de `desde`, inicio del día siguiente a `hasta`) como datetimes
+    aware, para filtrar fecha_registro por rango y usar su índice.
+    """
+    return (
+        timezone.make_aware(datetime.combine(desde, time.min)),
+        timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min)),
+    )
+
+
+_pendientes = threading.local()
+
+
+def marcar_dias(dias):
+    """Agenda el recálculo de `dias` (fechas locales) al confirmar la transacción."""
+    dias = {d for d in dias if d is not None}
+    if not dias:
+        return
+    pendientes = getattr(_pendientes, 'dias', None)
+    if pendientes is None:
+        pendientes = _pendientes.dias = set()
+    pendientes |= dias
+    # Se registra en cada llamada: si una transacción anterior hizo rollback su
+    # callback no corrió, y los días que dejó se aprovechan en este.
+    transaction.on_commit(_recalcular_pendientes)
+
+
+def _recalcular_pendientes():
+    dias = getattr(_pendientes, 'dias', None)
+    if not dias:
+        return
+    _pendientes.dias = set()
+    recalcular(min(dias), max(dias))
+
+
+# ─────────────────────────────────────────────
+# Recálculo
+# ─────────────────────────────────────────────
+
+def _filas(registros):
+    """Instancias ResumenDiarioTransporte agregadas desde un queryset de RegistroSalida."""
+    return [
+        ResumenDiarioTransporte(**valores)
+        for valores in (
+            registros
+            .values(
+                'ruta_id', 'tipo_movimiento',
+                fecha         = TruncDate('fecha_registro'),
+                tipo_vehiculo = F('vehiculo__tipo'),
+            )
+            .annotate(
+                viajes         = Count('id'),
+                costo          = Sum('valor_viaje'),
+                pasajeros      = Sum('cantidad_pasajeros'),
+                capacidad      = Sum('vehiculo__capacidad'),
+                suma_ocupacion = Sum('ocupacion_porcentaje'),
+            )
+            .order_by()
+        )
+    ]
+
+
+def recalcular(desde=None, hasta=None):
+    """
+    Reescribe ResumenDiarioTransporte entre desde y hasta (días locales,
+    inclusive). Sin `desde`, desde el primer viaje; sin `hasta`, hasta el
+    último. Si el tramo toca la cobertura, la extiende hasta `desde`.
+    Devuelve la cantidad de filas escritas.
+    """
+    registros = RegistroSalida.objects.all()
+    resumen   = ResumenDiarioTransporte.objects.all()
+    if desde is not None:
+        registros = registros.filter(fecha_registro__gte=limites_dias(desde, desde)[0])
+        resumen   = resumen.filter(fecha__gte=desde)
+    if hasta is not None:
+        registros = registros.filter(fecha_registro__lt=limites_dias(hasta, hasta)[1])
+        resumen   = resumen.filter(fecha__lte=hasta)
+
+    # Dos recálculos concurrentes del mismo día chocan en la clave única al
+    # insertar; el reintento ya ve las filas del otro y las reemplaza.
+    for intento in range(2):
+        try:
+            with transaction.atomic():
+                filas = _filas(registros)
+                resumen.delete()
+                if usa_copy():
+                    copiar_objetos(filas)
+                else:
+                    ResumenDiarioTransporte.objects.bulk_create(filas, batch_size=BATCH_SIZE)
+                _extender_cobertura(desde, hasta)
+            return len(filas)
+        except IntegrityError:
+            if intento:
+                raise
+
+
+def _extender_cobertura(desde, hasta):
+    desde     = desde or date.min
+    cobertura = CoberturaResumenTransporte.objects.select_for_update().first()
+    if cobertura is None:
+        # Sin cobertura previa solo un recálculo hasta el final deja todo completo desde `desde`
+        if hasta is None:
+            CoberturaResumenTransporte.objects.create(desde=desde)
+        return
+    # Un tramo suelto antes de la cobertura deja un hueco: no la mueve
+    if desde < cobertura.desde and (hasta is None or hasta >= cobertura.desde - timedelta(days=1)):
+        cobertura.desde = desde
+        cobertura.save(update_fields=['desde'])
+
+
+def resumen_completo(desde):
+    """True si ResumenDiarioTransporte tiene todos los días a partir de `desde`."""
+    return CoberturaResumenTransporte.objects.filter(desde__lte=desde).exists()
+
+
+def asegurar_cobertura():
+    """
+    Resume los días anteriores a la cobertura (o todos, si no hay) para que
+    llegue hasta el primer viaje. No hace nada si ya llega. Devuelve la
+    cantidad de filas escritas.
+    """
+    cobertura = CoberturaResumenTransporte.objects.values_list('desde', flat=True).first()
+    primero   = RegistroSalida.objects.aggregate(m=Min('fecha_registro'))['m']
+    if cobertura is not None and (primero is None or cobertura <= dia_local(primero)):
+        return 0
+    return recalcular(hasta=cobertura - timedelta(days=1) if cobertura else None)
+
+
+def contar_viajes(inicio, fin):
+    """
+    Viajes entre los días inicio y fin (inclusive): la parte cubierta se suma
+    del resumen y solo los días anteriores a la cobertura se cuentan sobre
+    RegistroSalida (por el índice de fecha_registro).
+    """
+    cobertura = CoberturaResumenTransporte.objects.values_list('desde', flat=True).first()
+    total     = 0
+    if cobertura is not None and cobertura <= fin:
+        total += ResumenDiarioTransporte.objects.filter(
+            fecha__range=[max(inicio, cobertura), fin]
+        ).aggregate(n=Sum('viajes'))['n'] or 0
+        if cobertura <= inicio:
+            return total
+        fin = cobertura - timedelta(days=1)
+    desde, hasta = limites_dias(inicio, fin)
+    return total + RegistroSalida.objects.filter(fecha_registro__gte=desde, fecha_registro__lt=hasta).count()
+
+
+# ─────────────────────────────────────────────
+# Lectura para el dashboard
+# ─────────────────────────────────────────────
+
+# Bits de GROUPING(semana, tipo, ruta) de cada conjunto: 1 = columna no agrupada
+_CONJUNTOS = {0b011: 'semana', 0b101: 'tipo', 0b110: 'ruta'}
+
+
+def _totales_grouping_sets(inicio, fin):
+    qn      = connection.ops.quote_name
+    resumen = qn(ResumenDiarioTransporte._meta.db_table)
+    rutas   = qn(Ruta._meta.db_table)
+    filtro, params = ("WHERE t.fecha BETWEEN %s AND %s", [inicio, fin]) if inicio and fin else ("", [])
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT GROUPING(semana, tipo, ruta), semana, tipo, ruta,
+                   SUM(viajes), SUM(costo)::bigint, SUM(pasajeros), SUM(suma_ocupacion)
+            FROM (
+                SELECT date_trunc('week', t.fecha::timestamp)::date AS semana, t.tipo_vehiculo AS tipo, r.nombre AS ruta,
+                       t.viajes, t.costo, t.pasajeros, t.suma_ocupacion
+                FROM {resumen} t JOIN {rutas} r ON r.id = t.ruta_id
+                {filtro}
+            ) x
+            GROUP BY GROUPING SETS ((semana), (tipo), (ruta))
+        """, params)
+        totales = {d: {} for d in _CONJUNTOS.values()}
+        for grupo, semana, tipo, ruta, *sumas in cursor.fetchall():
+            dimension = _CONJUNTOS[grupo]
+            clave     = {'semana': semana, 'tipo': tipo, 'ruta': ruta}[dimension]
+            totales[dimension][clave] = sumas
+    return totales
+
+
+def _totales_group_by(inicio, fin):
+    resumen = ResumenDiarioTransporte.objects.all()
+    if inicio and fin:
+        resumen = resumen.filter(fecha__range=[inicio, fin])
+
+    totales = {d: defaultdict(lambda: [0, 0, 0, 0.0]) for d in _CONJUNTOS.values()}
+    filas = (
+        resumen
+        .values_list(TruncWeek('fecha'), 'tipo_vehiculo', 'ruta__nombre')
+        .annotate(Sum('viajes'), Sum('costo'), Sum('pasajeros'), Sum('suma_ocupacion'))
+        .order_by()
+    )
+    for semana, tipo, ruta, *sumas in filas:
+        for dimension, clave in (('semana', semana), ('tipo', tipo), ('ruta', ruta)):
+            acumulado = totales[dimension][clave]
+            for i, valor in enumerate(sumas):
+                acumulado[i] += valor
+    return {d: dict(t) for d, t in totales.items()}
+
+
+def totales_dashboard(inicio=None, fin=None):
+    """
+    Sumas [viajes, costo, pasajeros, suma_ocupacion] del resumen entre inicio
+    y fin (todo si falta alguno), por dimensión:
+    {'semana': {lunes: sumas}, 'tipo': {tipo_vehiculo: sumas}, 'ruta': {nombre: sumas}}.
+    Siempre una sola consulta.
+    """
+    if connection.vendor == 'postgresql':
+        return _totales_grouping_sets(inicio, fin)
+    return _totales_group_by(inicio, fin)
@@ -0,0 +1,75 @@
+"""
+Resumen diario de los registros GREX (RegistroTransporteExcel).
+
+ResumenDiarioTransporteExcel guarda, por día, sector y turno, los viajes,
+el costo y los pasajeros ya sumados sobre los tipos de máquina. El
+importador (transporte.services) lo reescribe para los días que cambió, así
+la API por sector y turno suma filas de resumen y nunca recorre los
+registros crudos.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+
+from core.bulk import copiar_objetos, usa_copy
+
+from .models import RegistroTransporteExcel, ResumenDiarioTransporteExcel
+
+
+BATCH_SIZE = 1000
+
+
+def recalcular(desde=None, hasta=None):
+    """
+    Reescribe ResumenDiarioTransporteExcel entre desde y hasta (inclusive;
+    sin límites, todo). Devuelve la cantidad de filas escritas.
+    """
+    registros = RegistroTransporteExcel.objects.all()
+    resumen   = ResumenDiarioTransporteExcel.objects.all()
+    if desde is not None:
+        registros = registros.filter(fecha__gte=desde)
+        resumen   = resumen.filter(fecha__gte=desde)
+    if hasta is not None:
+        registros = registros.filter(fecha__lte=hasta)
+        resumen   = resumen.filter(fecha__lte=hasta)
+
+    # Dos recálculos concurrentes del mismo día chocan en la clave única al
+    # insertar; el reintento ya ve las filas del otro y las reemplaza.
+    for intento in range(2):
+        try:
+            with transaction.atomic():
+                filas = [
+                    ResumenDiarioTransporteExcel(**valores)
+                    for valores in (
+                        registros
+                        .values('fecha', 'sector', 'turno')
+                        .annotate(
+                            viajes    = Sum('viajes'),
+                            costo     = Sum('tarifa'),
+                            pasajeros = Sum('n_pasajeros'),
+                        )
+                        .order_by()
+                    )
+                ]
+                resumen.delete()
+                if usa_copy():
+                    copiar_objetos(filas)
+                else:
+                    ResumenDiarioTransporteExcel.objects.bulk_create(filas, batch_size=BATCH_SIZE)
+            return len(filas)
+        except IntegrityError:
+            if intento:
+                raise
+
+
+def totales_por_sector_turno(inicio, fin):
+    """
+    [{'sector', 'turno', 'viajes', 'costo', 'pasajeros'}] entre inicio y fin
+    (inclusive), ordenado por sector y turno. Una sola consulta al resumen.
+    """
+    return list(
+        ResumenDiarioTransporteExcel.objects
+        .filter(fecha__range=[inicio, fin])
+        .values('sector', 'turno')
+        .annotate(viajes=Sum('viajes'), costo=Sum('costo'), pasajeros=Sum('pasajeros'))
+        .order_by('sector', 'turno')
+    )
@@ -0,0 +1,227 @@
+"""
+Importador de la planilla de transporte GREX a RegistroTransporteExcel.
+
+La planilla (FECHA, TURNO, RUTA, TIPO, TARIFA, PAX y, si viene, HORARIO) se
+lee en streaming con core.lectores, por tramos de LOTE_LECTURA filas que se
+limpian con pandas (transporte.limpieza: los mismos criterios que
+cargar_historico). Trae un servicio por fila y varios servicios comparten
+fecha, turno, sector y tipo de máquina: cada clave se guarda una sola vez
+con los viajes, la tarifa y los pasajeros sumados.
+
+La escritura es un upsert masivo sobre esa clave (COPY + ON CONFLICT en
+Postgres) y solo de las claves nuevas o con valores distintos, así que subir
+de nuevo el mismo archivo, o uno corregido, deja la tabla como una sola
+carga. Al final se recalcula el resumen diario de los días que cambiaron.
+"""
+from itertools import islice
+
+import pandas as pd
+from django.db import connection, transaction
+
+from core.bulk import upsert_con_copy, usa_copy
+from core.lectores import EncabezadoNoEncontrado, abrir_tabla
+
+from .limpieza import cantidades, dias, montos, normalizar_rutas, textos, tipos_vehiculo
+from .models import RegistroTransporteExcel
+from .resumen_excel import recalcular
+
+
+BATCH_SIZE   = 1000
+LOTE_LECTURA = 5000        # filas de la planilla que se limpian juntas
+
+COLUMNAS_OBLIGATORIAS = ['FECHA', 'TURNO', 'RUTA', 'TIPO', 'TARIFA', 'PAX']
+COLUMNAS              = COLUMNAS_OBLIGATORIAS + ['HORARIO']
+
+CLAVE   = ['fecha', 'turno', 'sector', 'tipo_maquina']
+VALORES = ['horario', 'tarifa', 'n_pasajeros', 'viajes']
+
+
+def abrir_planilla_transporte(archivo_file):
+    """Tabla de la planilla GREX de transporte (core.lectores), con el encabezado ya ubicado."""
+    try:
+        return abrir_tabla(archivo_file, requeridas=COLUMNAS_OBLIGATORIAS)
+    except EncabezadoNoEncontrado as e:
+        raise ValueError(
+            f"El archivo no tiene la columna obligatoria '{e.faltantes[0]}'. "
+            "Verifica que sea la planilla de transporte de GREX."
+        )
+
+
+def _tramos(tabla):
+    """DataFrames de hasta LOTE_LECTURA filas; el índice es el número de fila en el Excel."""
+    filas = tabla.filas(COLUMNAS)
+    while tramo := list(islice(filas, LOTE_LECTURA)):
+        yield pd.DataFrame([v for _, v in tramo], index=[n for n, _ in tramo], columns=COLUMNAS)
+
+
+def _limpiar_tramo(df, arrastre):
+    """
+    Columnas del modelo para un tramo. FECHA y TURNO vienen solo en la
+    primera fila de cada bloque: se arrastran hacia abajo, también desde el
+    tramo anterior (`arrastre`, que se actualiza).
+    """
+    for col in ('FECHA', 'TURNO'):
+        df[col] = df[col].astype(object).ffill()
+        if arrastre.get(col) is not None:
+            df[col] = df[col].fillna(arrastre[col])
+        if df[col].notna().iloc[-1]:
+            arrastre[col] = df[col].iloc[-1]
+
+    horario = df['HORARIO'].astype('string').str.strip()
+    return pd.DataFrame({
+        'fecha'       : dias(df['FECHA']).dt.date,
+        'turno'       : textos(df['TURNO']).fillna(''),
+        'sector'      : normalizar_rutas(df['RUTA']),
+        'tipo_maquina': tipos_vehiculo(df['TIPO']),
+        'horario'     : horario.mask(horario == ''),
+        'tarifa'      : montos(df['TARIFA']),
+        'n_pasajeros' : cantidades(df['PAX']),
+    })
+
+
+def _leer_servicios(tabla, errores):
+    """
+    {clave: [horario, tarifa, n_pasajeros, viajes]} sumando los servicios de
+    la planilla con la misma CLAVE, y la cantidad de filas omitidas (sin ruta).
+    """
+    servicios = {}
+    omitidos  = 0
+    arrastre  = {}
+    for df in _tramos(tabla):
+        limpio    = _limpiar_tramo(df, arrastre)
+        con_ruta  = limpio['sector'].notna()
+        sin_fecha = con_ruta & limpio['fecha'].isna()
+        omitidos += int((~con_ruta).sum())
+        for n_fila, valor in df.loc[sin_fecha, 'FECHA'].items():
+            errores.append(f"Fila {n_fila}: fecha inválida ({valor})")
+
+        grupos = (
+            limpio[con_ruta & ~sin_fecha]
+            .groupby(CLAVE, sort=False)
+            .agg(
+                horario     = ('horario', 'first'),
+                tarifa      = ('tarifa', 'sum'),
+                n_pasajeros = ('n_pasajeros', 'sum'),
+                viajes      = ('tarifa', 'size'),
+            )
+        )
+        for clave, horario, tarifa, pax, viajes in grupos.itertuples():
+            horario   = None if pd.isna(horario) else horario
+            acumulado = servicios.get(clave)
+            if acumulado is None:
+                servicios[clave] = [horario, int(tarifa), int(pax), int(viajes)]
+            else:
+                acumulado[0]  = acumulado[0] or horario
+                acumulado[1] += int(tarifa)
+                acumulado[2] += int(pax)
+                acumulado[3] += int(viajes)
+    return servicios, omitidos
+
+
+def _existentes(fechas):
+    """{clave: (id, [horario, tarifa, n_pasajeros, viajes])} ya guardados entre las fechas del archivo."""
+    if not fechas:
+        return {}
+    return {
+        tuple(fila[1:5]): (fila[0], list(fila[5:]))
+        for fila in (
+            RegistroTransporteExcel.objects
+            .filter(fecha__range=[min(fechas), max(fechas)])
+            .values_list('id', *CLAVE, *VALORES)
+            .order_by()
+        )
+    }
+
+
+def _guardar_lote(objs, existentes):
+    """
+    Upsert de un lote sobre CLAVE: en Postgres por COPY a una tabla temporal
+    + INSERT ... ON CONFLICT; con otro backend con ON CONFLICT, el upsert del
+    ORM; si no, nuevos con bulk_create y existentes con bulk_update.
+    """
+    if usa_copy():
+        upsert_con_copy(objs, CLAVE, VALORES)
+        return
+
+    if connection.features.supports_update_conflicts_with_target:
+        RegistroTransporteExcel.objects.bulk_create(
+            objs,
+            batch_size       = BATCH_SIZE,
+            update_conflicts = True,
+            unique_fields    = CLAVE,
+            update_fields    = VALORES,
+        )
+        return
+
+    actualizar = []
+    for o in objs:
+        previo = existentes.get(tuple(getattr(o, c) for c in CLAVE))
+        if previo:
+            o.pk = previo[0]
+            actualizar.append(o)
+    RegistroTransporteExcel.objects.bulk_create([o for o in objs if o.pk is None], batch_size=BATCH_SIZE)
+    RegistroTransporteExcel.objects.bulk_update(actualizar, VALORES, batch_size=BATCH_SIZE)
+
+
+def procesar_transporte_excel(archivo_file):
+    """
+    Lee la planilla GREX de transporte y hace upsert en RegistroTransporteExcel.
+
+    Returns:
+        dict con claves: filas (servicios leídos), creados, actualizados,
+        sin_cambios (claves), omitidos (filas sin ruta), errores (lista),
+        fecha_desde y fecha_hasta (rango de la planilla)
+    """
+    errores = []
+    with abrir_planilla_transporte(archivo_file) as tabla:
+        servicios, omitidos = _leer_servicios(tabla, errores)
+
+    fechas = {clave[0] for clave in servicios}
+    creados, actualizados, sin_cambios = 0, 0, 0
+    with transaction.atomic():
+        existentes = _existentes(fechas)
+
+        objs = []
+        for clave, valores in servicios.items():
+            previo = existentes.get(clave)
+            if previo and previo[1] == valores:
+                sin_cambios += 1
+                continue
+            if previo:
+                actualizados += 1
+            else:
+                creados += 1
+            objs.append(RegistroTransporteExcel(**dict(zip(CLAVE, clave)), **dict(zip(VALORES, valores))))
+
+        for i in range(0, len(objs), BATCH_SIZE):
+            _guardar_lote(objs[i:i + BATCH_SIZE], existentes)
+
+        # El upsert no dispara señales: el resumen de los días tocados se recalcula acá
+        if objs:
+            cambiados = [o.fecha for o in objs]
+            recalcular(min(cambiados), max(cambiados))
+
+    return {
+        'filas'       : sum(v[3] for v in servicios.values()),
+        'creados'     : creados,
+        'actualizados': actualizados,
+        'sin_cambios' : sin_cambios,
+        'omitidos'    : omitidos,
+        'errores'     : errores,
+        'fecha_desde' : min(fechas, default=None),
+        'fecha_hasta' : max(fechas, default=None),
+    }
+
+
+def procesar_carga(carga):
+    """Punto de entrada de la cola (core.cargas) para cargas tipo TRANSPORTE."""
+    with carga.archivo.open('rb') as archivo:
+        resultado = procesar_transporte_excel(archivo)
+    resultado['mensaje'] = (
+        f"Servicios: {resultado['filas']} | "
+        f"Nuevos: {resultado['creados']} | "
+        f"Actualizados: {resultado['actualizados']} | "
+        f"Sin cambios: {resultado['sin_cambios']} | "
+        f"Omitidos: {resultado['omitidos']}"
+    )
+    return resultado
@@ -1,3 +1,470 @@
-from django.test import TestCase
+import json
+import re
+import tempfile
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from openpyxl import Workbook, load_workbook
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.paginacion import paginar
+
+from .models import (
+    CoberturaResumenTransporte, Conductor, RegistroSalida, RegistroTransporteExcel, ResumenDiarioTransporte,
+    ResumenDiarioTransporteExcel, Ruta, Vehiculo,
+)
+from .resumen import asegurar_cobertura, recalcular, resumen_completo
+from .services import procesar_transporte_excel
+from .views import api_datos_dashboard, api_transporte_excel, exportar_excel_transporte
+
+
+def filas_resumen():
+    return list(
+        ResumenDiarioTransporte.objects.order_by('fecha', 'ruta', 'tipo_vehiculo', 'tipo_movimiento')
+        .values_list('fecha', 'ruta', 'tipo_vehiculo', 'tipo_movimiento', 'viajes', 'costo', 'pasajeros', 'capacidad')
+    )
+
+
+class ApiDatosDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        conductor = Conductor.objects.create(nombre='CHOFER', rut='1-9')
+        bus       = Vehiculo.objects.create(patente='BUS1', tipo='BUS', capacidad=40)
+        van       = Vehiculo.objects.create(patente='VAN1', tipo='VAN', capacidad=10)
+        norte     = Ruta.objects.create(nombre='NORTE', destino='Norte')
+        sur       = Ruta.objects.create(nombre='SUR', destino='Sur')
+
+        viajes = [
+            # (día, vehículo, ruta, pasajeros, valor)
+            (datetime(2025, 3, 3, 7, 30),  bus, norte, 20, 40000),
+            (datetime(2025, 3, 4, 23, 30), bus, sur,   10, 40000),
+            (datetime(2025, 3, 5, 16, 30), van, norte,  5, 15000),
+            (datetime(2025, 3, 12, 7, 30), van, sur,   10, 20000),
+        ]
+        for fecha, vehiculo, ruta, pax, valor in viajes:
+            RegistroSalida.objects.create(
+                fecha_registro=timezone.make_aware(fecha), ruta=ruta, vehiculo=vehiculo,
+                conductor=conductor, cantidad_pasajeros=pax, valor_viaje=valor,
+            )
+        # En TestCase los on_commit no corren: el resumen se arma a mano
+        recalcular()
+
+    def _api(self, **params):
+        request      = RequestFactory().get('/transporte/api/datos/', params)
+        request.user = self.admin
+        return api_datos_dashboard(request)
+
+    def test_una_sola_consulta(self):
+        with self.assertNumQueries(1):
+            self._api()
+        with self.assertNumQueries(1):
+            self._api(inicio='2025-03-01', fin='2025-03-31')
+
+    def test_graficos(self):
+        datos = json.loads(self._api().content)
+        self.assertEqual(datos['curva_costos'], [
+            {'mes': 'Semana 03/03', 'total': 95000},
+            {'mes': 'Semana 10/03', 'total': 20000},
+        ])
+        self.assertEqual(datos['ocupacion_tipo'], [
+            {'vehiculo__tipo': 'BUS', 'avg_ocupacion': 37.5},
+            {'vehiculo__tipo': 'VAN', 'avg_ocupacion': 75.0},
+        ])
+        self.assertEqual(datos['costo_tipo'], [
+            {'vehiculo__tipo': 'BUS', 'total_costo': 80000},
+            {'vehiculo__tipo': 'VAN', 'total_costo': 35000},
+        ])
+        self.assertEqual(datos['cpp_general'], round(115000 / 45))
+        self.assertEqual(datos['cpp_tipo'], [{'label': 'BUS', 'value': 2667}, {'label': 'VAN', 'value': 2333}])
+        self.assertEqual(datos['costo_ruta'], [
+            {'ruta__nombre': 'SUR', 'total': 60000},
+            {'ruta__nombre': 'NORTE', 'total': 55000},
+        ])
+        self.assertEqual(datos['cpp_ruta'], [{'label': 'SUR', 'value': 3000}, {'label': 'NORTE', 'value': 2200}])
+
+    def test_rango(self):
+        datos = json.loads(self._api(inicio='2025-03-10', fin='2025-03-16').content)
+        self.assertEqual(datos['curva_costos'], [{'mes': 'Semana 10/03', 'total': 20000}])
+        self.assertEqual(datos['costo_ruta'], [{'ruta__nombre': 'SUR', 'total': 20000}])
+        self.assertEqual(datos['cpp_general'], 2000)
+
+    def test_resumen_se_actualiza_al_guardar(self):
+        registro = RegistroSalida.objects.get(vehiculo__patente='VAN1', ruta__nombre='NORTE')
+        registro.cantidad_pasajeros = 8
+        with self.captureOnCommitCallbacks(execute=True):
+            registro.save()
+            RegistroSalida.objects.filter(ruta__nombre='SUR', vehiculo__patente='VAN1').delete()
+        incremental = filas_resumen()
+        recalcular()
+        self.assertEqual(incremental, filas_resumen())
+        self.assertEqual(sum(f[4] for f in incremental), 3)
+
+    def test_exportar_excel_del_rango(self):
+        request         = RequestFactory().get('/transporte/exportar/', {'inicio': '2025-03-03', 'fin': '2025-03-05'})
+        request.user    = self.admin
+        request.session = {}
+        response = exportar_excel_transporte(request)
+        libro    = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        filas    = list(libro.active.iter_rows(values_only=True))
+
+        self.assertEqual(filas[0][:3], ('ID', 'Fecha y Hora', 'Movimiento'))
+        self.assertEqual(len(filas), 4)                    # el viaje del 12/03 queda fuera del rango
+        self.assertEqual(filas[1][1], '05/03/2025 16:30')  # más reciente primero, en hora local
+        self.assertEqual(filas[1][3:6], ('VAN1', 'Van', 10))
+        self.assertEqual(filas[1][12:16], (5, '50%', '$15000', '$3000'))
+
+
+class ControlSalidaPaginacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        conductor = Conductor.objects.create(nombre='CHOFER', rut='1-9')
+        vehiculo  = Vehiculo.objects.create(patente='BUS1', tipo='BUS', capacidad=40)
+        ruta      = Ruta.objects.create(nombre='NORTE', destino='Norte')
+        base      = timezone.make_aware(datetime(2025, 3, 3, 7, 30))
+        # Cada hora repetida 3 veces: el orden dentro de una misma fecha lo da el id
+        for i in range(25):
+            RegistroSalida.objects.create(
+                fecha_registro=base + timedelta(hours=i // 3), ruta=ruta, vehiculo=vehiculo,
+                conductor=conductor, cantidad_pasajeros=10,
+            )
+        cls.orden = list(RegistroSalida.objects.order_by('-fecha_registro', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _pagina(self, **params):
+        return self.client.get(reverse('control_salida'), {'page_size': 10, **params}).context['page_obj']
+
+    def test_recorre_todo_en_orden(self):
+        paginas = [self._pagina()]
+        while paginas[-1].siguiente:
+            paginas.append(self._pagina(despues=paginas[-1].siguiente))
+        self.assertEqual([r.id for p in paginas for r in p], self.orden)
+        self.assertEqual([len(p) for p in paginas], [10, 10, 5])
+        self.assertIsNone(paginas[0].anterior)
+
+        # Y de vuelta hacia lo más nuevo, página a página
+        atras = [paginas[-1]]
+        while atras[-1].anterior:
+            atras.append(self._pagina(antes=atras[-1].anterior))
+        self.assertEqual([[r.id for r in p] for p in atras], [[r.id for r in p] for p in reversed(paginas)])
+
+    def test_pagina_en_una_consulta(self):
+        cursor = self._pagina().siguiente
+        qs     = RegistroSalida.objects.select_related('vehiculo', 'ruta', 'conductor')
+        with self.assertNumQueries(1):
+            ids = [r.id for r in paginar(qs, 'fecha_registro', 10, despues=cursor)]
+        self.assertEqual(ids, self.orden[10:20])
+
+    def test_cursor_invalido_vuelve_al_inicio(self):
+        self.assertEqual([r.id for r in self._pagina(despues='basura')], self.orden[:10])
+
+    def test_salidas_nuevas(self):
+        ultimo = max(self.orden)
+        url    = reverse('api_salidas_nuevas')
+        self.assertEqual(
+            json.loads(self.client.get(url, {'desde': ultimo}).content), {'ultimo_id': ultimo, 'hay_mas': False, 'filas': []},
+        )
+
+        nuevo = RegistroSalida.objects.create(
+            ruta=Ruta.objects.get(), vehiculo=Vehiculo.objects.get(), conductor=Conductor.objects.get(), cantidad_pasajeros=7,
+        )
+        datos = json.loads(self.client.get(url, {'desde': ultimo}).content)
+        self.assertEqual(datos['ultimo_id'], nuevo.id)
+        self.assertEqual(len(datos['filas']), 1)
+        self.assertIn(f'data-id="{nuevo.id}"', datos['filas'][0])
+
+    def test_salidas_nuevas_se_ponen_al_dia(self):
+        # 120 viajes entre dos consultas: llegan todos, en tandas de LIMITE_SALIDAS_NUEVAS
+        ultimo = max(self.orden)
+        RegistroSalida.objects.bulk_create([
+            RegistroSalida(
+                ruta=Ruta.objects.get(), vehiculo=Vehiculo.objects.get(), conductor=Conductor.objects.get(),
+                cantidad_pasajeros=i, fecha_registro=timezone.now(),
+            )
+            for i in range(120)
+        ])
+        nuevos = set(RegistroSalida.objects.filter(id__gt=ultimo).values_list('id', flat=True))
+
+        recibidos, tandas, hay_mas = [], 0, True
+        while hay_mas:
+            datos = json.loads(self.client.get(reverse('api_salidas_nuevas'), {'desde': ultimo}).content)
+            recibidos += [int(re.search(r'data-id="(\d+)"', f).group(1)) for f in datos['filas']]
+            ultimo, hay_mas, tandas = datos['ultimo_id'], datos['hay_mas'], tandas + 1
+        self.assertEqual(tandas, 3)
+        self.assertEqual(sorted(recibidos), sorted(nuevos))
+        self.assertEqual(ultimo, max(nuevos))
+
+
+class DashboardPaginacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        conductor = Conductor.objects.create(nombre='CHOFER', rut='1-9')
+        vehiculo  = Vehiculo.objects.create(patente='BUS1', tipo='BUS', capacidad=40)
+        ruta      = Ruta.objects.create(nombre='NORTE', destino='Norte')
+        # 3.500 viajes entre marzo y abril: antes quedaban fuera los posteriores a los primeros 3.000
+        base = timezone.make_aware(datetime(2025, 3, 1))
+        RegistroSalida.objects.bulk_create([
+            RegistroSalida(
+                fecha_registro=base + timedelta(minutes=25 * i), ruta=ruta, vehiculo=vehiculo,
+                conductor=conductor, cantidad_pasajeros=10,
+            )
+            for i in range(3500)
+        ])
+        recalcular()
+        cls.en_marzo = list(
+            RegistroSalida.objects.filter(fecha_registro__date__range=['2025-03-01', '2025-03-31'])
+            .order_by('-fecha_registro', '-id').values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _get(self, **params):
+        return self.client.get(reverse('dashboard_transporte'), {'inicio': '2025-03-01', 'fin': '2025-03-31', 'page_size': 100, **params})
+
+    def test_recorre_todo_el_rango(self):
+        respuesta, ids, paginas = self._get(), [], 0
+        while True:
+            paginas += 1
+            ids += [r.id for r in respuesta.context['page_obj']]
+            self.assertEqual(respuesta.context['pagina'], paginas)
+            siguiente = respuesta.context['page_obj'].siguiente
+            if not siguiente:
+                break
+            respuesta = self._get(despues=siguiente)
+        self.assertEqual(ids, self.en_marzo)
+        self.assertEqual(respuesta.context['total'], len(self.en_marzo))
+        self.assertEqual(respuesta.context['paginas'], paginas)
+
+    def test_total_sin_count(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self._get()
+        self.assertEqual(respuesta.context['total'], len(self.en_marzo))
+        self.assertFalse([c for c in consultas.captured_queries if 'COUNT(' in c['sql'].upper()])
+
+    def test_numero_de_pagina_sale_del_servidor(self):
+        cursores = [self._get().context['page_obj'].siguiente]
+        for _ in range(3):
+            cursores.append(self._get(despues=cursores[-1]).context['page_obj'].siguiente)
+        # El contador del cliente se ignora, y de vuelta con "antes" también se numera bien
+        quinta = self._get(despues=cursores[-1], pagina=99)
+        self.assertEqual(quinta.context['pagina'], 5)
+        cuarta = self._get(antes=quinta.context['page_obj'].anterior)
+        self.assertEqual(cuarta.context['pagina'], 4)
+        self.assertEqual([r.id for r in cuarta.context['page_obj']], self.en_marzo[300:400])
+
+    def test_numero_de_pagina_cuenta_solo_un_dia(self):
+        cursor = self._get().context['page_obj'].siguiente
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self._get(despues=cursor).context['pagina'], 2)
+        # Un único COUNT, el del día en que empieza la página; el resto sale del resumen
+        self.assertEqual(len([c for c in consultas.captured_queries if 'COUNT(' in c['sql'].upper()]), 1)
+
+    def test_resumen_parcial_cuenta_registros(self):
+        # Resumen reconstruido solo desde el 15: la primera quincena de marzo no tiene filas
+        ResumenDiarioTransporte.objects.all().delete()
+        CoberturaResumenTransporte.objects.all().delete()
+        recalcular(date(2025, 3, 15))
+        self.assertEqual(self._get().context['total'], len(self.en_marzo))
+        desde_el_15 = RegistroSalida.objects.filter(fecha_registro__date__range=['2025-03-15', '2025-03-31']).count()
+        self.assertEqual(self._get(inicio='2025-03-15').context['total'], desde_el_15)
+
+    def test_cobertura_solo_crece_sin_huecos(self):
+        CoberturaResumenTransporte.objects.all().delete()
+        recalcular(date(2025, 3, 1), date(2025, 3, 10))          # sin cobertura previa ni hasta el final
+        self.assertFalse(resumen_completo(date(2025, 3, 1)))
+
+        recalcular(date(2025, 3, 20))
+        recalcular(date(2025, 3, 1), date(2025, 3, 10))          # deja un hueco del 11 al 19
+        self.assertFalse(resumen_completo(date(2025, 3, 1)))
+        self.assertTrue(resumen_completo(date(2025, 3, 20)))
+
+        recalcular(date(2025, 3, 5), date(2025, 3, 19))
+        self.assertTrue(resumen_completo(date(2025, 3, 5)))
+        self.assertFalse(resumen_completo(date(2025, 3, 4)))
+
+    def test_si_falta_completa_hasta_el_primer_viaje(self):
+        ResumenDiarioTransporte.objects.all().delete()
+        CoberturaResumenTransporte.objects.all().delete()
+        recalcular(date(2025, 3, 20))
+        call_command('reconstruir_resumen_transporte', '--si-falta', stdout=StringIO())
+        self.assertTrue(resumen_completo(date(2025, 3, 1)))
+        completo = filas_resumen()
+        recalcular()
+        self.assertEqual(completo, filas_resumen())
+
+        self.assertEqual(asegurar_cobertura(), 0)                # ya llega al primer viaje
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self._get().context['total'], len(self.en_marzo))
+        self.assertFalse([c for c in consultas.captured_queries if 'COUNT(' in c['sql'].upper()])
+
+
+HISTORICO = """FECHA;TURNO;RUTA;TIPO;TARIFA;PAX
+03-03-2025;TURNO 1;Curicó 2;BUS;$126.000;21
+;;teno centro;VAN;;17
+04-03-2025;TURNO 3;Molina;MINIBUS;50000;-1
+xx;TURNO 2;Rauco;BUS;1000;5
+;;;BUS;1000;5
+"""
+
+
+class CargarHistoricoTests(TestCase):
+
+    def setUp(self):
+        Vehiculo.objects.create(patente='HIST-VAN', tipo='VAN', capacidad=17, tarifa_base=30000)
+        archivo = tempfile.NamedTemporaryFile(suffix='.csv')
+        archivo.write(HISTORICO.encode('utf-8'))
+        archivo.flush()
+        self.addCleanup(archivo.close)
+        self.ruta_archivo = archivo.name
+
+    def _cargar(self, *opciones):
+        salida = StringIO()
+        with redirect_stdout(salida):
+            call_command('cargar_historico', self.ruta_archivo, *opciones)
+        return salida.getvalue()
+
+    def test_carga_y_resumen(self):
+        salida = self._cargar()
+        self.assertEqual(
+            sorted(
+                (timezone.localtime(r.fecha_registro).strftime('%d/%m %H:%M'), r.ruta.nombre, r.vehiculo.patente,
+                 r.valor_viaje, r.ocupacion_porcentaje)
+                for r in RegistroSalida.objects.select_related('ruta', 'vehiculo')
+            ),
+            [
+                ('03/03 07:30', 'CURICO 2', 'HIST-BUS', 126000, 50.0),
+                ('03/03 07:30', 'TENO 1', 'HIST-VAN', 30000, 100.0),     # sin tarifa: la del vehículo
+            ],
+        )
+        self.assertIn('Cantidad de pasajeros negativa', salida)
+        self.assertIn('Fecha inválida', salida)
+
+        # bulk_create no dispara las señales: el comando recalcula el resumen del rango
+        cargado = filas_resumen()
+        self.assertTrue(resumen_completo(date(2025, 3, 3)))
+        recalcular()
+        self.assertEqual(cargado, filas_resumen())
+
+    def test_dry_run_no_deja_cambios(self):
+        self.assertIn('DRY RUN', self._cargar('--dry-run'))
+        self.assertFalse(RegistroSalida.objects.exists())
+        self.assertFalse(ResumenDiarioTransporte.objects.exists())
+
+
+def planilla_grex(filas):
+    """xlsx en memoria con el encabezado de la planilla de transporte GREX."""
+    libro = Workbook()
+    hoja  = libro.active
+    hoja.append(['FECHA', 'TURNO', 'RUTA', 'TIPO', 'TARIFA', 'PAX'])
+    for fila in filas:
+        hoja.append(fila)
+    archivo = BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+class ImportadorTransporteExcelTests(TestCase):
+
+    FILAS = [
+        # FECHA y TURNO solo en la primera fila de cada bloque, como en GREX
+        (datetime(2025, 3, 3), 'TURNO 1', 'Curicó centro', 'BUS',     '$45.000', 30),
+        (None,                 None,      'CURICO 1',      'BUS',     45000,     20),
+        (None,                 None,      'Teno',          'MINIBUS', 30000,     12),
+        (None,                 None,      None,            None,      None,      None),
+        ('04-03-2025',         'TURNO 2', 'MOLINA',        'VAN',     18000,     8),
+        ('no es fecha',        'TURNO 2', 'MOLINA',        'VAN',     18000,     8),
+    ]
+
+    def test_agrupa_por_clave(self):
+        resultado = procesar_transporte_excel(planilla_grex(self.FILAS))
+        self.assertEqual((resultado['filas'], resultado['creados'], resultado['omitidos']), (4, 3, 1))
+        self.assertEqual(resultado['errores'], ["Fila 7: fecha inválida (no es fecha)"])
+        self.assertEqual((resultado['fecha_desde'], resultado['fecha_hasta']), (date(2025, 3, 3), date(2025, 3, 4)))
+
+        curico = RegistroTransporteExcel.objects.get(sector='CURICO 1')
+        self.assertEqual((curico.turno, curico.tipo_maquina), ('TURNO 1', 'BUS'))
+        self.assertEqual((curico.viajes, curico.tarifa, curico.n_pasajeros), (2, 90000, 50))
+
+    def test_resubir_es_idempotente(self):
+        procesar_transporte_excel(planilla_grex(self.FILAS))
+        resultado = procesar_transporte_excel(planilla_grex(self.FILAS))
+        self.assertEqual((resultado['creados'], resultado['actualizados'], resultado['sin_cambios']), (0, 0, 3))
+        self.assertEqual(RegistroTransporteExcel.objects.count(), 3)
+
+    def test_archivo_corregido_actualiza(self):
+        procesar_transporte_excel(planilla_grex(self.FILAS))
+        corregidas = list(self.FILAS)
+        corregidas[4] = ('04-03-2025', 'TURNO 2', 'MOLINA', 'VAN', 20000, 10)
+        resultado = procesar_transporte_excel(planilla_grex(corregidas))
+        self.assertEqual((resultado['creados'], resultado['actualizados'], resultado['sin_cambios']), (0, 1, 2))
+
+        molina = ResumenDiarioTransporteExcel.objects.get(sector='MOLINA')
+        self.assertEqual((molina.viajes, molina.costo, molina.pasajeros), (1, 20000, 10))
+
+    def test_resumen_diario(self):
+        procesar_transporte_excel(planilla_grex(self.FILAS))
+        self.assertEqual(
+            list(ResumenDiarioTransporteExcel.objects.order_by('fecha', 'sector')
+                 .values_list('fecha', 'sector', 'turno', 'viajes', 'costo', 'pasajeros')),
+            [
+                (date(2025, 3, 3), 'CURICO 1', 'TURNO 1', 2, 90000, 50),
+                (date(2025, 3, 3), 'TENO 1',   'TURNO 1', 1, 30000, 12),
+                (date(2025, 3, 4), 'MOLINA',   'TURNO 2', 1, 18000, 8),
+            ],
+        )
+
+    def test_falta_columna(self):
+        libro = Workbook()
+        libro.active.append(['FECHA', 'TURNO', 'RUTA'])
+        archivo = BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+        with self.assertRaisesMessage(ValueError, "columna obligatoria"):
+            procesar_transporte_excel(archivo)
+
+
+class ApiTransporteExcelTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        procesar_transporte_excel(planilla_grex(ImportadorTransporteExcelTests.FILAS))
+
+    def _api(self, **params):
+        request      = RequestFactory().get('/transporte/api/grex/', params)
+        request.user = self.admin
+        return api_transporte_excel(request)
+
+    def test_una_sola_consulta(self):
+        with self.assertNumQueries(1):
+            self._api(inicio='2025-03-01', fin='2025-03-31')
+
+    def test_totales_por_sector_turno(self):
+        datos = json.loads(self._api(inicio='2025-03-01', fin='2025-03-31').content)
+        self.assertEqual(datos['filas'], [
+            {'sector': 'CURICO 1', 'turno': 'TURNO 1', 'viajes': 2, 'costo': 90000, 'pasajeros': 50},
+            {'sector': 'MOLINA',   'turno': 'TURNO 2', 'viajes': 1, 'costo': 18000, 'pasajeros': 8},
+            {'sector': 'TENO 1',   'turno': 'TURNO 1', 'viajes': 1, 'costo': 30000, 'pasajeros': 12},
+        ])
+        self.assertEqual(datos['total'], {'viajes': 4, 'costo': 138000, 'pasajeros': 70})
+
+    def test_rango(self):
+        datos = json.loads(self._api(inicio='2025-03-04', fin='2025-03-04').content)
+        self.assertEqual([f['sector'] for f in datos['filas']], ['MOLINA'])
@@ -1,17 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Avg, Count
-from django.db.models.functions import TruncWeek
-from django.core.paginator import Paginator
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from datetime import datetime, date, timedelta 
+from math import ceil
+from django.utils import timezone
 from django.utils.timezone import now 
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+from core.cargas import aviso_repetida, carga_en_sesion, encolar
+from core.escritores import xlsx_en_streaming
+from core.paginacion import paginar
 from .models import Vehiculo, Conductor, RegistroSalida, Ruta
-from .forms import VehiculoForm, ConductorForm, RegistroGuardiaForm, EdicionAdminForm, RutaForm
+from .forms import VehiculoForm, ConductorForm, RegistroGuardiaForm, EdicionAdminForm, RutaForm, CargaTransporteExcelForm
+from .resumen import contar_viajes, dia_local, limites_dias, totales_dashboard
+from .resumen_excel import totales_por_sector_turno
 
 # --- 1. SEMÁFORO ---
 @login_required
@@ -47,31 +50,64 @@ def registro_control_salida(request):
         form = RegistroGuardiaForm()
 
     # NUEVO: Requerimiento 2.2 (Orden y Paginación igual a la admin)
-    registros_totales = RegistroSalida.objects.order_by('-fecha_registro')
-    
+    # Paginación por clave sobre (fecha_registro, id): sin COUNT ni OFFSET (ver core.paginacion)
     items_por_pagina = request.GET.get('page_size', '10')
     if items_por_pagina not in ['10', '20', '50', '100']:
         items_por_pagina = '10'
 
-    paginator = Paginator(registros_totales, int(items_por_pagina))
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    custom_range = paginator.get_elided_page_range(page_obj.number, on_each_side=1, on_ends=1)
+    page_obj = paginar(
+        RegistroSalida.objects.select_related('vehiculo', 'ruta', 'conductor'),
+        'fecha_registro', int(items_por_pagina),
+        despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+    )
+    # En la primera página la tabla se completa sola con los viajes nuevos (api_salidas_nuevas)
+    ultimo_id = max((r.id for r in page_obj), default=0) if page_obj.anterior is None else None
     
     return render(request, 'transporte/control_salida.html', {
         'form': form, 
         'page_obj': page_obj,
-        'custom_range': custom_range,
         'page_size': items_por_pagina,
+        'ultimo_id': ultimo_id,
         'es_admin': es_admin
     })
 
-# --- 3. VISTA ADMIN: Dashboard Completo ---
+# Viajes nuevos por consulta: si llegaron más, el cliente sigue pidiendo desde el último entregado
+LIMITE_SALIDAS_NUEVAS = 50
+
+
 @login_required
-def dashboard_transporte(request):
-    if not request.user.is_staff and not request.user.is_superuser:
-        return redirect('transporte_home')
+def api_salidas_nuevas(request):
+    """
+    Viajes registrados después del id `desde` (los más antiguos primero, hasta
+    LIMITE_SALIDAS_NUEVAS), ya renderizados como filas de la tabla de la garita.
+    `ultimo_id` es el último entregado y `hay_mas` avisa que quedan otros.
+    """
+    if not request.user.groups.filter(name='Guardias').exists() and not request.user.is_superuser:
+        return JsonResponse({'error': '403'}, status=403)
+
+    try:
+        desde = int(request.GET.get('desde', 0))
+    except ValueError:
+        desde = 0
+
+    nuevos = list(
+        RegistroSalida.objects.filter(id__gt=desde)
+        .select_related('vehiculo', 'ruta', 'conductor')
+        .order_by('id')[:LIMITE_SALIDAS_NUEVAS + 1]
+    )
+    hay_mas = len(nuevos) > LIMITE_SALIDAS_NUEVAS
+    nuevos  = nuevos[:LIMITE_SALIDAS_NUEVAS]
+    ultimo_id = nuevos[-1].id if nuevos else desde
+    nuevos.sort(key=lambda r: (r.fecha_registro, r.id), reverse=True)
+    return JsonResponse({
+        'ultimo_id': ultimo_id,
+        'hay_mas'  : hay_mas,
+        'filas'    : [render_to_string('transporte/fila_salida.html', {'reg': r}) for r in nuevos],
+    })
 
+# --- 3. VISTA ADMIN: Dashboard Completo ---
+def _rango_dashboard(request):
+    """Rango de fechas del dashboard (YYYY-MM-DD): el del GET, o el recordado en sesión, o el mes en curso."""
     inicio_get = request.GET.get('inicio')
     fin_get = request.GET.get('fin')
 
@@ -82,26 +118,72 @@ def dashboard_transporte(request):
     inicio_defecto = date(fecha_hoy.year, fecha_hoy.month, 1).strftime('%Y-%m-%d')
     fin_defecto = fecha_hoy.strftime('%Y-%m-%d')
 
-    fecha_inicio = request.session.get('transporte_inicio', inicio_defecto)
-    fecha_fin = request.session.get('transporte_fin', fin_defecto)
+    return (
+        request.session.get('transporte_inicio', inicio_defecto),
+        request.session.get('transporte_fin', fin_defecto),
+    )
+
+
+def _dias_rango(fecha_inicio, fecha_fin):
+    """(inicio, fin) como date; si alguna no es una fecha válida, el mes en curso."""
+    try:
+        return tuple(datetime.strptime(f, '%Y-%m-%d').date() for f in (fecha_inicio, fecha_fin))
+    except ValueError:
+        fecha_hoy = now().date()
+        return date(fecha_hoy.year, fecha_hoy.month, 1), fecha_hoy
+
+
+def _numero_pagina(registros, primera, fin, tamano):
+    """
+    Número de la página que empieza en `primera`, según cuántos viajes del
+    rango son más nuevos: los de días posteriores salen de contar_viajes y
+    solo los del mismo día se cuentan fila a fila.
+    """
+    dia = dia_local(primera.fecha_registro)
+    previos = contar_viajes(dia + timedelta(days=1), fin) if dia < fin else 0
+    inicio_dia, fin_dia = limites_dias(dia, dia)
+    previos += registros.filter(
+        Q(fecha_registro__gt=primera.fecha_registro) | Q(fecha_registro=primera.fecha_registro, id__gt=primera.id),
+        fecha_registro__gte=inicio_dia, fecha_registro__lt=fin_dia,
+    ).count()
+    return previos // tamano + 1
+
+
+@login_required
+def dashboard_transporte(request):
+    if not request.user.is_staff and not request.user.is_superuser:
+        return redirect('transporte_home')
+
+    fecha_inicio, fecha_fin = _rango_dashboard(request)
+    inicio, fin = _dias_rango(fecha_inicio, fecha_fin)
+    desde, hasta = limites_dias(inicio, fin)
 
     items_por_pagina = request.GET.get('page_size', '10')
     if items_por_pagina not in ['10', '20', '50', '100']:
         items_por_pagina = '10'
     
     registros_tabla = RegistroSalida.objects.filter(
-        fecha_registro__date__range=[fecha_inicio, fecha_fin]
-    ).select_related('vehiculo', 'ruta').order_by('-fecha_registro')[:3000]
-
-    paginator = Paginator(registros_tabla, int(items_por_pagina))
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    custom_range = paginator.get_elided_page_range(page_obj.number, on_each_side=1, on_ends=1)
+        fecha_registro__gte=desde, fecha_registro__lt=hasta
+    ).select_related('vehiculo', 'ruta')
+
+    # Paginación por clave sobre todo el rango: cualquier página cuesta lo mismo (ver core.paginacion)
+    page_obj = paginar(
+        registros_tabla, 'fecha_registro', int(items_por_pagina),
+        despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+    )
+    # Total y número de página salen del resumen diario; solo se cuentan filas
+    # de los días que este no cubre y, para la página, las del día en que empieza
+    total  = contar_viajes(inicio, fin) if len(page_obj) else 0
+    pagina = 1
+    if page_obj.anterior:
+        pagina = _numero_pagina(registros_tabla, page_obj.filas[0], fin, int(items_por_pagina))
 
     return render(request, 'transporte/dashboard_admin.html', {
         'page_obj': page_obj,
         'page_size': items_por_pagina,
-        'custom_range': custom_range,
+        'pagina': pagina,
+        'paginas': max(1, ceil(total / int(items_por_pagina))),
+        'total': total,
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
     })
@@ -125,69 +207,62 @@ def editar_registro(request, registro_id):
     return render(request, 'transporte/editar_registro.html', {'form': form, 'registro': registro})
 
 # --- 5. UTILIDADES Y CREACIÓN ---
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+ENCABEZADOS_EXCEL = [
+    'ID', 'Fecha y Hora', 'Movimiento', 'Patente', 'Tipo Vehículo', 'Capacidad',
+    'Conductor', 'Empresa Externa', 'Ruta Base', 'Origen Real', 'Destino Real', 
+    'Paradas Intermedias', 'Pax', '% Ocupación', 'Costo Total', 'Costo / Persona', 'Guardia'
+]
+CENTRADAS_EXCEL = {1, 3, 6, 13, 14, 15, 16}
+CAMPOS_EXCEL = [
+    'id', 'fecha_registro', 'tipo_movimiento', 'vehiculo__patente', 'vehiculo__tipo', 'vehiculo__capacidad',
+    'conductor__nombre', 'conductor__empresa_externa', 'conductor__nombre_empresa_externa',
+    'ruta__nombre', 'ruta__origen', 'ruta__destino', 'paradas_intermedias', 'cantidad_pasajeros',
+    'valor_viaje', 'registrado_por__username',
+]
+
+
+def _filas_excel(registros):
+    """Filas de la bitácora a partir de values_list(*CAMPOS_EXCEL), sin instanciar modelos."""
+    movimientos = dict(RegistroSalida.TIPO_MOVIMIENTO_CHOICES)
+    tipos = dict(Vehiculo.TIPO_CHOICES)
+    for (id_, fecha, movimiento, patente, tipo, capacidad, conductor, es_externa, empresa_externa,
+         ruta, origen, destino, paradas, pax, valor, guardia) in registros:
+        entrada = movimiento == 'ENTRADA'
+        cpp = round(valor / pax) if pax > 0 else 0
+        ocupacion = round((pax / capacidad) * 100) if capacidad > 0 else 0
+        yield (
+            id_, timezone.localtime(fecha).strftime("%d/%m/%Y %H:%M"), movimientos.get(movimiento, movimiento),
+            patente, tipos.get(tipo, tipo), capacidad,
+            conductor, empresa_externa if es_externa else 'Interno', ruta,
+            destino if entrada else origen, origen if entrada else destino,
+            paradas or 'Directo (Sin paradas)', pax,
+            f"{ocupacion}%", f"${valor}", f"${cpp}",
+            guardia or "Sistema",
+        )
+
 
 @login_required
 def exportar_excel_transporte(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename=Transporte_Aurora_{datetime.now().strftime("%d%m%Y")}.xlsx'
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Bitácora Transporte"
-    
-    # --- ESTILOS PROFESIONALES ---
-    header_fill = PatternFill(start_color='1E3A8A', end_color='1E3A8A', fill_type='solid') # Azul corporativo
-    header_font = Font(color='FFFFFF', bold=True)
-    center_align = Alignment(horizontal='center', vertical='center')
-    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    
-    headers = [
-        'ID', 'Fecha y Hora', 'Movimiento', 'Patente', 'Tipo Vehículo', 'Capacidad',
-        'Conductor', 'Empresa Externa', 'Ruta Base', 'Origen Real', 'Destino Real', 
-        'Paradas Intermedias', 'Pax', '% Ocupación', 'Costo Total', 'Costo / Persona', 'Guardia'
-    ]
-    ws.append(headers)
-    
-    # Aplicar ancho y estilo a cabeceras
-    for col_num, cell in enumerate(ws[1], 1):
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = center_align
-        cell.border = thin_border
-        ws.column_dimensions[get_column_letter(col_num)].width = 18
-
-    # --- DATOS ---
-    registros = RegistroSalida.objects.select_related('vehiculo', 'ruta', 'conductor', 'registrado_por').order_by('-fecha_registro', '-id')
-    
-    for r in registros:
-        origen_real = r.ruta.destino if r.tipo_movimiento == 'ENTRADA' else r.ruta.origen
-        destino_real = r.ruta.origen if r.tipo_movimiento == 'ENTRADA' else r.ruta.destino
-        empresa = r.conductor.nombre_empresa_externa if r.conductor.empresa_externa else 'Interno'
-        
-        cpp = round(r.valor_viaje / r.cantidad_pasajeros) if r.cantidad_pasajeros > 0 else 0
-        ocupacion = round((r.cantidad_pasajeros / r.vehiculo.capacidad) * 100) if r.vehiculo.capacidad > 0 else 0
-
-        row = [
-            r.id, r.fecha_registro.strftime("%d/%m/%Y %H:%M"), r.get_tipo_movimiento_display(),
-            r.vehiculo.patente, r.vehiculo.get_tipo_display(), r.vehiculo.capacidad,
-            r.conductor.nombre, empresa, r.ruta.nombre, origen_real, destino_real,
-            r.paradas_intermedias or 'Directo (Sin paradas)', r.cantidad_pasajeros,
-            f"{ocupacion}%", f"${r.valor_viaje}", f"${cpp}",
-            r.registrado_por.username if r.registrado_por else "Sistema"
-        ]
-        ws.append(row)
-        
-        # Aplicar bordes y centrado a filas de datos
-        for col_num in range(1, len(row) + 1):
-            cell = ws.cell(row=ws.max_row, column=col_num)
-            cell.border = thin_border
-            if col_num in [1, 3, 6, 13, 14, 15, 16]: 
-                cell.alignment = center_align
-
-    wb.save(response)
+    # Mismo rango que el dashboard; la hoja se escribe mientras se descarga
+    inicio, fin = _dias_rango(*_rango_dashboard(request))
+    desde, hasta = limites_dias(inicio, fin)
+
+    registros = (
+        RegistroSalida.objects
+        .filter(fecha_registro__gte=desde, fecha_registro__lt=hasta)
+        .order_by('-fecha_registro', '-id')
+        .values_list(*CAMPOS_EXCEL)
+        .iterator(chunk_size=2000)
+    )
+    estilos = ['borde_centrado' if n in CENTRADAS_EXCEL else 'borde' for n in range(1, len(ENCABEZADOS_EXCEL) + 1)]
+
+    response = StreamingHttpResponse(
+        xlsx_en_streaming("Bitácora Transporte", ENCABEZADOS_EXCEL, _filas_excel(registros), estilos),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    response['Content-Disposition'] = f'attachment; filename=Transporte_Aurora_{inicio:%d%m%Y}_{fin:%d%m%Y}.xlsx'
     return response
+
 @login_required
 def crear_vehiculo(request):
     if request.method == 'POST':
@@ -266,29 +341,26 @@ def deshabilitar_ruta(request, ruta_id):
 def api_datos_dashboard(request):
     if not request.user.is_superuser: return JsonResponse({'error': '403'}, status=403)
 
-    inicio = request.GET.get('inicio')
-    fin = request.GET.get('fin')
-    registros = RegistroSalida.objects.all()
-    if inicio and fin: registros = registros.filter(fecha_registro__date__range=[inicio, fin])
+    totales = totales_dashboard(request.GET.get('inicio'), request.GET.get('fin'))
+    por_tipo = totales['tipo']   # [viajes, costo, pasajeros, suma de ocupación]
+    por_ruta = totales['ruta']
 
-    curva_raw = registros.annotate(semana=TruncWeek('fecha_registro')).values('semana').annotate(total=Sum('valor_viaje')).order_by('semana')
-    curva_costos = [{'mes': f"Semana {x['semana'].strftime('%d/%m')}", 'total': x['total']} for x in curva_raw if x['semana']]
+    curva_costos = [{'mes': f"Semana {s.strftime('%d/%m')}", 'total': totales['semana'][s][1]} for s in sorted(totales['semana'])]
 
     # NUEVO: Requerimiento 1.4 (Se eliminaron las consultas y agrupaciones por patente)
-    ocupacion_tipo = list(registros.values('vehiculo__tipo').annotate(avg_ocupacion=Avg('ocupacion_porcentaje')))
-    costo_tipo = list(registros.values('vehiculo__tipo').annotate(total_costo=Sum('valor_viaje')))
-    
-    tot_costo = registros.aggregate(Sum('valor_viaje'))['valor_viaje__sum'] or 0
-    tot_pax = registros.aggregate(Sum('cantidad_pasajeros'))['cantidad_pasajeros__sum'] or 1
+    tipos = sorted(por_tipo)
+    ocupacion_tipo = [{'vehiculo__tipo': t, 'avg_ocupacion': por_tipo[t][3] / por_tipo[t][0]} for t in tipos]
+    costo_tipo = [{'vehiculo__tipo': t, 'total_costo': por_tipo[t][1]} for t in tipos]
+
+    tot_costo = sum(t[1] for t in por_tipo.values())
+    tot_pax = sum(t[2] for t in por_tipo.values()) or 1
     cpp_gen = tot_costo / tot_pax
 
-    cpp_tipo = [{'label': i['vehiculo__tipo'], 'value': round(i['c']/i['p'] if i['p']>0 else 0)} 
-                for i in registros.values('vehiculo__tipo').annotate(c=Sum('valor_viaje'), p=Sum('cantidad_pasajeros'))]
+    cpp_tipo = [{'label': t, 'value': round(c/p if p>0 else 0)} for t, (_, c, p, _) in sorted(por_tipo.items())]
 
-    costo_ruta = list(registros.values('ruta__nombre').annotate(total=Sum('valor_viaje')).order_by('-total'))
+    costo_ruta = sorted(({'ruta__nombre': r, 'total': c} for r, (_, c, _, _) in por_ruta.items()), key=lambda x: x['total'], reverse=True)
 
-    cpp_ruta_raw = registros.values('ruta__nombre').annotate(c=Sum('valor_viaje'), p=Sum('cantidad_pasajeros'))
-    cpp_ruta = [{'label': i['ruta__nombre'], 'value': round(i['c']/i['p'] if i['p']>0 else 0)} for i in cpp_ruta_raw]
+    cpp_ruta = [{'label': r, 'value': round(c/p if p>0 else 0)} for r, (_, c, p, _) in por_ruta.items()]
     cpp_ruta.sort(key=lambda x: x['value'], reverse=True)
 
     return JsonResponse({
@@ -299,4 +371,46 @@ def api_datos_dashboard(request):
         'cpp_tipo': cpp_tipo,
         'costo_ruta': costo_ruta,
         'cpp_ruta': cpp_ruta,
-    })
\ No newline at end of file
+    })
+
+# --- 7. PLANILLA GREX: carga (cola core.cargas) y costos por sector y turno ---
+@login_required
+def carga_transporte_excel(request):
+    if not request.user.is_staff and not request.user.is_superuser:
+        return redirect('transporte_home')
+
+    if request.method == 'POST':
+        form = CargaTransporteExcelForm(request.POST, request.FILES)
+        if form.is_valid():
+            carga, creada = encolar(request, 'TRANSPORTE', request.FILES['archivo'])
+            if creada:
+                messages.info(request, "📥 Archivo recibido. Se está procesando en segundo plano.")
+            else:
+                messages.info(request, aviso_repetida(carga))
+            return redirect('carga_transporte_excel')
+    else:
+        form = CargaTransporteExcelForm()
+
+    inicio, fin = _dias_rango(request.GET.get('inicio', ''), request.GET.get('fin', ''))
+    return render(request, 'transporte/carga_excel.html', {
+        'form'        : form,
+        'carga'       : carga_en_sesion(request, 'TRANSPORTE'),
+        'fecha_inicio': inicio.strftime('%Y-%m-%d'),
+        'fecha_fin'   : fin.strftime('%Y-%m-%d'),
+    })
+
+
+@login_required
+def api_transporte_excel(request):
+    """Viajes, costo y pasajeros GREX por sector y turno entre inicio y fin, desde el resumen diario."""
+    if not request.user.is_staff and not request.user.is_superuser:
+        return JsonResponse({'error': '403'}, status=403)
+
+    inicio, fin = _dias_rango(request.GET.get('inicio', ''), request.GET.get('fin', ''))
+    filas = totales_por_sector_turno(inicio, fin)
+    return JsonResponse({
+        'inicio': inicio.isoformat(),
+        'fin'   : fin.isoformat(),
+        'filas' : filas,
+        'total' : {k: sum(f[k] for f in filas) for k in ('viajes', 'costo', 'pasajeros')},
+    })